@@ -2,8 +2,9 @@
 
 import logging
 from flask import Flask
-from db_ops.db_manager import DatabaseManager, backfill_clean_reads
-from scheduler.scheduler import SchedulerManager
+from db_ops.db_manager import get_db_manager
+from scheduler.scheduler import create_scheduler
+from config import load_settings
 
 # Blueprints
 from blueprints.listener  import listener_bp    # '/api/data'
@@ -21,12 +22,17 @@ logger = logging.getLogger("sensor_dashboard_app")
 def create_app():
     """
     Cria e configura a aplicação Flask:
+      - Cria as tabelas que faltarem (uma vez, aqui)
       - Registra todos os blueprints
-      - Inicia o SchedulerManager em background
+      - Inicia o SchedulerManager em background (modo "embedded"; só o líder executa jobs)
     """
     app = Flask(__name__)
     # Para uso do {% do %} no Jinja (caso algum template use)
     app.jinja_env.add_extension('jinja2.ext.do')
+
+    # Engines e DatabaseManager são compartilhados por todos os componentes.
+    db_manager = get_db_manager()
+    db_manager.init_schema()
     
     # Registrar blueprints
     app.register_blueprint(listener_bp)    # '/api/data'
@@ -35,9 +41,11 @@ def create_app():
     app.register_blueprint(dashboard_bp)   # '/', '/sensor/<mac>', '/relatorios'
 
     # Iniciar tarefas agendadas (background)
-    # backfill_clean_reads()
-    scheduler = SchedulerManager(DatabaseManager(), check_interval=60)
-    scheduler.start()
+    scheduler_settings = load_settings()["scheduler"]
+    if scheduler_settings["mode"] == "embedded":
+        create_scheduler(db_manager, scheduler_settings).start()
+    else:
+        logger.info("Scheduler em modo standalone: rode `python -m scheduler.scheduler`.")
 
     logger.info("Flask app inicializado: blueprints registrados e scheduler rodando.")
     return app
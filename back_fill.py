@@ -1,2 +1,29 @@
-from db_ops.db_manager import backfill_clean_reads_all
-backfill_clean_reads_all()
+#!/usr/bin/env python3
+"""
+Rebuilds reads_clean from reads_raw.
+
+Usage:
+    python back_fill.py                       # Resume (or start) the backfill of every sensor.
+    python back_fill.py --chunk-days 30       # Aggregate 30 days per statement.
+    python back_fill.py --workers 4           # Spread sensors over 4 processes.
+    python back_fill.py --restart             # Ignore the checkpoints and rebuild from the first reading.
+    python back_fill.py --db_url "sqlite:///custom.db"
+"""
+
+import argparse
+from db_ops.backfill import backfill_clean_reads_all
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill of one-minute clean reads")
+    parser.add_argument("--chunk-days", type=float, default=7, help="Days aggregated per statement.")
+    parser.add_argument("--workers", type=int, default=1, help="Processes (sensors are split among them).")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved checkpoints and recompute every minute.")
+    parser.add_argument("--db_url", type=str, default=None, help="Database URL (default: settings.yaml)")
+    args = parser.parse_args()
+    backfill_clean_reads_all(chunk_days=args.chunk_days, workers=args.workers,
+                             restart=args.restart, db_url=args.db_url)
+
+
+if __name__ == "__main__":
+    main()
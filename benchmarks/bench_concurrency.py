@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Reader latency while a writer is ingesting, with the default SQLite setup
+(rollback journal, single engine) versus the tuned one (WAL + pragmas +
+separate read-only engine).
+
+Usage:
+    python -m benchmarks.bench_concurrency [--seconds 5] [--readers 4] [--batch 500]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from config import load_settings
+from db_ops.db_manager import DatabaseManager
+from db_ops.engine import dispose_engines
+
+MACS = [f"AC233FAE{i:04X}" for i in range(50)]
+
+PROFILES = {
+    "default": {"separate_read_engine": False,
+                "pragmas": {"journal_mode": "DELETE", "synchronous": "FULL", "busy_timeout": 5000,
+                            "mmap_size": 0, "cache_size": -2000}},
+    "tuned": {"separate_read_engine": True, "pragmas": {}},
+}
+
+
+def run_profile(name, seconds, readers, batch):
+    settings = load_settings()
+    settings["database"].update(PROFILES[name])
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db = DatabaseManager(db_url, settings=settings)
+        db.init_schema()
+        stop = threading.Event()
+        latencies = []
+        written = [0]
+        lock = threading.Lock()
+
+        def writer():
+            ts = 1735689600000
+            while not stop.is_set():
+                rows = []
+                for i in range(batch):
+                    ts += 10
+                    rows.append((ts, MACS[i % len(MACS)], 21.5, 55.0, -60, "MST01", ""))
+                written[0] += db.insert_raw_rows(rows)["accepted"]
+
+        def reader(k):
+            i = k
+            while not stop.is_set():
+                started = time.perf_counter()
+                db.get_latest_raw_reads(MACS[i % len(MACS)], limit=100)
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                i += 1
+
+        threads = [threading.Thread(target=writer)] + \
+                  [threading.Thread(target=reader, args=(k,)) for k in range(readers)]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        db.flush_sensor_cache()
+        dispose_engines(db_url)
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<8} writes/s {written[0] / seconds:>9.0f}  reads {len(latencies):>6}  "
+          f"p50 {statistics.median(latencies):6.2f} ms  p95 {p95:6.2f} ms  max {latencies[-1]:7.2f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--seconds", type=float, default=5)
+    ap.add_argument("--readers", type=int, default=4)
+    ap.add_argument("--batch", type=int, default=500)
+    args = ap.parse_args()
+    for name in PROFILES:
+        run_profile(name, args.seconds, args.readers, args.batch)
+
+
+if __name__ == "__main__":
+    main()
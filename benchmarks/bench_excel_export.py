@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Compares the xlsx export engine with the previous in-memory openpyxl writer.
+
+Builds synthetic export rows for `--sensors` sheets x `--rows` rows and writes
+them with both writers, reporting wall time and cells per second; with
+--memory, a second (much slower, traced) run reports the peak Python heap.
+
+Usage:
+    python -m benchmarks.bench_excel_export [--sensors 20] [--rows 720] [--memory]
+"""
+
+import argparse
+import io
+import time
+import tracemalloc
+
+from openpyxl import Workbook
+from openpyxl.styles import Font, Alignment, PatternFill
+from openpyxl.utils import get_column_letter
+
+from modules.excel_export import EXPORT_HEADERS, ExcelExporter
+from utils.parser import ms_to_iso, parse_timestamp_ms
+
+LIMITS = {"temp_min": 2.0, "temp_max": 8.0, "hum_min": 30.0, "hum_max": 70.0}
+
+
+def make_rows(count, seed=0):
+    start = parse_timestamp_ms("2025-03-01T00:00")
+    rows = []
+    for i in range(count):
+        ts = start + i * 3600 * 1000
+        t = 5.0 + ((i * 7 + seed) % 80) / 10.0 - 0.4
+        h = 50.0 + ((i + seed) % 30)
+        rows.append({"timestamp": ms_to_iso(ts, timespec="minutes"), "avg_temp": t, "avg_hum": h,
+                     "min_temp": t - 0.3, "max_temp": t + 0.3, "min_hum": h - 1, "max_hum": h + 1,
+                     "last_temp": t, "last_hum": h, "last_timestamp": ms_to_iso(ts + 3540000),
+                     "first_temp": t, "first_hum": h, "first_timestamp": ms_to_iso(ts)})
+    return rows
+
+
+# --- writer anterior (blueprints/api.py), mantido aqui só para comparação ---
+def highlight_cell(cell, value, lim_min, lim_max):
+    # Sem limite configurado
+    if lim_min is None and lim_max is None:
+        return
+    yellow = PatternFill(start_color="FFF475", end_color="FFF475", fill_type="solid")
+    red    = PatternFill(start_color="FF8A80", end_color="FF8A80", fill_type="solid")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return
+    # Fora do limite
+    if lim_min is not None and value < lim_min:
+        cell.fill = red
+    elif lim_max is not None and value > lim_max:
+        cell.fill = red
+    elif (lim_min is not None and value == lim_min) or (lim_max is not None and value == lim_max):
+        cell.fill = yellow
+
+def write_sensor_sheet(ws, rows, headers, limits=None):
+    ws.append([h[1] for h in headers])
+
+    # Estilo do cabeçalho
+    header_fill = PatternFill(start_color="A7C7E7", end_color="A7C7E7", fill_type="solid")
+    for col in range(1, len(headers) + 1):
+        cell = ws.cell(row=1, column=col)
+        cell.font = Font(bold=True)
+        cell.fill = header_fill
+        cell.alignment = Alignment(horizontal="center")
+
+    # Linhas zebradas
+    fill1 = PatternFill(start_color="F8FAFF", end_color="F8FAFF", fill_type="solid")
+    fill2 = PatternFill(start_color="E5EDF7", end_color="E5EDF7", fill_type="solid")
+
+    # Mapeamento de colunas
+    col_idx = {k: i+1 for i, (k, _) in enumerate(headers)}
+
+    for i, row in enumerate(rows, start=2):
+        # Quebra timestamp em data/hora (se os headers começarem com "date" e "time")
+        if "timestamp" in row:
+            ts = row["timestamp"]
+            if "T" in ts:
+                date, time = ts.split("T")
+                time = time[:5]
+            else:
+                date, time = ts, ""
+        else:
+            date, time = "", ""
+
+        # Prepara valores conforme headers (primeiros dois são date/time, resto igual)
+        values = []
+        for j, (key, _) in enumerate(headers):
+            if key == "date":
+                values.append(date)
+            elif key == "time":
+                values.append(time)
+            elif key == "last_timestamp":
+                last_ts = row.get("last_timestamp", "")
+                values.append(last_ts.split("T")[1][:5] if "T" in last_ts else last_ts)
+            else:
+                values.append(row.get(key, ""))
+
+        ws.append(values)
+        fill = fill1 if i % 2 == 0 else fill2
+
+        for key, idx in col_idx.items():
+            cell = ws.cell(row=i, column=idx)
+            cell.fill = fill
+            cell.alignment = Alignment(horizontal="center")
+            # Formatação numérica nas colunas (exceto Data/Hora)
+            if key not in ("date", "time"):
+                try:
+                    cell.value = float(cell.value)
+                    cell.number_format = "0.00"
+                except (TypeError, ValueError):
+                    pass
+
+            # Destaque de limite (temp/hum)
+            if limits:
+                if key in ("avg_temp", "min_temp", "max_temp"):
+                    highlight_cell(cell, cell.value, limits.get("temp_min"), limits.get("temp_max"))
+                if key in ("avg_hum", "min_hum", "max_hum"):
+                    highlight_cell(cell, cell.value, limits.get("hum_min"), limits.get("hum_max"))
+
+    ws.freeze_panes = "A2"
+    # Auto ajuste largura
+    for col in ws.columns:
+        max_length = max(len(str(cell.value)) if cell.value else 0 for cell in col)
+
+
+def legacy_export(data):
+    wb = Workbook()
+    wb.remove(wb.active)
+    for mac, rows in data.items():
+        write_sensor_sheet(wb.create_sheet(title=mac[:31]), rows, EXPORT_HEADERS, LIMITS)
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf
+
+
+def engine_export(data):
+    return ExcelExporter().write((mac, rows, LIMITS) for mac, rows in data.items())
+
+
+def measure(fn, data, trace=False):
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    out = fn(data)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] if trace else None
+    tracemalloc.stop()
+    out.seek(0, 2)
+    return elapsed, peak, out.tell()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sensors", type=int, default=20)
+    ap.add_argument("--rows", type=int, default=720, help="rows per sensor (720 = 30 days hourly)")
+    ap.add_argument("--memory", action="store_true", help="also measure the peak heap (slow)")
+    args = ap.parse_args()
+
+    data = {f"AC233F{i:06X}": make_rows(args.rows, i) for i in range(args.sensors)}
+    cells = args.sensors * (args.rows + 1) * len(EXPORT_HEADERS)
+    print(f"{args.sensors} sheet(s) x {args.rows} rows = {cells} cells")
+    for name, fn in (("in-memory workbook", legacy_export), ("write-only engine", engine_export)):
+        elapsed, _, size = measure(fn, data)
+        line = f"{name:<19} {elapsed:7.2f} s  {cells / elapsed:10,.0f} cells/s  file {size / 2**20:5.1f} MiB"
+        if args.memory:
+            line += f"  peak heap {measure(fn, data, trace=True)[1] / 2**20:7.1f} MiB"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Compares the all-sensors export: one grouped query vs. one export per sensor.
+
+Fills a throwaway database with `--sensors` sensors x `--days` days of
+reads_clean rows (one every `--step` minutes, with partials), optionally builds
+the hourly/daily rollups, then times SensorService.export_all_sensors_data
+against the per-MAC loop it replaces, counting the SQL statements of each.
+
+Usage:
+    python -m benchmarks.bench_export_all [--sensors 500] [--days 30] [--step 5] [--interval 1] [--no-rollups]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from db_ops.db_manager import get_db_manager, CLEAN_WATERMARK, DAY_MS, MINUTE_MS
+from db_ops.engine import count_queries, dispose_engines
+from modules.service import SensorService
+from utils.parser import ms_to_iso, parse_timestamp_ms
+
+START = parse_timestamp_ms("2025-03-01T00:00")
+
+_FILL_SQL = text("""
+WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < :points - 1)
+INSERT INTO reads_clean (ts, mac, avg_temp, avg_hum, min_temp, max_temp, min_hum, max_hum, flags,
+                         sum_temp, count_temp, sum_hum, count_hum, first_ts, first_temp, first_hum,
+                         last_ts, last_temp, last_hum)
+SELECT ts, mac, t, h, t - 0.2, t + 0.2, h - 1, h + 1, '', t * 6, 6, h * 6, 6, ts, t, h, ts + 50000, t, h
+FROM (SELECT :start + n.i * :step AS ts, s.mac AS mac,
+             20 + ((n.i * 7 + s.rowid) % 50) / 10.0 AS t, 50 + ((n.i + s.rowid) % 20) AS h
+      FROM n CROSS JOIN sensors s)
+""")
+
+
+def fill(db, sensors, days, step_minutes):
+    with db.engine.begin() as conn:
+        conn.execute(text("INSERT INTO sensors (mac, is_active) VALUES (:mac, 1)"),
+                     [{"mac": f"AC233F{i:06X}"} for i in range(sensors)])
+        conn.execute(_FILL_SQL, {"points": days * DAY_MS // (step_minutes * MINUTE_MS),
+                                 "start": START, "step": step_minutes * MINUTE_MS})
+    db.set_watermark(CLEAN_WATERMARK, START + days * DAY_MS)
+
+
+def per_sensor_export(service, fr, to, interval):
+    """The previous export_all_sensors_data: the single-sensor export once per MAC."""
+    result = {}
+    for sensor in service.db_manager.get_all_sensors():
+        data = service.export_sensor_data(sensor.mac, fr, to, interval)
+        if data:
+            result[sensor.mac] = data
+    return result
+
+
+def timed(fn, *args):
+    with count_queries() as counter:
+        started = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - started
+    return result, elapsed, counter.count
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sensors", type=int, default=500)
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--step", type=int, default=5, help="minutes between reads_clean rows")
+    ap.add_argument("--interval", type=int, default=1, help="export interval in hours")
+    ap.add_argument("--no-rollups", action="store_true", help="export from reads_clean only")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db = get_db_manager(db_url)
+        db.init_schema()
+        started = time.perf_counter()
+        fill(db, args.sensors, args.days, args.step)
+        if not args.no_rollups:
+            while db.roll_up():
+                pass
+        print(f"{args.sensors} sensors x {args.days} days (one clean row / {args.step} min) "
+              f"loaded in {time.perf_counter() - started:.1f} s"
+              f"{'' if args.no_rollups else ', with hourly/daily rollups'}")
+
+        service = SensorService(db_url)
+        fr, to = ms_to_iso(START), ms_to_iso(START + args.days * DAY_MS - 1)
+        new, new_s, new_q = timed(service.export_all_sensors_data, fr, to, args.interval)
+        old, old_s, old_q = timed(per_sensor_export, service, fr, to, args.interval)
+        assert new == old, "exports differ"
+        rows = sum(len(v) for v in new.values())
+        print(f"{rows} rows for {len(new)} sensors at {args.interval} h")
+        print(f"per-sensor loop  {old_s * 1000:9.1f} ms  {old_q:5d} queries")
+        print(f"grouped query    {new_s * 1000:9.1f} ms  {new_q:5d} queries  ({old_s / new_s:.1f}x)")
+
+        db.flush_sensor_cache()
+        dispose_engines(db_url)
+
+
+if __name__ == "__main__":
+    main()
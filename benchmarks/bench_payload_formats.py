@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Compares the ingest payload formats: JSON list, columnar JSON and packed binary.
+Reports bytes per reading and parse time per 10k readings (body -> row tuples
+ready for DatabaseManager.insert_raw_rows).
+
+Usage:
+    python -m benchmarks.bench_payload_formats [--readings 10000] [--repeat 20]
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from utils import parser
+
+
+def make_readings(n, sensors=50):
+    macs = [f"AC233FAE{i:04X}" for i in range(sensors)]
+    start = datetime(2025, 5, 29, 16, 0)
+    readings = []
+    for i in range(n):
+        ts = start + timedelta(milliseconds=i * 250)
+        readings.append({
+            "mac": macs[i % sensors],
+            "timestamp": ts.isoformat(timespec="milliseconds"),
+            "temperature": round(random.uniform(-20, 35), 2),
+            "humidity": round(random.uniform(30, 80), 2),
+            "rssi": random.randint(-90, -30),
+            "type": "MST01",
+            "flags": "",
+        })
+    return readings
+
+
+def encode_all(readings):
+    json_list = json.dumps(readings).encode()
+    columnar = json.dumps({
+        "mac": [r["mac"] for r in readings],
+        "timestamp": [r["timestamp"] for r in readings],
+        "temperature": [r["temperature"] for r in readings],
+        "humidity": [r["humidity"] for r in readings],
+        "rssi": [r["rssi"] for r in readings],
+        "type": "MST01",
+    }).encode()
+    packed = parser.pack_readings(
+        (r["mac"], int(datetime.fromisoformat(r["timestamp"]).timestamp() * 1000),
+         r["temperature"], r["humidity"], r["rssi"])
+        for r in readings
+    )
+    return {"json list": json_list, "columnar json": columnar, "packed binary": packed}
+
+
+def decode_json_list(body):
+    records = parser.parse_payload(json.loads(body))
+    return [tuple(r.get(k) for k in parser.READING_FIELDS) for r in records]
+
+
+def decode_columnar(body):
+    return parser.parse_payload(json.loads(body)).rows()
+
+
+def decode_packed(body):
+    return parser.parse_packed(body, "MST01").rows()
+
+
+DECODERS = {"json list": decode_json_list, "columnar json": decode_columnar, "packed binary": decode_packed}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--readings", type=int, default=10000)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    readings = make_readings(args.readings)
+    bodies = encode_all(readings)
+    print(f"{'format':<15} {'bytes/reading':>14} {'ms per 10k':>12}")
+    for name, body in bodies.items():
+        decode = DECODERS[name]
+        assert len(decode(body)) == args.readings
+        best = float("inf")
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            decode(body)
+            best = min(best, time.perf_counter() - started)
+        per_10k = best * 1000 * 10000 / args.readings
+        print(f"{name:<15} {len(body) / args.readings:>14.1f} {per_10k:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
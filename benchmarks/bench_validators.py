@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Measures the batch validators on large list payloads (microseconds per record).
+
+Usage:
+    python -m benchmarks.bench_validators [--records 10000] [--repeat 20]
+"""
+
+import argparse
+import time
+
+from benchmarks.bench_payload_formats import make_readings
+from utils import parser
+from utils.validators import validate_sensor_batch, validate_sensor_rows
+
+
+def best_of(repeat, fn, arg):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--records", type=int, default=10000)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    records = make_readings(args.records)
+    # 1% de registros inválidos para exercitar o caminho de erro
+    for i in range(0, args.records, 100):
+        records[i] = dict(records[i], temperature=500, mac="bad")
+    rows = [tuple(r[k] for k in parser.READING_FIELDS) for r in records]
+
+    mask, errors = validate_sensor_batch(records)
+    assert len(errors) == args.records // 100 and sum(mask) == args.records - len(errors)
+
+    for name, fn, arg in (("validate_sensor_batch", validate_sensor_batch, records),
+                          ("validate_sensor_rows", validate_sensor_rows, rows)):
+        elapsed = best_of(args.repeat, fn, arg)
+        print(f"{name:<22} {elapsed * 1e6 / args.records:6.2f} µs/record  "
+              f"({elapsed * 1000:.1f} ms per {args.records})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,166 +1,9 @@
 import logging
 from flask import Blueprint, request, jsonify, abort
-from modules.service import sensor_service
-import io
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill
-from io import BytesIO
-from flask import send_file
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
-
-def get_limits_for_sensor(sensor_mac, db_manager):
-    policy = db_manager.get_alert_policy(sensor_mac)
-    if not policy:
-        return {}
-    return {
-        "temp_min": policy.temp_min,
-        "temp_max": policy.temp_max,
-        "hum_min": policy.humidity_min,
-        "hum_max": policy.humidity_max,
-    }
-def highlight_cell(cell, value, lim_min, lim_max):
-    # Sem limite configurado
-    if lim_min is None and lim_max is None:
-        return
-    yellow = PatternFill(start_color="FFF475", end_color="FFF475", fill_type="solid")
-    red    = PatternFill(start_color="FF8A80", end_color="FF8A80", fill_type="solid")
-    try:
-        value = float(value)
-    except (TypeError, ValueError):
-        return
-    # Fora do limite
-    if lim_min is not None and value < lim_min:
-        cell.fill = red
-    elif lim_max is not None and value > lim_max:
-        cell.fill = red
-    elif (lim_min is not None and value == lim_min) or (lim_max is not None and value == lim_max):
-        cell.fill = yellow
-
-def write_sensor_sheet(ws, rows, headers, limits=None):
-    ws.append([h[1] for h in headers])
-
-    # Estilo do cabeçalho
-    header_fill = PatternFill(start_color="A7C7E7", end_color="A7C7E7", fill_type="solid")
-    for col in range(1, len(headers) + 1):
-        cell = ws.cell(row=1, column=col)
-        cell.font = Font(bold=True)
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center")
-
-    # Linhas zebradas
-    fill1 = PatternFill(start_color="F8FAFF", end_color="F8FAFF", fill_type="solid")
-    fill2 = PatternFill(start_color="E5EDF7", end_color="E5EDF7", fill_type="solid")
-
-    # Mapeamento de colunas
-    col_idx = {k: i+1 for i, (k, _) in enumerate(headers)}
-
-    for i, row in enumerate(rows, start=2):
-        # Quebra timestamp em data/hora (se os headers começarem com "date" e "time")
-        if "timestamp" in row:
-            ts = row["timestamp"]
-            if "T" in ts:
-                date, time = ts.split("T")
-                time = time[:5]
-            else:
-                date, time = ts, ""
-        else:
-            date, time = "", ""
-
-        # Prepara valores conforme headers (primeiros dois são date/time, resto igual)
-        values = []
-        for j, (key, _) in enumerate(headers):
-            if key == "date":
-                values.append(date)
-            elif key == "time":
-                values.append(time)
-            elif key == "last_timestamp":
-                last_ts = row.get("last_timestamp", "")
-                values.append(last_ts.split("T")[1][:5] if "T" in last_ts else last_ts)
-            else:
-                values.append(row.get(key, ""))
-
-        ws.append(values)
-        fill = fill1 if i % 2 == 0 else fill2
-
-        for key, idx in col_idx.items():
-            cell = ws.cell(row=i, column=idx)
-            cell.fill = fill
-            cell.alignment = Alignment(horizontal="center")
-            # Formatação numérica nas colunas (exceto Data/Hora)
-            if key not in ("date", "time"):
-                try:
-                    cell.value = float(cell.value)
-                    cell.number_format = "0.00"
-                except (TypeError, ValueError):
-                    pass
-
-            # Destaque de limite (temp/hum)
-            if limits:
-                if key in ("avg_temp", "min_temp", "max_temp"):
-                    highlight_cell(cell, cell.value, limits.get("temp_min"), limits.get("temp_max"))
-                if key in ("avg_hum", "min_hum", "max_hum"):
-                    highlight_cell(cell, cell.value, limits.get("hum_min"), limits.get("hum_max"))
-
-    ws.freeze_panes = "A2"
-    # Auto ajuste largura
-    for col in ws.columns:
-        max_length = max(len(str(cell.value)) if cell.value else 0 for cell in col)
-        ws.column_dimensions[get_column_letter(col[0].column)].width = max_length + 2
-
-def export_one_to_excel(mac, rows, db_manager):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"Sensor {mac}"
-    headers = [
-        ("date", "Data"),
-        ("time", "Hora"),
-        ("last_temp", "Última Temp (°C)"),
-        ("last_hum", "Última Umid (%)"),
-        ("last_timestamp", "Hora Última Leitura"),
-        ("avg_temp", "Temperatura Média (°C)"),
-        ("avg_hum", "Umidade Média (%)"),
-        ("min_temp", "Temp. Mín (°C)"),
-        ("max_temp", "Temp. Máx (°C)"),
-        ("min_hum", "Umid. Mín (%)"),
-        ("max_hum", "Umid. Máx (%)"),
-
-    ]
-    if not rows:
-        ws.append(["Nenhum dado encontrado para o sensor/intervalo selecionado."])
-    else:
-        limits = get_limits_for_sensor(mac, db_manager)
-        write_sensor_sheet(ws, rows, headers, limits)
-    buf = io.BytesIO()
-    wb.save(buf)
-    buf.seek(0)
-    return buf
-
-def export_all_to_excel(json_data, db_manager):
-    wb = Workbook()
-    wb.remove(wb.active)
-    headers = [
-        ("date", "Data"),
-        ("time", "Hora"),
-        ("last_temp", "Última Temp (°C)"),
-        ("last_hum", "Última Umid (%)"),
-        ("last_timestamp", "Hora Última Leitura"),
-        ("avg_temp", "Temperatura Média (°C)"),
-        ("avg_hum", "Umidade Média (%)"),
-        ("min_temp", "Temp. Mín (°C)"),
-        ("max_temp", "Temp. Máx (°C)"),
-        ("min_hum", "Umid. Mín (%)"),
-        ("max_hum", "Umid. Máx (%)"),
-    ]
-
-    for mac, rows in json_data.items():
-        ws = wb.create_sheet(title=mac[:31])
-        limits = get_limits_for_sensor(mac, db_manager)
-        write_sensor_sheet(ws, rows, headers, limits)
-    buf = io.BytesIO()
-    wb.save(buf)
-    buf.seek(0)
-    return buf
+from modules.service import sensor_service, STREAM_SOURCES
+from modules.excel_export import XLSX_MIMETYPE
+from flask import send_file, Response, stream_with_context
+from utils.streaming import ENCODERS, STREAM_MIMETYPES, gzip_chunks
 
 logger = logging.getLogger(__name__)
 api_bp = Blueprint('api', __name__, url_prefix='/api/sensors')
@@ -169,6 +12,35 @@ def get_payload():
     data = request.get_json(silent=True)
     return data if data is not None else request.form.to_dict()
 
+def get_macs_filter():
+    """`macs=MAC1,MAC2` (ou `macs` repetido) na query string; None = todos os sensores."""
+    macs = [mac.strip() for value in request.args.getlist('macs') for mac in value.split(',') if mac.strip()]
+    return macs or None
+
+def streamed_export(macs, filename):
+    """
+    Resposta em fluxo para format=csv|ndjson: linhas lidas do cursor em lotes e
+    codificadas conforme saem, opcionalmente comprimidas (gzip=1) na hora.
+    source=aggregate (padrão, exige interval) | clean | raw.
+    """
+    fmt = request.args.get('format')
+    fr = request.args.get('from')
+    to = request.args.get('to')
+    interval = request.args.get('interval')
+    source = request.args.get('source', 'aggregate')
+    if source not in STREAM_SOURCES:
+        return jsonify({"error": f"Unknown source {source!r}"}), 400
+    if not fr or not to or (source == 'aggregate' and not interval):
+        return jsonify({"error": "Missing parameters"}), 400
+
+    columns, rows = sensor_service.iter_export_rows(fr, to, interval, macs, source)
+    chunks = ENCODERS[fmt](columns, rows)
+    headers = {"Content-Disposition": f"attachment; filename={filename}.{fmt}"}
+    if request.args.get('gzip') in ('1', 'true'):
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return Response(stream_with_context(chunks), mimetype=STREAM_MIMETYPES[fmt], headers=headers)
+
 @api_bp.route('/', methods=['GET'])
 def list_sensors():
     """GET /api/sensors/ — lista todos os sensores."""
@@ -239,16 +111,18 @@ def sensor_schedules(mac):
 def export_sensor(mac):
     """
     GET /api/sensors/<mac>/export?from=YYYY-MM-DD&to=YYYY-MM-DD&interval=H
-    — exporta leituras formatadas (JSON ou CSV).
+    — exporta leituras formatadas (JSON ou, com format=csv|ndjson, em fluxo).
     """
+    if request.args.get('format') in STREAM_MIMETYPES:
+        return streamed_export(mac, f"{mac}_{request.args.get('from')}_a_{request.args.get('to')}")
     fr       = request.args.get('from')
     to       = request.args.get('to')
     interval = request.args.get('interval')
     if not all([fr, to, interval]):
         return jsonify({"error": "Missing parameters"}), 400
 
-    data = sensor_service.export_sensor_data(mac, fr, to, interval)
-    return jsonify(data), 200
+    body = sensor_service.export_sensor_json(mac, fr, to, interval)
+    return Response(body, mimetype='application/json'), 200
 
 @api_bp.route('/<mac>/report', methods=['GET'])
 def sensor_report(mac):
@@ -267,17 +141,26 @@ def sensor_report(mac):
 @api_bp.route('/export_all', methods=['GET'])
 def export_all_sensors():
     """
-    GET /api/sensors/export_all?from=...&to=...&interval=...
-    — retorna agregados de todos os sensores no período.
+    GET /api/sensors/export_all?from=...&to=...&interval=...[&macs=MAC1,MAC2]
+    — retorna agregados de todos os sensores (ou dos `macs` listados) no período;
+    com format=csv|ndjson a resposta é em fluxo (ver streamed_export).
     """
+    if request.args.get('format') in STREAM_MIMETYPES:
+        return streamed_export(get_macs_filter(), f"sensores_{request.args.get('from')}_a_{request.args.get('to')}")
     fr = request.args.get('from')
     to = request.args.get('to')
     interval = request.args.get('interval')
     if not all([fr, to, interval]):
         return jsonify({"error": "Missing parameters"}), 400
 
-    data = sensor_service.export_all_sensors_data(fr, to, interval)
-    return jsonify(data), 200
+    body = sensor_service.export_all_sensors_json(fr, to, interval, get_macs_filter())
+    return Response(body, mimetype='application/json'), 200
+
+
+@api_bp.route('/export_cache', methods=['GET'])
+def export_cache_stats():
+    """GET /api/sensors/export_cache — hit ratio e bytes do cache de exportações/relatórios."""
+    return jsonify(sensor_service.get_result_cache_stats()), 200
 
 
 @api_bp.route('/export_all_excel', methods=['GET'])
@@ -288,14 +171,12 @@ def export_all_excel():
     if not all([fr, to, interval]):
         return jsonify({"error": "Missing parameters"}), 400
 
-    data = sensor_service.export_all_sensors_data(fr, to, interval)
-    db_manager = sensor_service.db_manager  # <-- PEGUE O DB_MANAGER DO SERVICE
-    buf = export_all_to_excel(data, db_manager)
+    out = sensor_service.export_all_sensors_excel(fr, to, interval, get_macs_filter())
     return send_file(
-        buf,
+        out,
         as_attachment=True,
         download_name=f'sensores_{fr}_a_{to}.xlsx',
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        mimetype=XLSX_MIMETYPE
     )
 
 
@@ -307,12 +188,10 @@ def export_sensor_excel(mac):
     if not all([fr, to, interval]):
         return jsonify({"error": "Missing parameters"}), 400
 
-    rows = sensor_service.export_sensor_data(mac, fr, to, interval)
-    db_manager = sensor_service.db_manager  # <-- PEGUE O DB_MANAGER DO SERVICE
-    buf = export_one_to_excel(mac, rows, db_manager)
+    out = sensor_service.export_sensor_excel(mac, fr, to, interval)
     return send_file(
-        buf,
+        out,
         as_attachment=True,
         download_name=f'{mac}_{fr}_a_{to}.xlsx',
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        mimetype=XLSX_MIMETYPE
     )
@@ -3,7 +3,7 @@
 import logging
 import json
 from flask import Blueprint, render_template, abort
-from db_ops.db_manager import DatabaseManager
+from db_ops.db_manager import get_db_manager
 from modules.service import sensor_service
 
 logger = logging.getLogger(__name__)
@@ -11,7 +11,7 @@ dashboard_bp = Blueprint('dashboard', __name__)
 
 @dashboard_bp.route('/')
 def index():
-    db = DatabaseManager()
+    db = get_db_manager()
     sensors = sensor_service.get_all_sensors()
     cards = []
 
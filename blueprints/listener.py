@@ -1,46 +1,201 @@
+import atexit
+import gzip
 import logging
 from flask import Blueprint, request, jsonify
 from utils import parser
-from utils.validators import validate_sensor_payload
-from db_ops.db_manager import DatabaseManager
+from utils.validators import validate_sensor_payload, validate_sensor_batch, validate_sensor_rows
+from db_ops.db_manager import get_db_manager
+from config import load_settings
+from modules.ingest import IngestQueue
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 listener_bp = Blueprint('listener', __name__, url_prefix='/api/data')
-db_manager = DatabaseManager()
+db_manager = get_db_manager()
+
+settings = load_settings()
+
+# Modo de ingestão: "sync" grava na requisição, "async" usa a fila write-behind.
+ingest_settings = settings["ingest"]
+ingest_queue = None
+if ingest_settings["mode"] == "async":
+    ingest_queue = IngestQueue(
+        db_manager,
+        maxsize=ingest_settings["queue_size"],
+        batch_size=ingest_settings["batch_size"],
+        flush_interval=ingest_settings["flush_interval_ms"] / 1000.0,
+        retry_delay=ingest_settings["retry_delay_ms"] / 1000.0,
+        max_retry_delay=ingest_settings["max_retry_delay_ms"] / 1000.0,
+    )
+    ingest_queue.start()
+    atexit.register(ingest_queue.stop)
+
+NDJSON_CHUNK_SIZE = 500
+MAX_REJECTED_DETAILS = 1000
+
+def _rows_from(structured):
+    """Converte o payload já parseado em tuplas na ordem de parser.READING_FIELDS."""
+    if isinstance(structured, parser.ColumnarBatch):
+        return structured.rows()
+    records = structured if isinstance(structured, list) else [structured]
+    return [tuple(r.get(k) for k in parser.READING_FIELDS) if isinstance(r, dict) else (None, None)
+            for r in records]
 
 @listener_bp.route('/', methods=['POST'])
 def receive_data():
     """
-    Recebe payload JSON (objeto ou lista) com leituras brutas de sensores.
+    Recebe leituras brutas de sensores em um dos formatos:
+      - JSON objeto ou lista de objetos
+      - JSON colunar {"mac": [...], "timestamp": [...], "temperature": [...], ...}
+      - binário compactado (Content-Type: application/x-ble-readings, ?type=MST01)
     Exemplo POST /api/data/ { … }
+    No modo "async" as leituras são enfileiradas e a resposta é 202 (429 com Retry-After se a
+    fila estiver cheia; 413 se o lote sozinho for maior que a fila, já que nunca caberia; 503 com
+    Retry-After enquanto a gravação em lote estiver falhando).
     """
-    data = request.get_json()
-    if not data:
-        logger.warning("Nenhum dado recebido de %s", request.remote_addr)
-        return jsonify({"error": "No data provided"}), 400
+    try:
+        if request.mimetype == parser.PACKED_CONTENT_TYPE:
+            structured = parser.parse_packed(request.get_data(), request.args.get('type'))
+        else:
+            data = request.get_json()
+            if not data:
+                logger.warning("Nenhum dado recebido de %s", request.remote_addr)
+                return jsonify({"error": "No data provided"}), 400
+            structured = parser.parse_payload(data)
+    except ValueError as e:
+        return jsonify({"error": "Invalid payload", "details": [str(e)]}), 400
 
     try:
-        structured = parser.parse_payload(data)
         # Se for um único objeto, valida antes de inserir
         if isinstance(structured, dict):
             valid, errors = validate_sensor_payload(structured)
             if not valid:
                 return jsonify({"error": "Invalid payload", "details": errors}), 400
 
-        count = 0
+        rows = _rows_from(structured)
+        # Lotes: valida tudo numa passada e grava só as leituras válidas
+        invalid = {}
         if isinstance(structured, list):
-            for rec in structured:
-                db_manager.insert_raw_read(rec)
-            count = len(structured)
-        else:
-            db_manager.insert_raw_read(structured)
-            count = 1
+            mask, invalid = validate_sensor_batch(structured)
+        elif isinstance(structured, parser.ColumnarBatch):
+            mask, invalid = validate_sensor_rows(rows)
+        if invalid:
+            rows = [row for row, ok in zip(rows, mask) if ok]
+            logger.warning("%d registro(s) inválido(s) de %s", len(invalid), request.remote_addr)
+            if not rows:
+                return jsonify({"error": "Invalid payload", "details": invalid}), 400
+
+        if ingest_queue is not None:
+            if ingest_queue.failing:
+                logger.warning("Gravação da fila de ingestão falhando; recusando %d registro(s) de %s",
+                               len(rows), request.remote_addr)
+                response = jsonify({"error": "Ingest writer failing", "last_error": ingest_queue.last_error})
+                response.headers["Retry-After"] = str(ingest_settings["retry_after"])
+                return response, 503
+            try:
+                queued = ingest_queue.put_many(rows)
+            except ValueError as e:
+                return jsonify({"error": str(e), "max_batch": ingest_queue.maxsize}), 413
+            if not queued:
+                logger.warning("Fila de ingestão cheia; recusando %d registro(s) de %s",
+                               len(rows), request.remote_addr)
+                response = jsonify({"error": "Ingest queue full", "queue_depth": ingest_queue.depth()})
+                response.headers["Retry-After"] = str(ingest_settings["retry_after"])
+                return response, 429
+            return jsonify({"status": "queued", "queued": len(rows),
+                            "rejected": len(invalid), "details": invalid}), 202
+
+        result = db_manager.insert_raw_rows(rows)
 
-        logger.info("Inseridos %d registro(s) de %s", count, request.remote_addr)
-        return jsonify({"status": "success", "inserted": count}), 200
+        logger.info("Inseridos %d registro(s) de %s (%d rejeitado(s), %d duplicado(s))",
+                    result["accepted"], request.remote_addr, result["rejected"], result["duplicates"])
+        return jsonify({"status": "success", "inserted": result["accepted"],
+                        "rejected": result["rejected"] + len(invalid),
+                        "duplicates": result["duplicates"], "details": invalid}), 200
 
     except Exception as e:
         logger.exception("Erro ao processar dados de %s: %s", request.remote_addr, e)
         return jsonify({"error": str(e)}), 500
+
+
+def _append_line_range(ranges, line_number):
+    # Linhas aceitas são reportadas como intervalos [início, fim] para manter a resposta pequena.
+    if ranges and ranges[-1][1] == line_number - 1:
+        ranges[-1][1] = line_number
+    else:
+        ranges.append([line_number, line_number])
+
+@listener_bp.route('/ndjson', methods=['POST'])
+def receive_ndjson():
+    """
+    Recebe um backlog de leituras em NDJSON (uma leitura JSON por linha),
+    opcionalmente com Content-Encoding: gzip.
+    O corpo é lido em streaming e gravado em lotes de NDJSON_CHUNK_SIZE,
+    então o uso de memória não depende do tamanho do upload.
+    Exemplo POST /api/data/ndjson
+    """
+    stream = request.stream
+    if request.headers.get("Content-Encoding", "").lower() == "gzip":
+        stream = gzip.GzipFile(fileobj=stream, mode="rb")
+
+    accepted = 0
+    duplicates = 0
+    accepted_lines = []
+    rejected = []
+    rejected_count = 0
+    chunk, chunk_lines = [], []
+
+    def flush():
+        nonlocal accepted, duplicates
+        if not chunk:
+            return
+        result = db_manager.insert_raw_reads_bulk(chunk)
+        accepted += result["accepted"]
+        duplicates += result["duplicates"]
+        for line_number in chunk_lines:
+            _append_line_range(accepted_lines, line_number)
+        chunk.clear()
+        chunk_lines.clear()
+
+    try:
+        for line_number, record, error in parser.iter_ndjson(stream):
+            if error is None:
+                valid, errors = validate_sensor_payload(record)
+            else:
+                valid, errors = False, [error]
+            if not valid:
+                rejected_count += 1
+                if len(rejected) < MAX_REJECTED_DETAILS:
+                    rejected.append({"line": line_number, "errors": errors})
+                continue
+            chunk.append(record)
+            chunk_lines.append(line_number)
+            if len(chunk) >= NDJSON_CHUNK_SIZE:
+                flush()
+        flush()
+    except (OSError, EOFError) as e:
+        # Corpo gzip corrompido/truncado: o que já foi gravado permanece.
+        flush()
+        logger.warning("Upload NDJSON de %s interrompido: %s", request.remote_addr, e)
+        return jsonify({"error": f"Invalid body: {e}", "accepted": accepted,
+                        "accepted_lines": accepted_lines, "rejected": rejected,
+                        "rejected_count": rejected_count}), 400
+    except Exception as e:
+        logger.exception("Erro ao processar NDJSON de %s: %s", request.remote_addr, e)
+        return jsonify({"error": str(e), "accepted": accepted, "accepted_lines": accepted_lines}), 500
+
+    logger.info("NDJSON de %s: %d aceito(s), %d rejeitado(s), %d duplicado(s)",
+                request.remote_addr, accepted, rejected_count, duplicates)
+    # accepted_lines inclui linhas válidas descartadas como duplicadas (já estavam gravadas).
+    return jsonify({"status": "success", "accepted": accepted, "accepted_lines": accepted_lines,
+                    "duplicates": duplicates, "rejected": rejected, "rejected_count": rejected_count}), 200
+
+
+@listener_bp.route('/stats', methods=['GET'])
+def ingest_stats():
+    """GET /api/data/stats — contadores do cache de sensores e da fila de ingestão."""
+    stats = {"mode": ingest_settings["mode"], "sensor_cache": db_manager.get_sensor_cache_stats()}
+    if ingest_queue is not None:
+        stats["queue"] = ingest_queue.stats()
+    return jsonify(stats), 200
@@ -1,6 +1,6 @@
 import logging
 from flask import Blueprint, request, jsonify
-from db_ops.db_manager import DatabaseManager
+from db_ops.db_manager import get_db_manager
 from modules.reader import DataReader
 from modules.report import ReportGenerator
 
@@ -9,7 +9,7 @@ logger.setLevel(logging.INFO)
 
 report_bp = Blueprint('report', __name__, url_prefix='/report')
 
-db_manager      = DatabaseManager()
+db_manager      = get_db_manager()
 data_reader     = DataReader(db_manager)
 report_generator = ReportGenerator(data_reader)
 
@@ -0,0 +1,81 @@
+# config/__init__.py
+
+import copy
+import logging
+import os
+import yaml
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_PATH = os.path.join(os.path.dirname(__file__), "settings.yaml")
+
+DEFAULTS = {
+    "server": {"host": "0.0.0.0", "port": 5000},
+    "database": {
+        "engine": "sqlite",
+        "name": "ble_data.db",
+        "separate_read_engine": True,
+        "pragmas": {},
+    },
+    "cache": {
+        "sensor_ttl": 30,
+        "last_read_flush_interval": 30,
+        "recent_keys": 100000,
+        "result_max_bytes": 64 * 1024 * 1024,
+        "result_ttl": 60,
+        "result_disk_dir": None,
+        "result_disk_max_bytes": 1024 * 1024 * 1024,
+    },
+    "compaction": {
+        "grace_seconds": 10,
+        "max_minutes_per_cycle": 10080,
+        "rollup_max_days_per_cycle": 31,
+    },
+    "alerts": {
+        "enabled": True,
+        "interval_seconds": 1,
+        "batch_size": 5000,
+        "refresh_seconds": 30,
+        "temp_hysteresis": 0.5,
+        "humidity_hysteresis": 2.0,
+        "min_breach_seconds": 60,
+    },
+    "scheduler": {
+        "mode": "embedded",
+        "check_interval": 60,
+        "jitter": 5,
+    },
+    "ingest": {
+        "mode": "sync",
+        "queue_size": 10000,
+        "batch_size": 500,
+        "flush_interval_ms": 200,
+        "retry_after": 1,
+        "retry_delay_ms": 100,
+        "max_retry_delay_ms": 5000,
+    },
+}
+
+
+def _merge(base, override):
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def load_settings(path=None):
+    """
+    Loads config/settings.yaml (or `path`, or $BLE_SETTINGS) on top of DEFAULTS.
+    Missing files or sections fall back to the defaults.
+    """
+    path = path or os.environ.get("BLE_SETTINGS", SETTINGS_PATH)
+    settings = copy.deepcopy(DEFAULTS)
+    try:
+        with open(path, encoding="utf-8") as fh:
+            _merge(settings, yaml.safe_load(fh) or {})
+    except FileNotFoundError:
+        logger.warning("Settings file %s not found; using defaults.", path)
+    return settings
@@ -0,0 +1,137 @@
+# db_ops/backfill.py
+
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from db_ops.db_manager import get_db_manager, MINUTE_MS, DAY_MS
+from utils.parser import ms_to_iso
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Checkpoint of each sensor in the `watermarks` table: reads_clean was backfilled up to ts.
+CHECKPOINT_PREFIX = "backfill:"
+
+
+def _checkpoint_name(mac):
+    return CHECKPOINT_PREFIX + mac
+
+
+class BackfillProgress:
+    """Prints processed minutes, throughput and ETA over the whole backfill."""
+    def __init__(self, total_minutes, out=print):
+        self.total_minutes = total_minutes
+        self.done_minutes = 0
+        self.rows = 0
+        self.out = out
+        self.started = time.perf_counter()
+
+    def advance(self, minutes, rows, label=""):
+        self.done_minutes += minutes
+        self.rows += rows
+        elapsed = time.perf_counter() - self.started
+        rate = self.done_minutes / elapsed if elapsed > 0 else 0.0
+        remaining = self.total_minutes - self.done_minutes
+        eta = remaining / rate if rate else 0.0
+        pct = 100.0 * self.done_minutes / self.total_minutes if self.total_minutes else 100.0
+        self.out(f"[{pct:5.1f}%] {self.done_minutes}/{self.total_minutes} min, {self.rows} clean rows, "
+                 f"{rate:,.0f} min/s, ETA {eta:.1f} s {label}".rstrip())
+
+
+def _plan_sensor(db, mac, restart):
+    """Returns the [start, end) range (epoch ms, minute aligned) still to backfill for `mac`."""
+    first, last = db.get_raw_ts_range(mac)
+    if first is None:
+        return None
+    start = first - first % MINUTE_MS
+    if not restart:
+        checkpoint = db.get_watermark(_checkpoint_name(mac))
+        if checkpoint is not None:
+            start = max(start, checkpoint)
+    # Só minutos fechados: o minuto corrente fica para o compactador do scheduler.
+    closed_until = int(time.time() * 1000) - db.compaction_grace_ms
+    end = min(last - last % MINUTE_MS + MINUTE_MS, closed_until - closed_until % MINUTE_MS)
+    return (start, end) if end > start else None
+
+
+def backfill_sensor(mac, start, end, chunk_days=7, db_url=None, on_chunk=None):
+    """
+    Backfills reads_clean for one sensor over [start, end) in chunks of `chunk_days`:
+    one grouped INSERT ... SELECT per chunk, with the sensor checkpoint advanced in
+    the same transaction, so an interrupted run resumes after the last chunk.
+    Existing reads_clean rows in the range are recomputed and replaced.
+    Returns the number of clean rows written.
+    """
+    db = get_db_manager(db_url)
+    chunk_ms = max(1, int(chunk_days * DAY_MS) // MINUTE_MS) * MINUTE_MS
+    inserted = 0
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + chunk_ms, end)
+        rows = db.aggregate_clean_minutes(chunk_start, chunk_end, mac=mac, watermark=_checkpoint_name(mac))
+        inserted += rows
+        if on_chunk is not None:
+            on_chunk((chunk_end - chunk_start) // MINUTE_MS, rows)
+        chunk_start = chunk_end
+    return inserted
+
+
+def _backfill_sensor_task(args):
+    mac, start, end, chunk_days, db_url = args
+    return mac, (end - start) // MINUTE_MS, backfill_sensor(mac, start, end, chunk_days, db_url)
+
+
+def backfill_clean_reads_all(chunk_days=7, workers=1, restart=False, db_url=None, out=print):
+    """
+    Rebuilds reads_clean from reads_raw for every sensor, resuming from each
+    sensor's checkpoint unless `restart` is set (which recomputes every minute,
+    replacing the rows already there). With workers > 1 the sensors are
+    spread over a process pool; SQLite still serializes the inserts, so the gain
+    comes from running the aggregations in parallel.
+    Returns {"sensors": n, "minutes": n, "rows": n, "seconds": s}.
+    """
+    db = get_db_manager(db_url)
+    plans = {}
+    for sensor in db.get_all_sensors():
+        plan = _plan_sensor(db, sensor.mac, restart)
+        if plan is None:
+            out(f"Sensor {sensor.mac}: nada a fazer.")
+        else:
+            plans[sensor.mac] = plan
+    total_minutes = sum((end - start) // MINUTE_MS for start, end in plans.values())
+    out(f"Backfill de {len(plans)} sensor(es), {total_minutes} minutos, blocos de {chunk_days} dia(s), "
+        f"{workers} processo(s).")
+    progress = BackfillProgress(total_minutes, out)
+
+    if workers > 1 and len(plans) > 1:
+        tasks = [(mac, start, end, chunk_days, db.db_url) for mac, (start, end) in plans.items()]
+        # spawn: filhos não herdam as conexões SQLite abertas do processo pai.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for future in as_completed([pool.submit(_backfill_sensor_task, task) for task in tasks]):
+                mac, minutes, rows = future.result()
+                progress.advance(minutes, rows, mac)
+    else:
+        for mac, (start, end) in plans.items():
+            out(f"Sensor {mac}: {ms_to_iso(start)} até {ms_to_iso(end)}")
+            backfill_sensor(mac, start, end, chunk_days, db.db_url,
+                            on_chunk=lambda minutes, rows, mac=mac: progress.advance(minutes, rows, mac))
+
+    if progress.rows:
+        # Minutos reescritos abaixo dos rollups: o scheduler os refaz a partir daí.
+        db.rewind_rollups(min(start for start, _ in plans.values()))
+    seconds = time.perf_counter() - progress.started
+    out(f"Backfill concluído: {progress.rows} linhas em reads_clean em {seconds:.1f} s.")
+    return {"sensors": len(plans), "minutes": total_minutes, "rows": progress.rows, "seconds": seconds}
+
+
+def backfill_clean_reads(minutes=60*24, db_url=None):
+    """Aggregates the last `minutes` closed minutes of every sensor in one statement."""
+    db = get_db_manager(db_url)
+    end = int(time.time() * 1000) - db.compaction_grace_ms
+    end -= end % MINUTE_MS
+    rows = db.aggregate_clean_minutes(end - minutes * MINUTE_MS, end)
+    if rows:
+        db.rewind_rollups(end - minutes * MINUTE_MS)
+    print(f"Backfill dos últimos {minutes} minutos: {rows} minutos agregados.")
+    return rows
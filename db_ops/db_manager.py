@@ -1,25 +1,149 @@
 # db_ops/db_manager.py
 
+import atexit
 import logging
-from sqlalchemy import create_engine, func
+from collections import namedtuple
+import threading
+import time
+from sqlalchemy import and_, func, insert, select, union_all, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker, scoped_session
-from db_ops.models import Base, Sensor, AlertPolicy, SchedulePolicy, Warning, ReadRaw, ReadClean, ReadScheduled
-import datetime
+from db_ops.models import Base, Sensor, AlertPolicy, SchedulePolicy, Warning, ReadRaw, ReadClean, ReadScheduled, ReadHourly, ReadDaily, Watermark
+from db_ops.sensor_cache import SensorCache
+from db_ops.recent_keys import RecentKeys
+from db_ops.migrations import check_schema
+from db_ops.partials import AGGREGATE_COLUMNS, merged_select, raw_partials, table_partials
+from db_ops.engine import get_engines, database_url
+from config import load_settings
+from utils.parser import READING_FIELDS, parse_timestamp_ms, ms_to_iso
 
 # Configure module-level logger
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# executemany over plain tuples: no per-row dict or ORM object on the ingest path.
+# OR IGNORE + the unique (mac, ts) index make retried readings a no-op.
+# Same order as READING_FIELDS, with the timestamp stored as epoch ms in `ts`.
+_RAW_COLUMNS = ("ts",) + READING_FIELDS[1:]
+_INSERT_RAW_SQL = "INSERT OR IGNORE INTO reads_raw ({}) VALUES ({})".format(
+    ", ".join(_RAW_COLUMNS), ", ".join("?" for _ in _RAW_COLUMNS))
+
+MINUTE_MS = 60 * 1000
+HOUR_MS = 60 * MINUTE_MS
+DAY_MS = 24 * HOUR_MS
+
+# Watermark of the minute compaction: reads_clean is complete before this ts.
+CLEAN_WATERMARK = "reads_clean"
+HOURLY_WATERMARK = "reads_hourly"
+DAILY_WATERMARK = "reads_daily"
+# Not a watermark proper: when data below the watermarks was last rewritten
+# (backfill, see rewind_rollups). Result caches of every process compare it.
+REWRITE_WATERMARK = "rewritten_at"
+# Oldest reading that arrived after its minute was compacted (below the reads_clean
+# watermark) and is not in reads_clean yet; recompact_late_minutes() consumes it.
+LATE_WATERMARK = "late_reads"
+# Not a timestamp either: id of the last reads_raw row evaluated by the alert engine.
+ALERTS_WATERMARK = "alerts_raw_id"
+
+# Rollups kept by roll_up(): (table, resolution, watermark, source table, source watermark).
+ROLLUPS = (
+    (ReadHourly, HOUR_MS, HOURLY_WATERMARK, ReadClean, CLEAN_WATERMARK),
+    (ReadDaily, DAY_MS, DAILY_WATERMARK, ReadHourly, HOURLY_WATERMARK),
+)
+
+# reads_clean columns delivered by iter_clean_reads.
+CLEAN_STREAM_COLUMNS = ("ts", "mac", "avg_temp", "avg_hum", "min_temp", "max_temp",
+                        "min_hum", "max_hum", "count_temp", "count_hum")
+
+# Period covered by one row of each aggregated table.
+RESOLUTIONS = {ReadClean: MINUTE_MS, ReadHourly: HOUR_MS, ReadDaily: DAY_MS}
+
+
+def _bump_rewrite(session):
+    """Bumps REWRITE_WATERMARK (strictly increasing) inside `session`'s transaction."""
+    current = session.get(Watermark, REWRITE_WATERMARK)
+    session.merge(Watermark(name=REWRITE_WATERMARK,
+                            ts=max(int(time.time() * 1000), (current.ts if current else 0) + 1)))
+
+
+def _rewind_rollups(session, ts):
+    """DatabaseManager.rewind_rollups inside `session`'s transaction."""
+    _bump_rewrite(session)
+    for _, resolution, name, _, _ in ROLLUPS:
+        start = ts - ts % resolution
+        session.execute(update(Watermark).where(Watermark.name == name, Watermark.ts > start).values(ts=start))
+
+
+def _close_warnings(session, closures):
+    """DatabaseManager.close_warnings inside `session`'s transaction."""
+    for mac, alert_type, closed_at in closures:
+        session.execute(update(Warning)
+                        .where(Warning.mac == mac, Warning.type == alert_type, Warning.closed_at.is_(None))
+                        .values(closed_at=closed_at))
+
+
+def _mac_filter(model, macs):
+    """WHERE clause for `macs`: one MAC, a list of MACs, or None for every sensor."""
+    if macs is None:
+        return ()
+    if isinstance(macs, str):
+        return (model.mac == macs,)
+    return (model.mac.in_(list(macs)),)
+
+# One row of the scheduler snapshot: the sensor, its policies (or None) and its
+# latest raw reading within the lookback window (a transient ReadRaw, or None).
+SensorSnapshot = namedtuple("SensorSnapshot", "sensor alert_policy schedule_policy latest")
+
+# DatabaseManager compartilhado por URL (ver get_db_manager).
+_managers = {}
+_managers_lock = threading.Lock()
+
 class DatabaseManager:
     """
     Manages database operations, including CRUD for sensors, warnings, alert and schedule policies,
     as well as raw and aggregated readings.
     """
-    def __init__(self, db_url='sqlite:///ble_data.db'):
-        self.engine = create_engine(db_url, echo=False, future=True)
+    def __init__(self, db_url=None, settings=None):
+        """
+        Uses the process-wide engines for the database in config/settings.yaml
+        (or `settings`); `db_url` overrides the database location. Reads go through
+        ReadSession, which uses a separate query_only pool on file-based SQLite.
+        Tables are not created here: call init_schema() at startup.
+        Application code should use get_db_manager() instead of building its own.
+        """
+        settings = settings or load_settings()
+        db_settings = settings["database"]
+        db_url = db_url or database_url(db_settings)
+        self.db_url = db_url
+        self.engine, self.read_engine = get_engines(db_url, db_settings)
         self.Session = scoped_session(sessionmaker(bind=self.engine))
-        Base.metadata.create_all(self.engine)
+        self.ReadSession = scoped_session(sessionmaker(bind=self.read_engine))
+        check_schema(self.engine)
+        cache_settings = settings["cache"]
+        # Registry of known sensors; last_read writes are coalesced and flushed periodically.
+        self.sensor_cache = SensorCache(ttl=cache_settings["sensor_ttl"])
+        self.last_read_flush_interval = cache_settings["last_read_flush_interval"]
+        self._last_flush = time.monotonic()
+        # Recently ingested (mac, timestamp) keys, checked before hitting the unique index.
+        self.recent_keys = RecentKeys(cache_settings["recent_keys"])
+        compaction_settings = settings["compaction"]
+        self.compaction_grace_ms = compaction_settings["grace_seconds"] * 1000
+        self.compaction_max_minutes = compaction_settings["max_minutes_per_cycle"]
+        self.rollup_max_days = compaction_settings["rollup_max_days_per_cycle"]
+        # Called with the rows of each insert_raw_rows batch (see add_ingest_hook).
+        self._ingest_hooks = []
+        # Bumped by set_alert_policy so in-memory rule tables know when to reload.
+        self.alert_policy_version = 0
+        # Called with the MAC whenever set_schedule_policy changes a policy.
+        self._schedule_policy_listeners = []
+        atexit.register(self.flush_sensor_cache)
         logger.info("Database initialized with URL: %s", db_url)
+
+    def init_schema(self):
+        """Creates missing tables. Runs once at startup (create_app, manage_db.py)."""
+        Base.metadata.create_all(self.engine)
+        check_schema(self.engine)
+        logger.info("Database schema ready at %s", self.db_url)
     
     # -------------------------------
     # Sensor Methods
@@ -27,48 +151,87 @@ class DatabaseManager:
     def insert_sensor_if_not_exists(self, mac, name=None, location=None):
         """
         Inserts a new sensor if it does not already exist.
+        The database is only queried when the MAC is not in the sensor cache.
         """
+        if self.sensor_cache.get(mac) is not None:
+            return
         with self.Session() as session:
             sensor = session.get(Sensor, mac)
             if sensor is None:
-                sensor = Sensor(mac=mac, name=name, location=location)
+                sensor = Sensor(mac=mac, name=name, location=location, is_active=True)
                 session.add(sensor)
                 session.commit()
-                logger.debug("Inserted new sensor: %s", sensor)
+                logger.debug("Inserted new sensor: %s", mac)
             else:
                 logger.debug("Sensor already exists: %s", sensor)
-    
+            self.sensor_cache.put(sensor)
+
     def update_sensor_last_read(self, mac, timestamp):
         """
         Updates the last reading timestamp of the sensor.
+        The write is coalesced in the sensor cache and happens on the next flush.
         """
-        with self.Session() as session:
-            sensor = session.get(Sensor, mac)
-            if sensor:
-                sensor.last_read = timestamp
+        self.sensor_cache.note_last_read(mac, timestamp)
+        self._maybe_flush_sensor_cache()
+
+    def flush_sensor_cache(self):
+        """
+        Writes the coalesced last_read updates to the sensors table in one transaction.
+        Returns the number of sensors updated.
+        """
+        pending = self.sensor_cache.take_pending()
+        self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            with self.Session() as session:
+                existing = set(session.scalars(select(Sensor.mac).where(Sensor.mac.in_(pending))))
+                updates = [{"mac": mac, "last_read": ts} for mac, ts in pending.items() if mac in existing]
+                if updates:
+                    session.execute(update(Sensor), updates)
                 session.commit()
-                logger.debug("Updated sensor %s last_read to %s", mac, timestamp)
-            else:
-                logger.warning("Sensor %s not found during update.", mac)
-    
+        except Exception:
+            self.sensor_cache.restore_pending(pending)
+            raise
+        logger.debug("Flushed last_read for %d sensor(s)", len(updates))
+        return len(updates)
+
+    def _maybe_flush_sensor_cache(self):
+        if time.monotonic() - self._last_flush >= self.last_read_flush_interval:
+            self.flush_sensor_cache()
+
+    def get_sensor_cache_stats(self):
+        """
+        Returns the sensor cache hit/miss counters.
+        """
+        return self.sensor_cache.stats()
+
     def get_sensor(self, mac):
         """
         Retrieves a sensor record by MAC address.
         """
-        with self.Session() as session:
+        sensor = self.sensor_cache.get(mac)
+        if sensor is not None:
+            return sensor
+        with self.ReadSession() as session:
             sensor = session.get(Sensor, mac)
             logger.debug("Retrieved sensor %s: %s", mac, sensor)
-            return sensor
-    
+            if sensor is None:
+                return None
+            return self.sensor_cache.put(sensor)
+
     def get_all_sensors(self):
         """
         Retrieves all sensor records.
         """
-        with self.Session() as session:
+        sensors = self.sensor_cache.get_all()
+        if sensors is not None:
+            return sensors
+        with self.ReadSession() as session:
             sensors = session.query(Sensor).all()
             logger.debug("Retrieved all sensors: %s", sensors)
-            return sensors
-    
+            return self.sensor_cache.load_all(sensors)
+
     # -------------------------------
     # Raw Reading Methods
     # -------------------------------
@@ -77,39 +240,185 @@ class DatabaseManager:
         Inserts a new raw reading.
         Expected data keys: 'timestamp', 'mac', 'temperature', 'humidity', 'rssi', 'type', 'flags'.
         """
-        allowed_keys = {"timestamp", "mac", "temperature", "humidity", "rssi", "type", "flags"}
-        sanitized_data = {k: data[k] for k in allowed_keys if k in data}
-        with self.Session() as session:
-            # Ensure sensor exists and update its last read timestamp.
-            self.insert_sensor_if_not_exists(sanitized_data.get("mac"))
-            self.update_sensor_last_read(sanitized_data.get("mac"), sanitized_data.get("timestamp"))
-            read = ReadRaw(**sanitized_data)
-            session.add(read)
-            session.commit()
-            logger.debug("Inserted raw read for sensor %s: %s", sanitized_data.get("mac"), read)
-    
+        self.insert_raw_reads_bulk([data])
+
+    def insert_raw_reads_bulk(self, records):
+        """
+        Inserts a batch of raw readings (dicts) in a single transaction.
+        Records that are not dicts are rejected; see insert_raw_rows for the rest.
+        Returns a dict with the 'accepted', 'rejected' and 'duplicates' counts.
+        """
+        rows = []
+        rejected = 0
+        for data in records:
+            if not isinstance(data, dict):
+                rejected += 1
+                continue
+            rows.append(tuple(data.get(k) for k in READING_FIELDS))
+        result = self.insert_raw_rows(rows)
+        result["rejected"] += rejected
+        return result
+
+    def add_ingest_hook(self, hook):
+        """
+        Registers hook(rows), called after each insert_raw_rows commit with the
+        rows just written (duplicates dropped by INSERT OR IGNORE are not passed):
+        tuples in READING_FIELDS order with the timestamp as epoch ms. Hooks run in
+        the inserting thread and must be fast.
+        """
+        self._ingest_hooks.append(hook)
+
+    def insert_raw_rows(self, rows):
+        """
+        Inserts raw readings given as tuples in READING_FIELDS order, in a single transaction.
+        Unknown sensors are created as a set, the readings go in with one executemany
+        and each MAC's last_read is updated once, to the newest timestamp in the batch.
+        Timestamps (ISO 8601 or epoch ms) are normalized to epoch ms (UTC).
+        Rows without 'mac' or with a missing/unparseable timestamp are rejected.
+        Readings already stored for the same (mac, ts) are dropped, first by the
+        recent-key filter and then by INSERT OR IGNORE, so retries cost no extra query.
+        Returns a dict with the 'accepted', 'rejected' and 'duplicates' counts.
+        """
+        fresh = []
+        keys = []
+        seen = set()
+        latest = {}
+        rejected = 0
+        duplicates = 0
+        recent_keys = self.recent_keys
+        for row in rows:
+            mac = row[1]
+            try:
+                ts = parse_timestamp_ms(row[0])
+            except (TypeError, ValueError):
+                ts = None
+            if not mac or ts is None:
+                rejected += 1
+                continue
+            key = (mac, ts)
+            if key in seen or key in recent_keys:
+                duplicates += 1
+                continue
+            seen.add(key)
+            keys.append(key)
+            fresh.append((ts,) + tuple(row[1:]))
+            if mac not in latest or ts > latest[mac]:
+                latest[mac] = ts
+
+        inserted = 0
+        if fresh:
+            missing = self.sensor_cache.missing(list(latest))
+            loaded = []
+            with self.Session() as session:
+                if missing:
+                    # Only MACs unknown to the cache reach the sensors table. Rows that
+                    # already existed keep their name and location: the cache gets them
+                    # as stored, read back under the write lock taken by the INSERT.
+                    session.execute(sqlite_insert(Sensor).on_conflict_do_nothing(),
+                                    [{"mac": mac, "is_active": True} for mac in missing])
+                    loaded = session.execute(
+                        select(Sensor.mac, Sensor.name, Sensor.location, Sensor.last_read, Sensor.is_active)
+                        .where(Sensor.mac.in_(missing))).all()
+                inserted = session.connection().exec_driver_sql(_INSERT_RAW_SQL, fresh).rowcount
+                if inserted:
+                    self._note_late_rows(session, min(row[0] for row in fresh), inserted)
+                written = fresh
+                if self._ingest_hooks and inserted < len(fresh):
+                    written = self._inserted_rows(session, fresh, inserted)
+                session.commit()
+            duplicates += len(fresh) - inserted
+            recent_keys.add_many(keys)
+            for sensor in loaded:
+                self.sensor_cache.put(sensor)
+            for mac, ts in latest.items():
+                self.sensor_cache.note_last_read(mac, ms_to_iso(ts))
+            self._maybe_flush_sensor_cache()
+            logger.debug("Bulk inserted %d raw reads for %d sensor(s) (%d duplicate(s), %d cache miss(es))",
+                         inserted, len(latest), duplicates, len(missing))
+            for hook in self._ingest_hooks if written else ():
+                try:
+                    hook(written)
+                except Exception:
+                    logger.exception("Ingest hook %r failed", hook)
+        return {"accepted": inserted, "rejected": rejected, "duplicates": duplicates}
+
+    @staticmethod
+    def _inserted_rows(session, fresh, inserted):
+        """
+        Keeps only the rows of `fresh` that INSERT OR IGNORE actually wrote: the
+        `inserted` rows of highest id, read while the write lock is still ours.
+        """
+        if not inserted:
+            return []
+        last_id = session.execute(select(func.max(ReadRaw.id))).scalar() - inserted
+        written = set(session.execute(select(ReadRaw.mac, ReadRaw.ts).where(ReadRaw.id > last_id)).tuples())
+        return [row for row in fresh if (row[1], row[0]) in written]
+
+    @staticmethod
+    def _note_late_rows(session, oldest_ts, inserted):
+        """
+        Records in LATE_WATERMARK the oldest of the `inserted` readings just written
+        that falls below the reads_clean watermark, in the ingest transaction, and
+        bumps REWRITE_WATERMARK since already compacted data changed.
+        """
+        compacted = session.get(Watermark, CLEAN_WATERMARK)
+        if compacted is None or oldest_ts >= compacted.ts:
+            return
+        # oldest_ts inclui duplicadas descartadas: o mínimo vem só das linhas gravadas, que
+        # (com o lock de escrita do INSERT ainda nosso) são as `inserted` de maior id.
+        last_id = session.execute(select(func.max(ReadRaw.id))).scalar() - inserted
+        oldest_ts = session.execute(
+            select(func.min(ReadRaw.ts)).where(ReadRaw.id > last_id, ReadRaw.ts < compacted.ts)
+        ).scalar()
+        if oldest_ts is None:
+            return
+        upsert = sqlite_insert(Watermark).values(name=LATE_WATERMARK, ts=oldest_ts)
+        session.execute(upsert.on_conflict_do_update(
+            index_elements=[Watermark.name], set_={"ts": func.min(Watermark.ts, upsert.excluded.ts)}))
+        _bump_rewrite(session)
+        logger.info("Late reading(s) from %s below the compaction watermark", ms_to_iso(oldest_ts))
+
     def get_latest_raw_reads(self, mac, limit=100):
         """
         Retrieves the latest raw readings for the given sensor.
         """
-        with self.Session() as session:
+        with self.ReadSession() as session:
             reads = (session.query(ReadRaw)
                            .filter_by(mac=mac)
-                           .order_by(ReadRaw.timestamp.desc())
+                           .order_by(ReadRaw.ts.desc())
                            .limit(limit)
                            .all())
             logger.debug("Retrieved latest %s raw reads for sensor %s: %s", limit, mac, reads)
             return reads
     
+    def get_raw_rows_after(self, last_id, limit):
+        """
+        Returns up to `limit` raw readings with id > last_id, in id order, as
+        (id, ts, mac, temperature, humidity, rssi, type, flags) tuples (ts in epoch ms).
+        SQLite has a single writer and ids are assigned at insert, so ids grow in
+        commit order: resuming from the last id returned never skips a reading.
+        """
+        with self.ReadSession() as session:
+            columns = [ReadRaw.id] + [getattr(ReadRaw, column) for column in _RAW_COLUMNS]
+            return session.execute(select(*columns)
+                                    .where(ReadRaw.id > last_id)
+                                    .order_by(ReadRaw.id)
+                                    .limit(limit)).all()
+
+    def get_last_raw_id(self):
+        """Returns the id of the newest raw reading (0 if there is none)."""
+        with self.ReadSession() as session:
+            return session.execute(select(func.max(ReadRaw.id))).scalar() or 0
+
     def delete_old_raw_reads(self, mac, older_than_timestamp):
         """
-        Deletes raw readings for a sensor that are older than the specified timestamp.
-        Returns the number of records deleted.
+        Deletes raw readings for a sensor that are older than the specified timestamp
+        (ISO 8601 or epoch ms). Returns the number of records deleted.
         """
         with self.Session() as session:
             count = session.query(ReadRaw).filter(
                 ReadRaw.mac == mac,
-                ReadRaw.timestamp < older_than_timestamp
+                ReadRaw.ts < parse_timestamp_ms(older_than_timestamp)
             ).delete()
             session.commit()
             logger.debug("Deleted %s raw reads for sensor %s older than %s", count, mac, older_than_timestamp)
@@ -119,25 +428,38 @@ class DatabaseManager:
         """
         Retrieves the latest clean (aggregated) readings for a sensor.
         """
-        with self.Session() as session:
+        with self.ReadSession() as session:
             reads = (session.query(ReadClean)
                            .filter_by(mac=mac)
-                           .order_by(ReadClean.timestamp.desc())
+                           .order_by(ReadClean.ts.desc())
                            .limit(limit)
                            .all())
             logger.debug("Retrieved latest %s clean reads for sensor %s: %s", limit, mac, reads)
             return reads
 
+    def get_clean_reads(self, mac, start, end):
+        """
+        Recupera leituras limpas (ReadClean) do sensor entre start e end
+        (ISO 8601 ou epoch ms, inclusive), em ordem cronológica.
+        """
+        with self.ReadSession() as session:
+            reads = (session.query(ReadClean)
+                            .filter_by(mac=mac)
+                            .filter(ReadClean.ts.between(parse_timestamp_ms(start), parse_timestamp_ms(end)))
+                            .order_by(ReadClean.ts.asc())
+                            .all())
+            logger.debug("Retrieved %d clean reads for sensor %s between %s and %s", len(reads), mac, start, end)
+            return reads
+
     def get_scheduled_reads(self, mac, start, end):
         """
-        Recupera leituras agregadas (ReadScheduled) para o sensor entre start e end (ISO 8601).
+        Recupera leituras agregadas (ReadScheduled) para o sensor entre start e end (ISO 8601 ou epoch ms).
         """
-        with self.Session() as session:
+        with self.ReadSession() as session:
             reads = (session.query(ReadScheduled)
                             .filter_by(mac=mac)
-                            .filter(ReadScheduled.timestamp >= start)
-                            .filter(ReadScheduled.timestamp <= end)
-                            .order_by(ReadScheduled.timestamp.asc())
+                            .filter(ReadScheduled.ts.between(parse_timestamp_ms(start), parse_timestamp_ms(end)))
+                            .order_by(ReadScheduled.ts.asc())
                             .all())
             return reads
 
@@ -153,12 +475,57 @@ class DatabaseManager:
             session.add(warning)
             session.commit()
             logger.debug("Inserted warning: %s", warning)
+
+    def insert_warnings(self, warnings):
+        """Inserts a list of warning dicts in one transaction."""
+        if not warnings:
+            return
+        with self.Session() as session:
+            session.execute(insert(Warning), warnings)
+            session.commit()
+            logger.debug("Inserted %d warning(s)", len(warnings))
     
+    def close_warnings(self, closures):
+        """
+        Closes open warnings, given as (mac, type, closed_at) tuples: sets closed_at
+        on the warning of that sensor and type that is still open.
+        """
+        if not closures:
+            return
+        with self.Session() as session:
+            _close_warnings(session, closures)
+            session.commit()
+            logger.debug("Closed %d warning(s)", len(closures))
+
+    def apply_alert_transitions(self, opened, closed, last_id=None):
+        """
+        Inserts the `opened` warning dicts and closes the `closed` (mac, type,
+        closed_at) breaches in one transaction, together with the ALERTS_WATERMARK
+        (`last_id`, the last reads_raw id evaluated) when given: a restarted alert
+        engine resumes from the committed warnings and id, never re-reading a row
+        whose transitions were already written.
+        """
+        if not (opened or closed or last_id is not None):
+            return
+        with self.Session() as session:
+            if opened:
+                session.execute(insert(Warning), opened)
+            _close_warnings(session, closed)
+            if last_id is not None:
+                session.merge(Watermark(name=ALERTS_WATERMARK, ts=last_id))
+            session.commit()
+        logger.debug("Alert transitions: %d opened, %d closed (up to raw id %s)", len(opened), len(closed), last_id)
+
+    def get_open_warnings(self):
+        """Retrieves the warnings whose breach has not been closed yet."""
+        with self.ReadSession() as session:
+            return session.query(Warning).filter(Warning.closed_at.is_(None)).all()
+
     def get_warnings(self, mac=None):
         """
         Retrieves warning records. If a MAC address is provided, filters warnings for that sensor.
         """
-        with self.Session() as session:
+        with self.ReadSession() as session:
             query = session.query(Warning)
             if mac:
                 query = query.filter_by(mac=mac)
@@ -187,16 +554,23 @@ class DatabaseManager:
                 policy.humidity_max = humidity_max
             session.commit()
             logger.debug("Set alert policy for sensor %s: %s", mac, policy)
+        self.alert_policy_version += 1
+        self.sensor_cache.invalidate(mac)
 
     def get_alert_policy(self, mac):
         """
         Retrieves the alert policy for a sensor.
         """
-        with self.Session() as session:
+        with self.ReadSession() as session:
             policy = session.query(AlertPolicy).filter_by(mac=mac).first()
             logger.debug("Retrieved alert policy for sensor %s: %s", mac, policy)
             return policy
     
+    def get_alert_policies(self):
+        """Retrieves every alert policy."""
+        with self.ReadSession() as session:
+            return session.query(AlertPolicy).all()
+
     # -------------------------------
     # Schedule Policy Methods
     # -------------------------------
@@ -213,16 +587,34 @@ class DatabaseManager:
             policy.delta_time = delta_time
             session.commit()
             logger.debug("Set schedule policy for sensor %s: %s", mac, policy)
+        self.sensor_cache.invalidate(mac)
+        for listener in self._schedule_policy_listeners:
+            listener(mac)
+
+    def add_schedule_policy_listener(self, listener):
+        """Registers listener(mac), called after set_schedule_policy (e.g. to re-plan the scheduler)."""
+        self._schedule_policy_listeners.append(listener)
     
     def get_schedule_policy(self, mac):
         """
         Retrieves the schedule policy for a sensor.
         """
-        with self.Session() as session:
+        with self.ReadSession() as session:
             policy = session.query(SchedulePolicy).filter_by(mac=mac).first()
             logger.debug("Retrieved schedule policy for sensor %s: %s", mac, policy)
             return policy
     
+    def touch_schedule_policies(self, macs, timestamp):
+        """Sets last_update of the schedule policies of `macs` in one statement."""
+        if not macs:
+            return
+        with self.Session() as session:
+            session.execute(update(SchedulePolicy)
+                            .where(SchedulePolicy.mac.in_(list(macs)))
+                            .values(last_update=timestamp))
+            session.commit()
+            logger.debug("Updated schedule policy last_update for %d sensor(s) to %s", len(macs), timestamp)
+
     def update_schedule_policy_last_update(self, mac, timestamp):
         """
         Updates the last update timestamp for a sensor's schedule policy.
@@ -236,85 +628,349 @@ class DatabaseManager:
             else:
                 logger.warning("Schedule policy for sensor %s not found.", mac)
     
+    def get_scheduler_snapshot(self, since_ms):
+        """
+        Loads everything one scheduler cycle needs in a single query: every
+        sensor with its alert and schedule policies, plus its latest raw reading
+        at or after `since_ms` (picked with ROW_NUMBER() over the readings in that
+        window, which the ts index keeps small).
+        Returns a list of SensorSnapshot.
+        """
+        ranked = select(
+            ReadRaw.mac, ReadRaw.ts, ReadRaw.temperature, ReadRaw.humidity, ReadRaw.rssi,
+            func.row_number().over(partition_by=ReadRaw.mac, order_by=ReadRaw.ts.desc()).label("rn"),
+        ).where(ReadRaw.ts >= since_ms).subquery("latest")
+        with self.ReadSession() as session:
+            rows = (session.query(Sensor, AlertPolicy, SchedulePolicy,
+                                  ranked.c.ts, ranked.c.temperature, ranked.c.humidity, ranked.c.rssi)
+                    .outerjoin(AlertPolicy, AlertPolicy.mac == Sensor.mac)
+                    .outerjoin(SchedulePolicy, SchedulePolicy.mac == Sensor.mac)
+                    .outerjoin(ranked, and_(ranked.c.mac == Sensor.mac, ranked.c.rn == 1))
+                    .all())
+            snapshot = []
+            for sensor, alert_policy, schedule_policy, ts, temperature, humidity, rssi in rows:
+                latest = None
+                if ts is not None:
+                    latest = ReadRaw(mac=sensor.mac, ts=ts, temperature=temperature, humidity=humidity, rssi=rssi)
+                snapshot.append(SensorSnapshot(sensor, alert_policy, schedule_policy, latest))
+            logger.debug("Scheduler snapshot: %d sensors", len(snapshot))
+            return snapshot
+
     # -------------------------------
     # Readings Compression Methods
     # -------------------------------
     def compress_minute_reads(self, mac, minute_start):
+        """
+        Aggregates one minute of raw readings into a ReadClean row.
+        minute_start may be ISO 8601 ('2025-05-29T16:42') or epoch ms; it is floored to the minute.
+        """
+        minute_ms = parse_timestamp_ms(minute_start)
+        minute_ms -= minute_ms % MINUTE_MS
+        if self.aggregate_clean_minutes(minute_ms, minute_ms + MINUTE_MS, mac=mac):
+            logger.info("Compressed minute reads for sensor %s at %s", mac, minute_start)
+        else:
+            logger.debug("Nothing to compress for %s at %s", mac, minute_start)
+
+    def get_raw_ts_range(self, mac=None):
+        """Returns (first_ts, last_ts) in epoch ms of the raw readings (of one sensor), or (None, None)."""
+        with self.ReadSession() as session:
+            query = session.query(func.min(ReadRaw.ts), func.max(ReadRaw.ts))
+            if mac is not None:
+                query = query.filter(ReadRaw.mac == mac)
+            return tuple(query.one())
+
+    def get_watermark(self, name=CLEAN_WATERMARK):
+        """Returns the watermark ts (epoch ms) of an incremental job, or None."""
+        with self.ReadSession() as session:
+            watermark = session.get(Watermark, name)
+            return watermark.ts if watermark else None
+
+    def get_watermarks(self):
+        """Returns every watermark as {name: ts}, in one query."""
+        with self.ReadSession() as session:
+            return dict(session.query(Watermark.name, Watermark.ts).all())
+
+    def compact_closed_minutes(self, now_ms=None):
+        """
+        Aggregates every closed minute since the reads_clean watermark, for all
+        sensors, with one INSERT ... SELECT ... GROUP BY (mac, minute), then
+        advances the watermark in the same transaction.
+        A minute counts as closed `grace_seconds` after it ends. The first run
+        starts at the oldest raw reading, and a run never covers more than
+        `max_minutes_per_cycle`, so a backlog is caught up over a few cycles.
+        Readings that arrive after their minute was compacted are flagged at ingest
+        (LATE_WATERMARK) and folded in by recompact_late_minutes().
+        Returns {"from": ms, "to": ms, "rows": reads_clean rows written}.
+        """
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        closed_until = now_ms - self.compaction_grace_ms
+        closed_until -= closed_until % MINUTE_MS
+        start = self.get_watermark(CLEAN_WATERMARK)
+        if start is None:
+            first = self.get_raw_ts_range()[0]
+            if first is None:
+                return {"from": None, "to": None, "rows": 0}
+            start = first - first % MINUTE_MS
+        end = min(closed_until, start + self.compaction_max_minutes * MINUTE_MS)
+        if end <= start:
+            return {"from": start, "to": start, "rows": 0}
+        inserted = self.aggregate_clean_minutes(start, end, watermark=CLEAN_WATERMARK)
+        logger.info("Compacted %d sensor-minute(s) from %s to %s", inserted, ms_to_iso(start), ms_to_iso(end))
+        return {"from": start, "to": end, "rows": inserted}
+
+    def aggregate_clean_minutes(self, start_ms, end_ms, mac=None, watermark=None):
+        """
+        Aggregates the raw readings in [start_ms, end_ms) into one reads_clean row
+        per (mac, minute) with a single INSERT ... SELECT ... GROUP BY, optionally
+        for one sensor only. If `watermark` is given it is set to end_ms in the same
+        transaction. Minutes already present in reads_clean are recomputed from the
+        raw readings and replaced, so rows written while their minute was still open
+        (as the old per-minute compaction did) are fixed by the catch-up and the
+        backfill; minutes without raw readings are left untouched.
+        Returns the number of rows written.
+        """
+        where = [ReadRaw.ts >= start_ms, ReadRaw.ts < end_ms]
+        if mac is not None:
+            where.append(ReadRaw.mac == mac)
         with self.Session() as session:
-            exists = session.query(ReadClean).filter_by(mac=mac, timestamp=minute_start).first()
-            if exists:
-                logger.debug("Already compressed for %s at %s", mac, minute_start)
-                return
-
-            # Pega todas as leituras daquele minuto, qualquer segundo/milissegundo/fuso
-            prefix = minute_start  # '2025-05-29T16:42'
-            rows = session.query(ReadRaw).filter(
-                ReadRaw.mac == mac,
-                ReadRaw.timestamp.like(f"{prefix}%")
-            )
-            count_raw = rows.count()
-            if count_raw == 0:
-                logger.debug("No RAWs for %s at %s", mac, minute_start)
-                return
-
-            aggregates = rows.with_entities(
-                func.avg(ReadRaw.temperature).label("avg_temp"),
-                func.avg(ReadRaw.humidity).label("avg_hum"),
-                func.min(ReadRaw.temperature).label("min_temp"),
-                func.max(ReadRaw.temperature).label("max_temp"),
-                func.min(ReadRaw.humidity).label("min_hum"),
-                func.max(ReadRaw.humidity).label("max_hum")
-            ).first()
-
-            if aggregates and aggregates.avg_temp is not None:
-                clean_read = ReadClean(
-                    timestamp=minute_start,
-                    mac=mac,
-                    avg_temp=aggregates.avg_temp,
-                    avg_hum=aggregates.avg_hum,
-                    min_temp=aggregates.min_temp,
-                    max_temp=aggregates.max_temp,
-                    min_hum=aggregates.min_hum,
-                    max_hum=aggregates.max_hum,
-                    flags=""
+            inserted = session.execute(
+                insert(ReadClean).prefix_with("OR REPLACE").from_select(
+                    ["ts", "mac", *AGGREGATE_COLUMNS],
+                    merged_select(raw_partials(*where), MINUTE_MS),
                 )
-                session.add(clean_read)
+            ).rowcount
+            if watermark is not None:
+                session.merge(Watermark(name=watermark, ts=end_ms))
+            session.commit()
+        return inserted
+
+    def set_watermark(self, name, ts):
+        """Sets (or, with ts=None, removes) the watermark of an incremental job."""
+        with self.Session() as session:
+            if ts is None:
+                session.query(Watermark).filter_by(name=name).delete()
+            else:
+                session.merge(Watermark(name=name, ts=ts))
+            session.commit()
+
+    def roll_up(self):
+        """
+        Extends the hourly and daily rollups up to their source's watermark:
+        reads_clean -> reads_hourly -> reads_daily, one INSERT ... SELECT merging
+        the source partials per (mac, hour|day) and the watermark advanced in the
+        same transaction. Only periods that lie entirely below the source
+        watermark are written, so each row is final when it appears. A run covers
+        at most `rollup_max_days_per_cycle` days per table.
+        Returns {table: rows written}.
+        """
+        written = {}
+        watermarks = self.get_watermarks()
+        for model, resolution, name, source, source_name in ROLLUPS:
+            source_until = watermarks.get(source_name)
+            if source_until is None:
+                continue
+            start = watermarks.get(name)
+            if start is None:
+                with self.ReadSession() as session:
+                    first = session.query(func.min(source.ts)).scalar()
+                if first is None:
+                    continue
+                start = first - first % resolution
+            end = min(source_until - source_until % resolution, start + self.rollup_max_days * DAY_MS)
+            if end <= start:
+                continue
+            with self.Session() as session:
+                rows = session.execute(
+                    insert(model).prefix_with("OR REPLACE").from_select(
+                        ["ts", "mac", *AGGREGATE_COLUMNS],
+                        merged_select(table_partials(source, source.ts >= start, source.ts < end), resolution),
+                    )
+                ).rowcount
+                session.merge(Watermark(name=name, ts=end))
                 session.commit()
-                logger.info("Compressed minute reads for sensor %s at %s (%d RAWs)", mac, minute_start, count_raw)
+            # O diário lê o horário recém-estendido no mesmo ciclo.
+            watermarks[name] = end
+            written[model.__tablename__] = rows
+            logger.info("Rolled up %d row(s) into %s from %s to %s",
+                        rows, model.__tablename__, ms_to_iso(start), ms_to_iso(end))
+        return written
 
-    
-    def compress_schedule_reads(self, mac, start_timestamp, end_timestamp):
+    def rewind_rollups(self, ts):
         """
-        Aggregates raw readings for a sensor over a specified interval into a scheduled reading.
+        Moves the rollup watermarks back to the period containing `ts` (epoch ms),
+        after reads_clean was rewritten there (backfill); the next roll_up()
+        rebuilds those periods. Also bumps REWRITE_WATERMARK, so cached results
+        over already compacted ranges are dropped.
         """
         with self.Session() as session:
-            aggregates = session.query(
-                func.avg(ReadRaw.temperature).label("avg_temp"),
-                func.avg(ReadRaw.humidity).label("avg_hum"),
-                func.min(ReadRaw.temperature).label("min_temp"),
-                func.max(ReadRaw.temperature).label("max_temp"),
-                func.min(ReadRaw.humidity).label("min_hum"),
-                func.max(ReadRaw.humidity).label("max_hum")
-            ).filter(
-                ReadRaw.mac == mac,
-                ReadRaw.timestamp.between(start_timestamp, end_timestamp)
-            ).first()
-            if aggregates and aggregates.avg_temp is not None:
-                scheduled_read = ReadScheduled(
-                    timestamp=start_timestamp,
-                    mac=mac,
-                    avg_temp=aggregates.avg_temp,
-                    avg_hum=aggregates.avg_hum,
-                    min_temp=aggregates.min_temp,
-                    max_temp=aggregates.max_temp,
-                    min_hum=aggregates.min_hum,
-                    max_hum=aggregates.max_hum,
-                    flags=""
+            _rewind_rollups(session, ts)
+            session.commit()
+
+    def recompact_late_minutes(self):
+        """
+        Re-aggregates the reads_clean minutes that received readings after they were
+        compacted: from LATE_WATERMARK up to the reads_clean watermark (at most
+        `max_minutes_per_cycle` per run), INSERT OR REPLACE of the raw partials merged
+        per (mac, minute). In the same transaction the rollups are rewound to the
+        first rewritten period, REWRITE_WATERMARK is bumped and LATE_WATERMARK is
+        advanced past the minutes rebuilt (or cleared). Readings that arrive while
+        this runs either make it into the rebuild or move LATE_WATERMARK back again.
+        Returns {"from": ms, "to": ms, "rows": reads_clean rows rewritten}.
+        """
+        watermarks = self.get_watermarks()
+        late, compacted = watermarks.get(LATE_WATERMARK), watermarks.get(CLEAN_WATERMARK)
+        if late is None or compacted is None:
+            return {"from": None, "to": None, "rows": 0}
+        start = late - late % MINUTE_MS
+        end = min(compacted, start + self.compaction_max_minutes * MINUTE_MS)
+        with self.Session() as session:
+            rows = session.execute(
+                insert(ReadClean).prefix_with("OR REPLACE").from_select(
+                    ["ts", "mac", *AGGREGATE_COLUMNS],
+                    merged_select(raw_partials(ReadRaw.ts >= start, ReadRaw.ts < end), MINUTE_MS),
                 )
-                session.add(scheduled_read)
-                session.commit()
-                logger.debug("Compressed schedule reads for sensor %s from %s to %s: %s",
-                             mac, start_timestamp, end_timestamp, scheduled_read)
+            ).rowcount
+            # Relidos já dentro da transação de escrita: nada mais muda até o commit.
+            marker = session.get(Watermark, LATE_WATERMARK)
+            compacted = session.get(Watermark, CLEAN_WATERMARK).ts
+            if marker is not None and marker.ts >= start:
+                if end >= compacted:
+                    session.delete(marker)
+                else:
+                    marker.ts = end
+            _rewind_rollups(session, start)
+            session.commit()
+        logger.info("Re-aggregated %d late sensor-minute(s) from %s to %s", rows, ms_to_iso(start), ms_to_iso(end))
+        return {"from": start, "to": end, "rows": rows}
+
+    @staticmethod
+    def _segments_partials(segments, macs=None):
+        """
+        union_all of the partials over the (table, start_ms, end_ms) segments, or
+        None. `macs` is one MAC, a list of MACs, or None for every sensor.
+        """
+        selects = []
+        for model, start, end in segments:
+            if model is ReadRaw:
+                selects.append(raw_partials(ReadRaw.ts >= start, ReadRaw.ts < end, *_mac_filter(ReadRaw, macs)))
+            else:
+                selects.append(table_partials(model, model.ts >= start, model.ts < end, *_mac_filter(model, macs)))
+        if not selects:
+            return None
+        return union_all(*selects) if len(selects) > 1 else selects[0]
+
+    def get_partials(self, mac, segments):
+        """
+        Returns the partial rows of a sensor over a query plan: `segments` is a
+        list of (table, start_ms, end_ms) with end exclusive, where table is one
+        of the aggregated models or ReadRaw (read as one-reading partials).
+        Rows have ts, mac and the PARTIAL_COLUMNS, in ts order.
+        """
+        query = self._segments_partials(segments, mac)
+        if query is None:
+            return []
+        with self.ReadSession() as session:
+            rows = session.execute(query.order_by("ts")).all()
+        logger.debug("Retrieved %d partial row(s) for sensor %s from %d segment(s)", len(rows), mac, len(segments))
+        return rows
+
+    def get_bucketed_reads(self, mac, segments, bucket_ms, origin):
+        """
+        Aggregates a sensor's partials over a query plan into buckets of
+        `bucket_ms` starting at `origin`, in SQL: one GROUP BY on the bucket with
+        first/last values from ROW_NUMBER windows (see merged_select).
+        Rows have ts (bucket start), mac and the AGGREGATE_COLUMNS, in ts order;
+        buckets without temperature readings are left out.
+        """
+        return list(self.iter_bucketed_reads(segments, bucket_ms, origin, macs=mac))
+
+    def iter_bucketed_reads(self, segments, bucket_ms, origin, macs=None, batch_size=1000):
+        """
+        Same as get_bucketed_reads for many sensors at once (`macs`: list, one
+        MAC, or None for all): a single GROUP BY (mac, bucket) over the plan,
+        yielded in (mac, ts) order and fetched `batch_size` rows at a time.
+        Segments whose rows already are whole buckets (an hourly tier for 1 h
+        buckets, say) are read as they are instead of going through the merge.
+        """
+        def is_bucket(model, start):
+            return RESOLUTIONS.get(model) == bucket_ms and (start - origin) % bucket_ms == 0
+
+        merged = [segment for segment in segments if not is_bucket(*segment[:2])]
+        selects = [
+            select(model.ts, model.mac, *(getattr(model, c) for c in AGGREGATE_COLUMNS)).where(
+                model.ts >= start, model.ts < end, model.count_temp > 0, *_mac_filter(model, macs))
+            for model, start, end in segments if is_bucket(model, start)
+        ]
+        if merged:
+            selects.append(merged_select(self._segments_partials(merged, macs), bucket_ms, origin))
+        if not selects:
+            return
+        buckets = (union_all(*selects) if len(selects) > 1 else selects[0]).order_by("mac", "ts")
+        yield from self._stream(buckets, batch_size)
+
+    def _stream(self, query, batch_size):
+        # Core direto na conexão: linhas simples, sem a camada de carregamento do ORM.
+        with self.ReadSession() as session:
+            yield from session.connection().execute(query.execution_options(yield_per=batch_size))
+
+    def _stream_range(self, model, columns, start_ms, end_ms, macs, batch_size):
+        # Sem filtro, a lista de sensores conhecidos: com mac IN (...) o SQLite percorre o
+        # índice (mac, ts) já na ordem pedida; sem ele, ordenaria o período inteiro antes
+        # da primeira linha. Resolvida aqui, só quando o gerador é consumido.
+        if macs is None:
+            macs = sorted(sensor.mac for sensor in self.get_all_sensors())
+        query = (select(*(getattr(model, c) for c in columns))
+                 .where(model.ts >= start_ms, model.ts < end_ms, *_mac_filter(model, macs))
+                 .order_by(model.mac, model.ts))
+        yield from self._stream(query, batch_size)
+
+    def iter_clean_reads(self, start_ms, end_ms, macs=None, batch_size=1000):
+        """
+        Streams reads_clean rows in [start_ms, end_ms) in (mac, ts) order, following
+        the (mac, ts) index, `batch_size` rows at a time: the first rows arrive
+        before the range has been read. Columns: CLEAN_STREAM_COLUMNS.
+        """
+        return self._stream_range(ReadClean, CLEAN_STREAM_COLUMNS, start_ms, end_ms, macs, batch_size)
+
+    def iter_raw_reads(self, start_ms, end_ms, macs=None, batch_size=1000):
+        """Same as iter_clean_reads for reads_raw; columns are _RAW_COLUMNS (ts first)."""
+        return self._stream_range(ReadRaw, _RAW_COLUMNS, start_ms, end_ms, macs, batch_size)
+
+    def compress_schedule_reads(self, mac, start_timestamp, end_timestamp):
+        """
+        Aggregates a sensor's readings over [start, end) into a scheduled reading
+        stored at `start`. Bounds may be ISO 8601 or epoch ms.
+        Whole minutes already compacted into reads_clean are merged from their
+        partials; only the uncompacted tail and unaligned edges are read from
+        reads_raw, so the cost no longer grows with the length of the window.
+        """
+        start_ms = parse_timestamp_ms(start_timestamp)
+        end_ms = parse_timestamp_ms(end_timestamp)
+        if end_ms <= start_ms:
+            return
+        compacted = self.get_watermark(CLEAN_WATERMARK)
+        clean_from = -(-start_ms // MINUTE_MS) * MINUTE_MS
+        clean_to = min(end_ms - end_ms % MINUTE_MS, compacted if compacted is not None else clean_from)
+        if clean_to > clean_from:
+            partials = union_all(
+                table_partials(ReadClean, ReadClean.mac == mac, ReadClean.ts >= clean_from, ReadClean.ts < clean_to),
+                raw_partials(ReadRaw.mac == mac, ReadRaw.ts >= start_ms, ReadRaw.ts < clean_from),
+                raw_partials(ReadRaw.mac == mac, ReadRaw.ts >= clean_to, ReadRaw.ts < end_ms),
+            )
+        else:
+            partials = raw_partials(ReadRaw.mac == mac, ReadRaw.ts >= start_ms, ReadRaw.ts < end_ms)
+        with self.Session() as session:
+            # OR REPLACE: recalcular o mesmo intervalo substitui a linha em vez de violar a PK.
+            written = session.execute(
+                insert(ReadScheduled).prefix_with("OR REPLACE").from_select(
+                    ["ts", "mac", *AGGREGATE_COLUMNS],
+                    merged_select(partials, end_ms - start_ms, origin=start_ms),
+                )
+            ).rowcount
+            session.commit()
+        logger.debug("Compressed schedule reads for sensor %s from %s to %s (%d row)",
+                     mac, start_timestamp, end_timestamp, written)
 
     def rename_sensor(self, mac, name):
         """
@@ -326,51 +982,23 @@ class DatabaseManager:
                 sensor.name = name
                 session.commit()
                 logger.debug("Renamed sensor %s to '%s'", mac, name)
+                self.sensor_cache.invalidate(mac)
                 return True
             else:
                 logger.warning("Sensor %s not found for renaming.", mac)
                 return False
 
 
-def backfill_clean_reads(minutes=60*24):
-    db = DatabaseManager()
-    sensors = db.get_all_sensors()
-    for sensor in sensors:
-        print(f"Backfill {minutes} minutos para {sensor.mac}")
-        count = 0
-        for minute in range(minutes):
-            ts = (datetime.datetime.utcnow() - datetime.timedelta(minutes=minute)).replace(second=0, microsecond=0)
-            before = db.get_latest_clean_reads(sensor.mac, 1)
-            db.compress_minute_reads(sensor.mac, ts.isoformat())
-            after = db.get_latest_clean_reads(sensor.mac, 1)
-            if len(after) > len(before):
-                count += 1
-        print(f"Sensor {sensor.mac}: {count} novos minutos agregados.")
-
-def backfill_clean_reads_all():
-    from db_ops.db_manager import DatabaseManager
-    import datetime
-
-    db = DatabaseManager()
-    sensors = db.get_all_sensors()
-    for sensor in sensors:
-        print(f"Backfilling for sensor: {sensor.mac}")
-        with db.Session() as session:
-            min_ts = session.query(func.min(ReadRaw.timestamp)).filter(ReadRaw.mac == sensor.mac).scalar()
-            max_ts = session.query(func.max(ReadRaw.timestamp)).filter(ReadRaw.mac == sensor.mac).scalar()
-        if not min_ts or not max_ts:
-            print(f"Nenhum dado RAW para {sensor.mac}. Pulando.")
-            continue
-        min_dt = datetime.datetime.fromisoformat(str(min_ts)[:16])  # até minutos
-        max_dt = datetime.datetime.fromisoformat(str(max_ts)[:16])
-        total_minutes = int((max_dt - min_dt).total_seconds() // 60)
-        print(f"Sensor {sensor.mac}: {total_minutes} minutos de {min_dt} até {max_dt}")
-        count = 0
-        for m in range(total_minutes+1):
-            ts = (min_dt + datetime.timedelta(minutes=m)).replace(second=0, microsecond=0)
-            minute_str = ts.isoformat(timespec='minutes')
-            db.compress_minute_reads(sensor.mac, minute_str)
-            count += 1
-            if count % 200 == 0:
-                print(f"  {count} minutos processados...")
-        print(f"Sensor {sensor.mac}: backfill concluído ({count} minutos).")
+def get_db_manager(db_url=None):
+    """
+    Returns the DatabaseManager shared by every component of the process for
+    `db_url` (default: the database in config/settings.yaml), so listener,
+    dashboard, report, service and scheduler share engines and the sensor cache.
+    """
+    db_url = db_url or database_url(load_settings()["database"])
+    with _managers_lock:
+        manager = _managers.get(db_url)
+        if manager is None:
+            manager = _managers[db_url] = DatabaseManager(db_url)
+        return manager
+
@@ -0,0 +1,141 @@
+# db_ops/engine.py
+
+import logging
+import threading
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, text
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Applied to every SQLite connection unless overridden in settings.yaml (database.pragmas).
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",        # leitores não bloqueiam o escritor (e vice-versa)
+    "synchronous": "NORMAL",      # seguro com WAL; fsync só nos checkpoints
+    "busy_timeout": 5000,         # ms esperando o lock de escrita antes de "database is locked"
+    "mmap_size": 268435456,       # 256 MiB mapeados em memória para leitura
+    "cache_size": -65536,         # 64 MiB de page cache por conexão (negativo = KiB)
+}
+
+# Contador de queries da thread atual, ativo só dentro de count_queries().
+_query_counter = threading.local()
+
+# Um par de engines por URL no processo inteiro (ver get_engines).
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def database_url(db_settings):
+    """Builds the SQLAlchemy URL from the `database` section of settings.yaml."""
+    if db_settings.get("url"):
+        return db_settings["url"]
+    return f"sqlite:///{db_settings.get('name', 'ble_data.db')}"
+
+
+def is_file_sqlite(db_url):
+    return db_url.startswith("sqlite:///") and ":memory:" not in db_url
+
+
+def _install_pragmas(engine, pragmas, read_only):
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            # journal_mode é persistente no arquivo; só a conexão de escrita o define.
+            if read_only and name == "journal_mode":
+                continue
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=1")
+        cursor.close()
+
+
+class QueryCount:
+    count = 0
+
+
+@contextmanager
+def count_queries():
+    """
+    Counts the statements executed by the current thread, on any engine created
+    here, while the block runs: `with count_queries() as counter: ...; counter.count`.
+    """
+    counter = QueryCount()
+    previous = getattr(_query_counter, "current", None)
+    _query_counter.current = counter
+    try:
+        yield counter
+    finally:
+        _query_counter.current = previous
+
+
+def _install_query_counter(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        counter = getattr(_query_counter, "current", None)
+        if counter is not None:
+            counter.count += 1
+
+
+def applied_pragmas(engine, names):
+    """Reads back the effective value of each pragma on a pooled connection."""
+    with engine.connect() as conn:
+        return {name: conn.execute(text(f"PRAGMA {name}")).scalar() for name in names}
+
+
+def create_engines(db_url, db_settings=None):
+    """
+    Creates the (write_engine, read_engine) pair for a database URL.
+    File-based SQLite gets the tuned pragmas and, if `separate_read_engine` is on,
+    a second pool of query_only connections so dashboard/report readers never
+    queue behind ingest writers. Other URLs share a single engine.
+    """
+    db_settings = db_settings or {}
+    if not is_file_sqlite(db_url):
+        engine = create_engine(db_url, echo=False, future=True)
+        _install_query_counter(engine)
+        return engine, engine
+
+    pragmas = dict(DEFAULT_PRAGMAS, **(db_settings.get("pragmas") or {}))
+    write_engine = create_engine(db_url, echo=False, future=True,
+                                 pool_size=db_settings.get("write_pool_size", 5),
+                                 max_overflow=db_settings.get("write_max_overflow", 5))
+    _install_pragmas(write_engine, pragmas, read_only=False)
+    _install_query_counter(write_engine)
+    logger.info("SQLite pragmas (write) for %s: %s", db_url, applied_pragmas(write_engine, pragmas))
+
+    if not db_settings.get("separate_read_engine", True):
+        return write_engine, write_engine
+
+    read_engine = create_engine(db_url, echo=False, future=True,
+                                pool_size=db_settings.get("read_pool_size", 10),
+                                max_overflow=db_settings.get("read_max_overflow", 10))
+    _install_pragmas(read_engine, pragmas, read_only=True)
+    _install_query_counter(read_engine)
+    logger.info("SQLite pragmas (read) for %s: %s", db_url,
+                applied_pragmas(read_engine, list(pragmas) + ["query_only"]))
+    return write_engine, read_engine
+
+
+def get_engines(db_url, db_settings=None):
+    """
+    Returns the process-wide (write_engine, read_engine) pair for `db_url`,
+    creating it on first use. Later calls get the same engines (and pools)
+    regardless of `db_settings`.
+    """
+    with _engines_lock:
+        engines = _engines.get(db_url)
+        if engines is None:
+            engines = _engines[db_url] = create_engines(db_url, db_settings)
+        return engines
+
+
+def dispose_engines(db_url=None):
+    """Closes the pools for `db_url` (or every URL) and drops them from the registry."""
+    with _engines_lock:
+        urls = [db_url] if db_url else list(_engines)
+        for url in urls:
+            engines = _engines.pop(url, None)
+            if engines is not None:
+                for engine in set(engines):
+                    engine.dispose()
@@ -0,0 +1,215 @@
+# db_ops/migrations.py
+
+import logging
+from sqlalchemy import text
+from db_ops.models import Base
+from utils.parser import parse_timestamp_ms
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+RAW_DEDUP_INDEX = "ux_reads_raw_mac_ts"
+
+# Tables with the PartialAggregateMixin columns.
+PARTIAL_TABLES = ("reads_clean", "reads_scheduled", "reads_hourly", "reads_daily")
+
+# Reading tables whose ISO `timestamp` TEXT column became the integer `ts` (epoch ms).
+EPOCH_TABLES = ("reads_raw", "reads_clean", "reads_scheduled")
+
+
+def _index_exists(conn, name):
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"), {"name": name}
+    ).first() is not None
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))]
+
+
+def _iso_to_ms(value):
+    try:
+        return parse_timestamp_ms(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def check_schema(engine):
+    """
+    Fails fast when the database still has ISO-string reading tables, or an
+    existing table lacks a column added to the models since it was created.
+    Raises RuntimeError pointing at `python manage_db.py migrate`.
+    """
+    with engine.connect() as conn:
+        for table in EPOCH_TABLES:
+            columns = _columns(conn, table)
+            if "timestamp" in columns and "ts" not in columns:
+                raise RuntimeError(
+                    f"Table {table} still stores ISO timestamps; run `python manage_db.py migrate`."
+                )
+        for table in Base.metadata.sorted_tables:
+            columns = _columns(conn, table.name)
+            missing = [c.name for c in table.columns if columns and c.name not in columns]
+            if missing:
+                raise RuntimeError(
+                    f"Table {table.name} lacks column(s) {', '.join(missing)}; run `python manage_db.py migrate`."
+                )
+
+
+def add_missing_columns(engine):
+    """
+    Adds nullable columns declared in db_ops.models that existing tables lack
+    (create_all never alters a table). Returns ["table.column", ...].
+    """
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            columns = _columns(conn, table.name)
+            if not columns:
+                continue
+            for column in table.columns:
+                if column.name in columns or not column.nullable or column.primary_key:
+                    continue
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                added.append(f"{table.name}.{column.name}")
+                logger.info("Added column %s.%s", table.name, column.name)
+    return added
+
+
+def fill_missing_partials(engine):
+    """
+    Fills the mergeable partials of aggregated rows written before they existed.
+    The raw readings behind those rows are not counted again: each legacy row
+    counts as a single reading of its average, stamped at its own ts.
+    Returns the number of rows filled.
+    """
+    filled = 0
+    with engine.begin() as conn:
+        for table in PARTIAL_TABLES:
+            if "count_temp" not in _columns(conn, table):
+                continue
+            filled += conn.execute(text(
+                f"UPDATE {table} SET "
+                "sum_temp = avg_temp, count_temp = (avg_temp IS NOT NULL), "
+                "sum_hum = avg_hum, count_hum = (avg_hum IS NOT NULL), "
+                "first_ts = ts, first_temp = avg_temp, first_hum = avg_hum, "
+                "last_ts = ts, last_temp = avg_temp, last_hum = avg_hum "
+                "WHERE count_temp IS NULL"
+            )).rowcount
+    if filled:
+        logger.info("Filled partials of %d legacy aggregated row(s)", filled)
+    return filled
+
+
+def migrate_epoch_timestamps(engine):
+    """
+    Rebuilds reading tables that still have the legacy TEXT `timestamp` column
+    into the current schema with an integer `ts` (epoch ms, UTC). Offsets and
+    mixed precision are normalized in Python. Rows whose timestamp cannot be
+    parsed are moved, unchanged, to a `<table>_unparseable` quarantine table
+    for the operator to fix or discard; readings that collide once normalized
+    (the same instant written with different offsets) are kept once.
+    Returns ({table: rows_copied}, {table: rows_quarantined}).
+    """
+    copied = {}
+    quarantined = {}
+    for table_name in EPOCH_TABLES:
+        with engine.begin() as conn:
+            columns = _columns(conn, table_name)
+            if "timestamp" not in columns or "ts" in columns:
+                continue
+            legacy = f"{table_name}_legacy"
+            conn.connection.driver_connection.create_function("iso_to_ms", 1, _iso_to_ms, deterministic=True)
+            conn.execute(text(f"ALTER TABLE {table_name} RENAME TO {legacy}"))
+            # Indexes keep their names after the rename; drop them so the new ones can be created.
+            for (index_name,) in conn.execute(text(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t "
+                    "AND name NOT LIKE 'sqlite_autoindex%'"), {"t": legacy}).all():
+                conn.execute(text(f"DROP INDEX {index_name}"))
+            table = Base.metadata.tables[table_name]
+            table.create(conn)
+            shared = [c.name for c in table.columns if c.name != "ts" and c.name in columns]
+            column_list = ", ".join(shared)
+            quarantine = f"{table_name}_unparseable"
+            conn.execute(text(f"CREATE TABLE IF NOT EXISTS {quarantine} AS SELECT * FROM {legacy} WHERE 0"))
+            moved = conn.execute(text(
+                f"INSERT INTO {quarantine} SELECT * FROM {legacy} WHERE iso_to_ms(timestamp) IS NULL"
+            )).rowcount
+            result = conn.execute(text(
+                f"INSERT OR IGNORE INTO {table_name} (ts, {column_list}) "
+                f"SELECT iso_to_ms(timestamp), {column_list} FROM {legacy} "
+                f"WHERE iso_to_ms(timestamp) IS NOT NULL"
+            ))
+            total = conn.execute(text(f"SELECT COUNT(*) FROM {legacy}")).scalar()
+            conn.execute(text(f"DROP TABLE {legacy}"))
+            copied[table_name] = result.rowcount
+            logger.info("Converted %s to epoch ms: %d of %d row(s) kept", table_name, result.rowcount, total)
+            if moved:
+                quarantined[table_name] = moved
+                logger.warning("%d row(s) of %s with unparseable timestamps moved to %s",
+                               moved, table_name, quarantine)
+    return copied, quarantined
+
+
+def ensure_raw_dedup_index(engine):
+    """
+    Makes sure reads_raw has the unique (mac, ts) index that backs
+    INSERT OR IGNORE deduplication. On databases created before the index
+    existed, duplicate readings are removed first (the oldest row is kept).
+    Returns the number of duplicate rows deleted.
+    """
+    with engine.begin() as conn:
+        if _index_exists(conn, RAW_DEDUP_INDEX):
+            return 0
+        deleted = conn.execute(text(
+            "DELETE FROM reads_raw WHERE id NOT IN "
+            "(SELECT MIN(id) FROM reads_raw GROUP BY mac, ts)"
+        )).rowcount
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {RAW_DEDUP_INDEX} ON reads_raw (mac, ts)"
+        ))
+    logger.info("Created %s (%d duplicate raw reads removed)", RAW_DEDUP_INDEX, deleted)
+    return deleted
+
+
+def create_missing_indexes(engine):
+    """
+    Creates every index declared in db_ops.models that the database lacks
+    (create_all only adds indexes together with new tables).
+    Returns the names of the indexes created.
+    """
+    created = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if not _index_exists(conn, index.name):
+                    index.create(conn)
+                    created.append(index.name)
+                    logger.info("Created index %s on %s", index.name, table.name)
+    return created
+
+
+def migrate(engine):
+    """
+    Brings an existing database up to the current schema without dropping data:
+    converts legacy ISO reading tables to epoch ms (unparseable rows go to
+    quarantine tables, see migrate_epoch_timestamps), creates missing tables,
+    columns and indexes, fills the partials of legacy aggregated rows, then
+    refreshes planner statistics (ANALYZE).
+    Index creation and ANALYZE are short transactions that can run next to the
+    live app; the epoch conversion rewrites whole tables, so stop the app first
+    when upgrading a database that still has ISO timestamps.
+    Returns a summary dict.
+    """
+    converted, quarantined = migrate_epoch_timestamps(engine)
+    Base.metadata.create_all(engine)
+    columns = add_missing_columns(engine)
+    partials = fill_missing_partials(engine)
+    duplicates = ensure_raw_dedup_index(engine)
+    created = create_missing_indexes(engine)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    logger.info("Migration finished: %d index(es) created, ANALYZE done", len(created))
+    return {"converted": converted, "quarantined": quarantined, "columns_added": columns, "indexes_created": created,
+            "duplicates_removed": duplicates, "partials_filled": partials}
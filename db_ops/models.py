@@ -1,10 +1,21 @@
 # db_ops/models.py
 
-from sqlalchemy import Column, Integer, String, Float, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Boolean, Text, ForeignKey, Index
 from sqlalchemy.orm import declarative_base, relationship
+from utils.parser import ms_to_iso
 
 Base = declarative_base()
 
+
+class EpochTimestampMixin:
+    """
+    Reading tables store `ts` as integer epoch milliseconds (UTC);
+    `timestamp` is the ISO 8601 string derived from it for output.
+    """
+    @property
+    def timestamp(self):
+        return ms_to_iso(self.ts)
+
 class Sensor(Base):
     __tablename__ = "sensors"
     mac = Column(String, primary_key=True)
@@ -54,8 +65,15 @@ class SchedulePolicy(Base):
 
 class Warning(Base):
     __tablename__ = "warnings"
+    __table_args__ = (
+        Index("ix_warnings_mac_read", "mac", "read"),
+        Index("ix_warnings_mac_timestamp", "mac", "timestamp"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
+    # One row per breach: `timestamp` is when it started, `closed_at` when the
+    # reading came back inside the hysteresis band (NULL while still open).
     timestamp = Column(String)
+    closed_at = Column(String)
     mac = Column(String, ForeignKey("sensors.mac"))
     type = Column(String)
     message = Column(Text)
@@ -65,13 +83,20 @@ class Warning(Base):
     sensor = relationship("Sensor", back_populates="warnings")
 
     def __repr__(self):
-        return f"<Warning(id={self.id}, mac={self.mac!r}, type={self.type!r}, timestamp={self.timestamp!r})>"
+        return (f"<Warning(id={self.id}, mac={self.mac!r}, type={self.type!r}, "
+                f"timestamp={self.timestamp!r}, closed_at={self.closed_at!r})>")
 
 
-class ReadRaw(Base):
+class ReadRaw(EpochTimestampMixin, Base):
     __tablename__ = "reads_raw"
+    # One reading per sensor and timestamp: gateway retries are ignored on insert.
+    # ts alone serves the all-sensor range scans of the minute compaction.
+    __table_args__ = (
+        Index("ux_reads_raw_mac_ts", "mac", "ts", unique=True),
+        Index("ix_reads_raw_ts", "ts"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
-    timestamp = Column(String)
+    ts = Column(Integer, nullable=False)
     mac = Column(String, ForeignKey("sensors.mac"))
     temperature = Column(Float)
     humidity = Column(Float)
@@ -86,10 +111,14 @@ class ReadRaw(Base):
                 f"temperature={self.temperature}, humidity={self.humidity})>")
 
 
-class ReadClean(Base):
-    __tablename__ = "reads_clean"
-    timestamp = Column(String, primary_key=True)
-    mac = Column(String, ForeignKey("sensors.mac"), primary_key=True)
+class PartialAggregateMixin(EpochTimestampMixin):
+    """
+    Aggregated reading: avg/min/max for output plus mergeable partials. Sums,
+    counts, min/max and the first/last reading (ts and values) of two adjacent
+    rows combine into the row of the union, so any coarser interval is built by
+    merging rows instead of rescanning reads_raw (see db_ops.partials).
+    `count_*` counts non-null values only; averages are sum / count.
+    """
     avg_temp = Column(Float)
     avg_hum = Column(Float)
     min_temp = Column(Float)
@@ -97,24 +126,70 @@ class ReadClean(Base):
     min_hum = Column(Float)
     max_hum = Column(Float)
     flags = Column(Text)
+    sum_temp = Column(Float)
+    count_temp = Column(Integer)
+    sum_hum = Column(Float)
+    count_hum = Column(Integer)
+    first_ts = Column(Integer)
+    first_temp = Column(Float)
+    first_hum = Column(Float)
+    last_ts = Column(Integer)
+    last_temp = Column(Float)
+    last_hum = Column(Float)
+
+
+class ReadClean(PartialAggregateMixin, Base):
+    __tablename__ = "reads_clean"
+    # The primary key is (ts, mac); per-sensor range scans need mac first.
+    __table_args__ = (Index("ix_reads_clean_mac_ts", "mac", "ts"),)
+    ts = Column(Integer, primary_key=True)
+    mac = Column(String, ForeignKey("sensors.mac"), primary_key=True)
 
     def __repr__(self):
         return (f"<ReadClean(timestamp={self.timestamp!r}, mac={self.mac!r}, "
                 f"avg_temp={self.avg_temp}, avg_hum={self.avg_hum})>")
 
 
-class ReadScheduled(Base):
+class ReadScheduled(PartialAggregateMixin, Base):
     __tablename__ = "reads_scheduled"
-    timestamp = Column(String, primary_key=True)
+    __table_args__ = (Index("ix_reads_scheduled_mac_ts", "mac", "ts"),)
+    ts = Column(Integer, primary_key=True)
     mac = Column(String, ForeignKey("sensors.mac"), primary_key=True)
-    avg_temp = Column(Float)
-    avg_hum = Column(Float)
-    min_temp = Column(Float)
-    max_temp = Column(Float)
-    min_hum = Column(Float)
-    max_hum = Column(Float)
-    flags = Column(Text)
 
     def __repr__(self):
         return (f"<ReadScheduled(timestamp={self.timestamp!r}, mac={self.mac!r}, "
                 f"avg_temp={self.avg_temp}, avg_hum={self.avg_hum})>")
+
+
+class ReadHourly(PartialAggregateMixin, Base):
+    """Hourly rollup of reads_clean, maintained by the scheduler (DatabaseManager.roll_up)."""
+    __tablename__ = "reads_hourly"
+    __table_args__ = (Index("ix_reads_hourly_mac_ts", "mac", "ts"),)
+    ts = Column(Integer, primary_key=True)
+    mac = Column(String, ForeignKey("sensors.mac"), primary_key=True)
+
+    def __repr__(self):
+        return (f"<ReadHourly(timestamp={self.timestamp!r}, mac={self.mac!r}, "
+                f"avg_temp={self.avg_temp}, avg_hum={self.avg_hum})>")
+
+
+class ReadDaily(PartialAggregateMixin, Base):
+    """Daily (UTC) rollup of reads_hourly, maintained by the scheduler."""
+    __tablename__ = "reads_daily"
+    __table_args__ = (Index("ix_reads_daily_mac_ts", "mac", "ts"),)
+    ts = Column(Integer, primary_key=True)
+    mac = Column(String, ForeignKey("sensors.mac"), primary_key=True)
+
+    def __repr__(self):
+        return (f"<ReadDaily(timestamp={self.timestamp!r}, mac={self.mac!r}, "
+                f"avg_temp={self.avg_temp}, avg_hum={self.avg_hum})>")
+
+
+class Watermark(Base):
+    """Progress of incremental jobs: everything before `ts` (epoch ms) was processed."""
+    __tablename__ = "watermarks"
+    name = Column(String, primary_key=True)
+    ts = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<Watermark(name={self.name!r}, ts={self.ts})>"
@@ -0,0 +1,102 @@
+# db_ops/partials.py
+
+from sqlalchemy import case, func, literal, select
+from db_ops.models import ReadRaw
+
+# Mergeable columns of PartialAggregateMixin, in insert order.
+PARTIAL_COLUMNS = (
+    "sum_temp", "count_temp", "sum_hum", "count_hum",
+    "min_temp", "max_temp", "min_hum", "max_hum",
+    "first_ts", "first_temp", "first_hum",
+    "last_ts", "last_temp", "last_hum",
+)
+
+# Columns written by merged_select(), besides ts and mac.
+AGGREGATE_COLUMNS = ("avg_temp", "avg_hum", "flags") + PARTIAL_COLUMNS
+
+
+def raw_partials(*where):
+    """reads_raw rows as one-reading partials: (ts, mac, *PARTIAL_COLUMNS)."""
+    t, h, ts = ReadRaw.temperature, ReadRaw.humidity, ReadRaw.ts
+    return select(
+        ts, ReadRaw.mac,
+        t.label("sum_temp"), case((t.is_not(None), 1), else_=0).label("count_temp"),
+        h.label("sum_hum"), case((h.is_not(None), 1), else_=0).label("count_hum"),
+        t.label("min_temp"), t.label("max_temp"), h.label("min_hum"), h.label("max_hum"),
+        ts.label("first_ts"), t.label("first_temp"), h.label("first_hum"),
+        ts.label("last_ts"), t.label("last_temp"), h.label("last_hum"),
+    ).where(*where)
+
+
+def table_partials(model, *where):
+    """Rows of a PartialAggregateMixin table: (ts, mac, *PARTIAL_COLUMNS)."""
+    return select(model.ts, model.mac, *(getattr(model, c) for c in PARTIAL_COLUMNS)).where(*where)
+
+
+def merged_select(partials, bucket_ms, origin=0):
+    """
+    Merges a partials select (raw_partials / table_partials) into one row per
+    (mac, bucket), buckets being [origin + k * bucket_ms, + bucket_ms) and the
+    row ts the bucket start. Sums and counts add up, min/max combine, and the
+    first/last values come from the rows with the smallest first_ts / largest
+    last_ts (ROW_NUMBER windows). Columns: ts, mac, *AGGREGATE_COLUMNS, ready
+    for INSERT ... SELECT into another partials table.
+    """
+    src = partials.subquery()
+    bucket = (src.c.ts - (src.c.ts - origin) % bucket_ms).label("bucket")
+    group = (src.c.mac, bucket)
+    ranked = select(
+        src, bucket,
+        func.row_number().over(partition_by=group, order_by=src.c.first_ts.asc()).label("rn_first"),
+        func.row_number().over(partition_by=group, order_by=src.c.last_ts.desc()).label("rn_last"),
+    ).subquery()
+    r = ranked.c
+
+    def first(column):
+        return func.max(case((r.rn_first == 1, column)))
+
+    def last(column):
+        return func.max(case((r.rn_last == 1, column)))
+
+    sum_temp, count_temp = func.sum(r.sum_temp), func.sum(r.count_temp)
+    sum_hum, count_hum = func.sum(r.sum_hum), func.sum(r.count_hum)
+    return select(
+        r.bucket.label("ts"), r.mac,
+        (sum_temp * 1.0 / func.nullif(count_temp, 0)).label("avg_temp"),
+        (sum_hum * 1.0 / func.nullif(count_hum, 0)).label("avg_hum"),
+        literal("").label("flags"),
+        sum_temp.label("sum_temp"), count_temp.label("count_temp"),
+        sum_hum.label("sum_hum"), count_hum.label("count_hum"),
+        func.min(r.min_temp).label("min_temp"), func.max(r.max_temp).label("max_temp"),
+        func.min(r.min_hum).label("min_hum"), func.max(r.max_hum).label("max_hum"),
+        first(r.first_ts).label("first_ts"), first(r.first_temp).label("first_temp"),
+        first(r.first_hum).label("first_hum"),
+        last(r.last_ts).label("last_ts"), last(r.last_temp).label("last_temp"),
+        last(r.last_hum).label("last_hum"),
+    ).group_by(r.mac, r.bucket).having(count_temp > 0)
+
+
+def merge_partials(rows):
+    """
+    Python counterpart of merged_select() for rows already in memory (objects
+    with the PARTIAL_COLUMNS attributes). Returns a dict with the partials plus
+    avg_temp/avg_hum, or None if `rows` is empty.
+    """
+    rows = list(rows)
+    if not rows:
+        return None
+    merged = {}
+    for name in ("sum_temp", "count_temp", "sum_hum", "count_hum"):
+        values = [getattr(row, name) for row in rows if getattr(row, name) is not None]
+        merged[name] = sum(values) if values else None
+    for name, pick in (("min_temp", min), ("max_temp", max), ("min_hum", min), ("max_hum", max)):
+        values = [getattr(row, name) for row in rows if getattr(row, name) is not None]
+        merged[name] = pick(values) if values else None
+    first = min(rows, key=lambda row: row.first_ts)
+    last = max(rows, key=lambda row: row.last_ts)
+    for name in ("ts", "temp", "hum"):
+        merged["first_" + name] = getattr(first, "first_" + name)
+        merged["last_" + name] = getattr(last, "last_" + name)
+    merged["avg_temp"] = merged["sum_temp"] / merged["count_temp"] if merged["count_temp"] else None
+    merged["avg_hum"] = merged["sum_hum"] / merged["count_hum"] if merged["count_hum"] else None
+    return merged
@@ -0,0 +1,34 @@
+# db_ops/recent_keys.py
+
+import threading
+from collections import OrderedDict
+
+
+class RecentKeys:
+    """
+    Bounded LRU set of recently ingested (mac, timestamp) keys.
+    Gateway retries are caught here without touching the database; anything
+    that falls out of the window is still stopped by the unique index.
+    """
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                return True
+            return False
+
+    def add_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._keys[key] = None
+                self._keys.move_to_end(key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
@@ -0,0 +1,124 @@
+# db_ops/sensor_cache.py
+
+import threading
+import time
+from db_ops.models import Sensor
+
+
+class SensorCache:
+    """
+    In-process registry of known sensors (MAC, name, location and last_read).
+
+    The listener only needs to touch the `sensors` table when a MAC is not in the
+    registry, and last_read updates are coalesced here until they are flushed by
+    DatabaseManager.flush_sensor_cache(). The full sensor list is kept for `ttl`
+    seconds so other processes' new sensors still show up.
+    """
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sensors = {}
+        self._loaded_at = None
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _copy(sensor):
+        # Plain (transient) instance: safe to read after the session is closed.
+        return Sensor(mac=sensor.mac, name=sensor.name, location=sensor.location,
+                      last_read=sensor.last_read, is_active=sensor.is_active)
+
+    def get(self, mac):
+        """Returns the cached sensor or None, counting a hit or a miss."""
+        with self._lock:
+            sensor = self._sensors.get(mac)
+            if sensor is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return sensor
+
+    def missing(self, macs):
+        """Returns the MACs from `macs` that are not in the registry."""
+        with self._lock:
+            missing = [mac for mac in macs if mac not in self._sensors]
+            self.misses += len(missing)
+            self.hits += len(macs) - len(missing)
+            return missing
+
+    def get_all(self):
+        """Returns the cached sensor list, or None if it was never loaded or expired."""
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return list(self._sensors.values())
+
+    def load_all(self, sensors):
+        """Replaces the registry with a fresh list read from the database."""
+        with self._lock:
+            self._sensors = {}
+            for sensor in sensors:
+                cached = self._copy(sensor)
+                pending = self._pending.get(cached.mac)
+                if pending and (not cached.last_read or pending > cached.last_read):
+                    cached.last_read = pending
+                self._sensors[cached.mac] = cached
+            self._loaded_at = time.monotonic()
+            return list(self._sensors.values())
+
+    def put(self, sensor):
+        """Adds or replaces a single sensor (a Sensor or a row with the same columns)."""
+        with self._lock:
+            cached = self._copy(sensor)
+            pending = self._pending.get(cached.mac)
+            if pending and (not cached.last_read or pending > cached.last_read):
+                cached.last_read = pending
+            self._sensors[cached.mac] = cached
+            return cached
+
+    def note_last_read(self, mac, timestamp):
+        """Records a newer last_read for `mac`; it is written on the next flush."""
+        with self._lock:
+            current = self._pending.get(mac)
+            if current is None or timestamp > current:
+                self._pending[mac] = timestamp
+            sensor = self._sensors.get(mac)
+            if sensor is not None and (not sensor.last_read or timestamp > sensor.last_read):
+                sensor.last_read = timestamp
+
+    def take_pending(self):
+        """Returns and clears the coalesced last_read updates."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            return pending
+
+    def restore_pending(self, pending):
+        """Puts back updates whose flush failed, keeping newer ones already queued."""
+        with self._lock:
+            for mac, timestamp in pending.items():
+                current = self._pending.get(mac)
+                if current is None or timestamp > current:
+                    self._pending[mac] = timestamp
+
+    def invalidate(self, mac=None):
+        """Drops one sensor (or all of them) so the next access reloads from the database."""
+        with self._lock:
+            if mac is None:
+                self._sensors = {}
+            else:
+                self._sensors.pop(mac, None)
+            self._loaded_at = None
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "sensors": len(self._sensors),
+                "pending_last_reads": len(self._pending),
+            }
@@ -1,16 +1,20 @@
 #!/usr/bin/env python3
 """
-Script to initialize and clean the database.
+Script to initialize, clean and migrate the database.
 
 Usage:
     python manage_db.py                       # To create the database if not already present.
     python manage_db.py --clean               # To drop and recreate all tables.
-    python manage_db.py --db_url "sqlite:///custom.db"   # To specify a custom database URL.
+    python manage_db.py migrate               # To add new tables/indexes to an existing database and run ANALYZE.
+    python manage_db.py --db_url "sqlite:///custom.db"   # To override the database from config/settings.yaml.
 """
 
 import argparse
 from sqlalchemy import create_engine
+from config import load_settings
+from db_ops.engine import database_url
 from db_ops.models import Base
+from db_ops.migrations import migrate
 
 def create_db(db_url):
     """Creates the database tables according to the ORM models."""
@@ -25,14 +29,35 @@ def clean_db(db_url):
     Base.metadata.create_all(engine)
     print(f"Database cleaned and re-created at: {db_url}")
 
+def migrate_db(db_url):
+    """Upgrades an existing database in place (new tables, indexes, ANALYZE)."""
+    engine = create_engine(db_url, echo=False, future=True,
+                           connect_args={"timeout": 30})  # espera o app liberar o lock de escrita
+    summary = migrate(engine)
+    created = ", ".join(summary["indexes_created"]) or "none"
+    print(f"Database migrated at: {db_url}")
+    for table, rows in summary["converted"].items():
+        print(f"  {table}: converted to epoch ms ({rows} rows)")
+    for table, rows in summary["quarantined"].items():
+        print(f"  {table}: {rows} row(s) with unparseable timestamps moved to {table}_unparseable")
+    print(f"  columns added: {', '.join(summary['columns_added']) or 'none'}")
+    print(f"  legacy aggregated rows given partials: {summary['partials_filled']}")
+    print(f"  indexes created: {created}")
+    print(f"  duplicate raw reads removed: {summary['duplicates_removed']}")
+
 def main():
     parser = argparse.ArgumentParser(description="Database Setup and Cleanup")
+    parser.add_argument("command", nargs="?", choices=["create", "migrate"], default="create",
+                        help="'create' (default) or 'migrate' an existing database.")
     parser.add_argument("--clean", action="store_true", help="Clean (drop and recreate) the database.")
-    parser.add_argument("--db_url", type=str, default="sqlite:///ble_data.db", help="Database URL")
+    parser.add_argument("--db_url", type=str, default=database_url(load_settings()["database"]),
+                        help="Database URL (default: the database in config/settings.yaml)")
     args = parser.parse_args()
 
     if args.clean:
         clean_db(args.db_url)
+    elif args.command == "migrate":
+        migrate_db(args.db_url)
     else:
         create_db(args.db_url)
 
@@ -0,0 +1,228 @@
+# modules/alerts.py
+
+import logging
+import threading
+import time
+from db_ops.db_manager import ALERTS_WATERMARK, DatabaseManager
+from utils.parser import ms_to_iso, parse_timestamp_ms
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Ordem dos limites numa regra compilada.
+RULE_FIELDS = ("temp_min", "temp_max", "humidity_min", "humidity_max")
+
+# alert type -> (índice do valor na tupla de leitura, índice do limite na regra, sentido)
+ALERT_CHECKS = (
+    ("temp_high", 2, 1, 1),
+    ("temp_low", 2, 0, -1),
+    ("humidity_high", 3, 3, 1),
+    ("humidity_low", 3, 2, -1),
+)
+
+PENDING = "pending"
+BREACHED = "breached"
+
+
+def compile_rules(policies):
+    """Turns AlertPolicy rows into {mac: (temp_min, temp_max, humidity_min, humidity_max)}."""
+    rules = {}
+    for policy in policies:
+        rule = tuple(getattr(policy, field) for field in RULE_FIELDS)
+        if any(limit is not None for limit in rule):
+            rules[policy.mac] = rule
+    return rules
+
+
+class AlertStateMachine:
+    """
+    Per (mac, alert type) state: ok -> pending -> breached -> ok.
+
+    A reading past the limit moves ok to pending; the breach opens once readings
+    have stayed past the limit for `min_duration_ms` (measured on reading
+    timestamps). It closes only when a reading is back inside the limit by the
+    hysteresis band, so a value hovering around the threshold does not flap.
+    A pending breach that comes back inside the limit is dropped silently.
+    Only transitions are returned; the ok state is not stored.
+    """
+    def __init__(self, temp_hysteresis=0.5, humidity_hysteresis=2.0, min_duration_ms=0):
+        self.bands = {2: temp_hysteresis, 3: humidity_hysteresis}
+        self.min_duration_ms = min_duration_ms
+        self.states = {}       # (mac, type) -> [PENDING|BREACHED, since_ts]
+        self.last_ts = {}      # mac -> ts da última leitura avaliada
+
+    def restore(self, mac, alert_type, since_ts):
+        """Marks a breach as open (used to resume from the open warnings)."""
+        self.states[(mac, alert_type)] = [BREACHED, since_ts]
+
+    def feed(self, rows, rules):
+        """
+        Advances the states with a batch of reading tuples (READING_FIELDS order,
+        ts in epoch ms). Readings older than the last one seen for the sensor are
+        ignored. Returns (opened, closed): lists of (mac, type, ts).
+        """
+        opened, closed = [], []
+        states, last_ts, bands = self.states, self.last_ts, self.bands
+        min_duration = self.min_duration_ms
+        for row in sorted(rows, key=lambda r: r[0]):
+            ts, mac = row[0], row[1]
+            rule = rules.get(mac)
+            if rule is None or ts < last_ts.get(mac, ts):
+                continue
+            last_ts[mac] = ts
+            for alert_type, value_idx, limit_idx, direction in ALERT_CHECKS:
+                value, limit = row[value_idx], rule[limit_idx]
+                key = (mac, alert_type)
+                state = states.get(key)
+                if value is None or limit is None:
+                    continue
+                past_limit = (value - limit) * direction > 0
+                if state is None:
+                    if past_limit:
+                        state = states[key] = [PENDING, ts]
+                    else:
+                        continue
+                if state[0] == PENDING:
+                    if not past_limit:
+                        del states[key]
+                    elif ts - state[1] >= min_duration:
+                        state[0] = BREACHED
+                        opened.append((mac, alert_type, state[1]))
+                elif (limit - value) * direction >= bands[value_idx]:
+                    del states[key]
+                    closed.append((mac, alert_type, ts))
+        return opened, closed
+
+    def counts(self):
+        pending = sum(1 for state, _ in self.states.values() if state == PENDING)
+        return {"pending": pending, "open": len(self.states) - pending}
+
+
+class AlertEngine:
+    """
+    Evaluates alert policies on the readings as they are committed, in one process.
+
+    The AlertPolicy thresholds are compiled into an in-memory rule table that is
+    reloaded when DatabaseManager.set_alert_policy bumps alert_policy_version (or
+    every `refresh_interval` seconds, for changes made by other processes).
+    run() reads the reads_raw rows committed since the last one evaluated (by id,
+    `batch_size` at a time) and feeds them to an AlertStateMachine. It is called
+    by the scheduler leader every alerts.interval_seconds, so with several web
+    workers a single state machine still sees every reading, whichever worker
+    stored it. Each breach is one Warning row, inserted when it opens and given
+    closed_at when it recovers; the transitions and the id of the last row
+    evaluated (ALERTS_WATERMARK) are committed together, so a new leader resumes
+    from the open warnings and that id. The first run ever starts at the newest
+    stored reading: history is not evaluated.
+    """
+    def __init__(self, db_manager: DatabaseManager, refresh_interval=30, batch_size=5000,
+                 temp_hysteresis=0.5, humidity_hysteresis=2.0, min_breach_seconds=0):
+        self.db_manager = db_manager
+        self.refresh_interval = refresh_interval
+        self.batch_size = batch_size
+        self._machine_args = (temp_hysteresis, humidity_hysteresis, min_breach_seconds * 1000)
+        self.state = AlertStateMachine(*self._machine_args)
+        self._state_loaded = False
+        self._last_id = None
+        self._rules = {}
+        self._rules_version = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.evaluated_rows = 0
+        self.opened = 0
+        self.closed = 0
+
+    @classmethod
+    def from_settings(cls, db_manager, alert_settings):
+        """Builds the engine from the `alerts` section of settings.yaml."""
+        return cls(db_manager,
+                   refresh_interval=alert_settings["refresh_seconds"],
+                   batch_size=alert_settings["batch_size"],
+                   temp_hysteresis=alert_settings["temp_hysteresis"],
+                   humidity_hysteresis=alert_settings["humidity_hysteresis"],
+                   min_breach_seconds=alert_settings["min_breach_seconds"])
+
+    def rules(self):
+        """Returns the rule table, reloading it if a policy changed or it expired."""
+        version = self.db_manager.alert_policy_version
+        if version != self._rules_version or time.monotonic() - self._loaded_at > self.refresh_interval:
+            self._rules = compile_rules(self.db_manager.get_alert_policies())
+            self._rules_version = version
+            self._loaded_at = time.monotonic()
+            logger.debug("Alert rules reloaded: %d sensor(s)", len(self._rules))
+        return self._rules
+
+    def _load_state(self):
+        # Estado persistido: warnings abertos + id da última leitura avaliada.
+        self.state = AlertStateMachine(*self._machine_args)
+        for warning in self.db_manager.get_open_warnings():
+            self.state.restore(warning.mac, warning.type, parse_timestamp_ms(warning.timestamp))
+        self._last_id = self.db_manager.get_watermark(ALERTS_WATERMARK)
+        if self._last_id is None:
+            self._last_id = self.db_manager.get_last_raw_id()
+        self._state_loaded = True
+
+    def run(self):
+        """Evaluates every reading committed since the last run. Returns the number of rows read."""
+        total = 0
+        with self._lock:
+            if not self._state_loaded:
+                self._load_state()
+            while True:
+                rows = self.db_manager.get_raw_rows_after(self._last_id, self.batch_size)
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                self._evaluate([row[1:] for row in rows], last_id)
+                self._last_id = last_id
+                total += len(rows)
+                if len(rows) < self.batch_size:
+                    break
+        return total
+
+    def evaluate(self, rows):
+        """
+        Feeds reading tuples (READING_FIELDS order, ts in epoch ms) to the state
+        machine and writes the transitions; used by the scheduler's poll mode.
+        """
+        with self._lock:
+            if not self._state_loaded:
+                self._load_state()
+            return self._evaluate(rows)
+
+    def _evaluate(self, rows, last_id=None):
+        rules = self.rules()
+        opened, closed = self.state.feed(rows, rules) if rules else ([], [])
+        try:
+            self.db_manager.apply_alert_transitions(
+                [{
+                    "timestamp": ms_to_iso(ts),
+                    "mac": mac,
+                    "type": alert_type,
+                    "message": f"{alert_type} alert triggered for sensor {mac}",
+                    "read": False,
+                    "posted": False,
+                } for mac, alert_type, ts in opened],
+                [(mac, alert_type, ms_to_iso(ts)) for mac, alert_type, ts in closed],
+                last_id)
+        except Exception:
+            # A memória avançou sem gravar: recarrega do banco na próxima chamada.
+            self._state_loaded = False
+            raise
+        self.evaluated_rows += len(rows)
+        self.opened += len(opened)
+        self.closed += len(closed)
+        for mac, alert_type, ts in opened:
+            logger.info("Alert %s opened for sensor %s at %s", alert_type, mac, ms_to_iso(ts))
+        for mac, alert_type, ts in closed:
+            logger.info("Alert %s closed for sensor %s at %s", alert_type, mac, ms_to_iso(ts))
+        return len(opened) + len(closed)
+
+    def stats(self):
+        return dict(self.state.counts(), **{
+            "rules": len(self._rules),
+            "evaluated_rows": self.evaluated_rows,
+            "opened": self.opened,
+            "closed": self.closed,
+            "last_raw_id": self._last_id,
+        })
@@ -0,0 +1,195 @@
+# modules/excel_export.py
+
+import logging
+import tempfile
+from itertools import chain, islice
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+from openpyxl.utils import get_column_letter
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Colunas das planilhas de exportação: (chave da linha exportada, título).
+EXPORT_HEADERS = [
+    ("date", "Data"),
+    ("time", "Hora"),
+    ("last_temp", "Última Temp (°C)"),
+    ("last_hum", "Última Umid (%)"),
+    ("last_timestamp", "Hora Última Leitura"),
+    ("avg_temp", "Temperatura Média (°C)"),
+    ("avg_hum", "Umidade Média (%)"),
+    ("min_temp", "Temp. Mín (°C)"),
+    ("max_temp", "Temp. Máx (°C)"),
+    ("min_hum", "Umid. Mín (%)"),
+    ("max_hum", "Umid. Máx (%)"),
+]
+
+# Colunas comparadas com os limites da política de alarmes.
+LIMIT_COLUMNS = {
+    "avg_temp": ("temp_min", "temp_max"), "min_temp": ("temp_min", "temp_max"), "max_temp": ("temp_min", "temp_max"),
+    "avg_hum": ("hum_min", "hum_max"), "min_hum": ("hum_min", "hum_max"), "max_hum": ("hum_min", "hum_max"),
+}
+
+NO_DATA_MESSAGE = "Nenhum dado encontrado para o sensor/intervalo selecionado."
+
+# Linhas lidas antes de escrever a planilha para estimar a largura das colunas
+# (no modo write-only as larguras vão antes da primeira linha).
+WIDTH_LOOKAHEAD_ROWS = 500
+
+# Até este tamanho o xlsx fica em memória; acima, vai para um arquivo temporário.
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+_FILLS = {
+    "header": "A7C7E7",
+    "even": "F8FAFF",
+    "odd": "E5EDF7",
+    "limit": "FF8A80",     # fora do limite
+    "edge": "FFF475",      # exatamente no limite
+}
+
+
+def _named_styles():
+    """
+    One NamedStyle per (fill, number or text) pair, registered once per
+    workbook; each cell then only references its style by name.
+    """
+    center = Alignment(horizontal="center")
+    styles = [NamedStyle(name="export_header", font=Font(bold=True), alignment=center,
+                         fill=PatternFill("solid", start_color=_FILLS["header"], end_color=_FILLS["header"]))]
+    for fill in ("even", "odd", "limit", "edge"):
+        pattern = PatternFill("solid", start_color=_FILLS[fill], end_color=_FILLS[fill])
+        styles.append(NamedStyle(name=f"export_{fill}", alignment=center, fill=pattern))
+        styles.append(NamedStyle(name=f"export_{fill}_num", alignment=center, fill=pattern, number_format="0.00"))
+    return styles
+
+
+def limits_from_policy(policy):
+    """Limites de uma AlertPolicy no formato usado na planilha ({} sem política)."""
+    if not policy:
+        return {}
+    return {
+        "temp_min": policy.temp_min,
+        "temp_max": policy.temp_max,
+        "hum_min": policy.humidity_min,
+        "hum_max": policy.humidity_max,
+    }
+
+
+def _limit_fill(value, lim_min, lim_max):
+    if lim_min is not None and value < lim_min:
+        return "limit"
+    if lim_max is not None and value > lim_max:
+        return "limit"
+    if value == lim_min or value == lim_max:
+        return "edge"
+    return None
+
+
+def _row_values(row, keys):
+    """Valores de uma linha exportada na ordem das colunas: data/hora separadas, números em float."""
+    ts = row.get("timestamp") or ""
+    date, _, time = ts.partition("T")
+    values = []
+    for key in keys:
+        if key == "date":
+            values.append(date)
+        elif key == "time":
+            values.append(time[:5])
+        elif key == "last_timestamp":
+            last_ts = row.get("last_timestamp") or ""
+            values.append(last_ts.split("T")[1][:5] if "T" in last_ts else last_ts)
+        else:
+            value = row.get(key, "")
+            try:
+                values.append(float(value))
+            except (TypeError, ValueError):
+                values.append(value)
+    return values
+
+
+def _display_len(value):
+    if value is None:
+        return 0
+    if isinstance(value, float):
+        return len(f"{value:.2f}")
+    return len(str(value))
+
+
+class ExcelExporter:
+    """
+    Writes export rows to xlsx with openpyxl's write-only mode: rows go to disk
+    as they are appended, so only the current row and a small lookahead are in
+    memory, whatever the number of sheets. Styles are NamedStyles registered
+    once per workbook (see _named_styles) and set on each cell by name, column
+    widths are estimated from the header and the first WIDTH_LOOKAHEAD_ROWS
+    rows, and the file is saved to a SpooledTemporaryFile that the caller
+    streams to the client.
+    """
+    def __init__(self, headers=None):
+        self.headers = headers or EXPORT_HEADERS
+        self.keys = [key for key, _ in self.headers]
+        self.rows_written = 0
+
+    @staticmethod
+    def _cell(ws, value, style):
+        cell = WriteOnlyCell(ws, value)
+        cell.style = style
+        return cell
+
+    def _write_sheet(self, wb, title, rows, limits):
+        ws = wb.create_sheet(title=title[:31])
+        rows = iter(rows)
+        lookahead = [_row_values(row, self.keys) for row in islice(rows, WIDTH_LOOKAHEAD_ROWS)]
+        if not lookahead:
+            ws.append([NO_DATA_MESSAGE])
+            return
+        widths = [len(title) for _, title in self.headers]
+        for values in lookahead:
+            widths = [max(width, _display_len(value)) for width, value in zip(widths, values)]
+        for col, width in enumerate(widths, start=1):
+            ws.column_dimensions[get_column_letter(col)].width = width + 2
+        ws.freeze_panes = "A2"
+
+        ws.append([self._cell(ws, title, "export_header") for _, title in self.headers])
+
+        # Limites por coluna, resolvidos uma vez por planilha.
+        bounds = [
+            (limits.get(LIMIT_COLUMNS[key][0]), limits.get(LIMIT_COLUMNS[key][1]))
+            if key in LIMIT_COLUMNS and limits else None
+            for key in self.keys
+        ]
+        all_rows = chain(lookahead, (_row_values(row, self.keys) for row in rows))
+        for i, values in enumerate(all_rows):
+            zebra = "even" if i % 2 == 0 else "odd"
+            cells = []
+            for col, value in enumerate(values):
+                if isinstance(value, float) and col > 1:
+                    limit = bounds[col] and _limit_fill(value, *bounds[col])
+                    cells.append(self._cell(ws, value, f"export_{limit or zebra}_num"))
+                else:
+                    cells.append(self._cell(ws, value, f"export_{zebra}"))
+            ws.append(cells)
+            self.rows_written += 1
+
+    def write(self, sheets):
+        """
+        sheets: iterable of (title, rows, limits), rows being the dicts of
+        SensorService.export_sensor_data (any iterable). Returns the spooled
+        xlsx file, rewound.
+        """
+        wb = Workbook(write_only=True)
+        for style in _named_styles():
+            wb.add_named_style(style)
+        for title, rows, limits in sheets:
+            self._write_sheet(wb, title, rows, limits)
+        if not wb.worksheets:
+            self._write_sheet(wb, "Exportação", [], {})
+        out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        wb.save(out)
+        out.seek(0)
+        logger.debug("Excel export: %d sheet(s), %d row(s)", len(wb.worksheets), self.rows_written)
+        return out
@@ -0,0 +1,171 @@
+# modules/ingest.py
+
+import logging
+import queue
+import threading
+import time
+from db_ops.db_manager import DatabaseManager
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+class IngestQueue:
+    """
+    Write-behind queue for raw readings.
+    The listener enqueues validated rows (tuples in READING_FIELDS order) and returns
+    immediately; a dedicated writer thread drains the queue and group-commits through
+    DatabaseManager.insert_raw_rows, either every `batch_size` records or
+    `flush_interval` seconds after the first record of the batch arrived.
+    A commit that fails (e.g. "database is locked") is retried with exponential
+    backoff, from `retry_delay` up to `max_retry_delay` seconds, until it goes
+    through: rows answered with 202 are never dropped. While the writer is
+    failing, `failing` is True and the listener refuses new work with 503.
+    """
+    def __init__(self, db_manager: DatabaseManager, maxsize=10000, batch_size=500, flush_interval=0.2,
+                 retry_delay=0.1, max_retry_delay=5.0):
+        self.db_manager = db_manager
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._queue = queue.Queue()
+        self._put_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self.commits = 0
+        self.committed_rows = 0
+        self.rejected_rows = 0
+        self.duplicate_rows = 0
+        self.failed_commits = 0
+        self.last_error = None
+        self._failing_since = None
+        self._retrying_rows = 0
+        self.last_commit_ms = 0.0
+        self.max_commit_ms = 0.0
+        self._total_commit_ms = 0.0
+
+    def start(self):
+        """Starts the writer in a daemon thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+        logger.info("Ingest queue started (maxsize=%d, batch=%d, window=%.3fs)",
+                    self.maxsize, self.batch_size, self.flush_interval)
+
+    def stop(self, timeout=10):
+        """Stops the writer after flushing everything still queued."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error("Ingest writer still failing at shutdown: %d record(s) not written (%s)",
+                         self._retrying_rows + self.depth(), self.last_error)
+        self._thread = None
+        logger.info("Ingest queue stopped (%d rows committed).", self.committed_rows)
+
+    @property
+    def failing(self):
+        """True while the writer is retrying a commit that failed."""
+        return self._failing_since is not None
+
+    def put_many(self, rows):
+        """
+        Enqueues a batch as a whole. Returns False, without enqueueing anything,
+        when the batch does not fit in the queue right now; raises ValueError for
+        a batch larger than the whole queue, which would never fit.
+        """
+        if len(rows) > self.maxsize:
+            raise ValueError(f"Batch of {len(rows)} record(s) exceeds the ingest queue capacity ({self.maxsize})")
+        with self._put_lock:
+            if self._queue.qsize() + len(rows) > self.maxsize:
+                return False
+            for row in rows:
+                self._queue.put_nowait(row)
+        return True
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _collect(self):
+        """Blocks for the first record, then gathers up to batch_size within the window."""
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0 or self._stop.is_set():
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._commit(batch)
+
+    def _commit(self, batch):
+        delay = self.retry_delay
+        while True:
+            started = time.perf_counter()
+            try:
+                result = self.db_manager.insert_raw_rows(batch)
+                break
+            except Exception as e:
+                with self._stats_lock:
+                    self.failed_commits += 1
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    self._retrying_rows = len(batch)
+                    first = self._failing_since is None
+                    if first:
+                        self._failing_since = time.monotonic()
+                if first:
+                    logger.exception("Ingest writer failed to commit %d record(s); retrying", len(batch))
+                else:
+                    logger.error("Ingest writer still failing after %.1fs (%s); retrying in %.1fs",
+                                 time.monotonic() - self._failing_since, self.last_error, delay)
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+        if self._failing_since is not None:
+            logger.warning("Ingest writer recovered after %.1fs; %d record(s) committed",
+                           time.monotonic() - self._failing_since, len(batch))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._failing_since = None
+            self._retrying_rows = 0
+            self.commits += 1
+            self.committed_rows += result["accepted"]
+            self.rejected_rows += result["rejected"]
+            self.duplicate_rows += result["duplicates"]
+            self.last_commit_ms = elapsed_ms
+            self.max_commit_ms = max(self.max_commit_ms, elapsed_ms)
+            self._total_commit_ms += elapsed_ms
+        logger.debug("Group commit of %d record(s) in %.1f ms", len(batch), elapsed_ms)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queue_depth": self.depth(),
+                "queue_capacity": self.maxsize,
+                "commits": self.commits,
+                "committed_rows": self.committed_rows,
+                "rejected_rows": self.rejected_rows,
+                "duplicate_rows": self.duplicate_rows,
+                "failed_commits": self.failed_commits,
+                "writer_failing": self.failing,
+                "failing_seconds": round(time.monotonic() - self._failing_since, 1) if self.failing else 0.0,
+                "last_error": self.last_error,
+                "last_commit_ms": round(self.last_commit_ms, 3),
+                "avg_commit_ms": round(self._total_commit_ms / self.commits, 3) if self.commits else 0.0,
+                "max_commit_ms": round(self.max_commit_ms, 3),
+            }
@@ -0,0 +1,63 @@
+# modules/query_planner.py
+
+import logging
+from db_ops.db_manager import (DatabaseManager, MINUTE_MS, HOUR_MS, DAY_MS,
+                               CLEAN_WATERMARK, HOURLY_WATERMARK, DAILY_WATERMARK)
+from db_ops.models import ReadRaw, ReadClean, ReadHourly, ReadDaily
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Camadas de leitura, da mais grossa para a mais fina: (tabela, resolução, watermark).
+# Abaixo do watermark a camada está completa; reads_raw cobre o resto.
+TIERS = (
+    (ReadDaily, DAY_MS, DAILY_WATERMARK),
+    (ReadHourly, HOUR_MS, HOURLY_WATERMARK),
+    (ReadClean, MINUTE_MS, CLEAN_WATERMARK),
+)
+
+
+def _split(start, end, tiers):
+    """Covers [start, end) with the coarsest tiers, recursing into the edges they leave."""
+    if end <= start:
+        return []
+    if not tiers:
+        return [(ReadRaw, start, end)]
+    (model, resolution, until), finer = tiers[0], tiers[1:]
+    lo = -(-start // resolution) * resolution
+    hi = min(end - end % resolution, until)
+    if hi <= lo:
+        return _split(start, end, finer)
+    return _split(start, lo, finer) + [(model, lo, hi)] + _split(hi, end, finer)
+
+
+class QueryPlanner:
+    """
+    Picks the tables to read for a time range: daily and hourly rollups where
+    they are complete and line up with the requested buckets, reads_clean for
+    the minutes around them and reads_raw for what is not compacted yet.
+    A year of one sensor is then ~365 daily rows plus the edges, instead of
+    half a million minutes.
+    """
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+
+    def plan(self, start_ms, end_ms, bucket_ms=None, origin=None):
+        """
+        Returns [(table, start_ms, end_ms), ...] covering [start_ms, end_ms).
+        With `bucket_ms`, a tier is only used if none of its rows straddles a
+        bucket boundary (buckets start at `origin`, default start_ms).
+        """
+        origin = start_ms if origin is None else origin
+        watermarks = self.db_manager.get_watermarks()
+        tiers = []
+        for model, resolution, name in TIERS:
+            if watermarks.get(name) is None:
+                continue
+            if bucket_ms is not None and (bucket_ms % resolution or origin % resolution):
+                continue
+            tiers.append((model, resolution, watermarks[name]))
+        segments = _split(start_ms, end_ms, tiers)
+        logger.debug("Query plan for [%s, %s): %s", start_ms, end_ms,
+                     [(model.__tablename__, lo, hi) for model, lo, hi in segments])
+        return segments
@@ -2,16 +2,22 @@
 
 import logging
 from db_ops.db_manager import DatabaseManager
+from db_ops.partials import merge_partials
+from modules.query_planner import QueryPlanner
+from utils.parser import parse_timestamp_ms
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+STAT_FIELDS = ("avg_temp", "avg_hum", "min_temp", "max_temp", "min_hum", "max_hum")
+
 class DataReader:
     """
     Utility to read sensor data from the database and compute statistics.
     """
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
+        self.planner = QueryPlanner(db_manager)
 
     def get_raw_data(self, mac, limit=100):
         """
@@ -23,8 +29,11 @@ class DataReader:
 
     def get_statistics(self, mac, start_timestamp, end_timestamp):
         """
-        Computes aggregated statistics for a sensor over a given interval.
+        Computes aggregated statistics for a sensor over a given interval
+        (bounds inclusive), merging the rollup rows chosen by the query planner.
         """
-        stats = self.db_manager.compute_statistics(mac, start_timestamp, end_timestamp)
+        segments = self.planner.plan(parse_timestamp_ms(start_timestamp), parse_timestamp_ms(end_timestamp) + 1)
+        merged = merge_partials(self.db_manager.get_partials(mac, segments))
+        stats = {field: merged[field] if merged else None for field in STAT_FIELDS}
         logger.debug("Computed statistics for sensor %s: %s", mac, stats)
         return stats
@@ -13,12 +13,14 @@ class ReportGenerator:
     def __init__(self, data_reader: DataReader):
         self.data_reader = data_reader
 
-    def generate_sensor_report(self, mac, start_timestamp, end_timestamp):
+    def generate_sensor_report(self, mac, start_timestamp, end_timestamp, statistics=None):
         """
         Generates a summary report for a sensor.
         Returns a dictionary containing aggregated statistics and sample raw data.
+        `statistics` skips the computation when they are already known (cached).
         """
-        stats = self.data_reader.get_statistics(mac, start_timestamp, end_timestamp)
+        stats = statistics if statistics is not None else \
+            self.data_reader.get_statistics(mac, start_timestamp, end_timestamp)
         raw_data = self.data_reader.get_raw_data(mac, limit=50)
         report = {
             "statistics": stats,
@@ -0,0 +1,185 @@
+# modules/result_cache.py
+
+import atexit
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Chave de um resultado: MACs (tupla ordenada, None = todos os sensores), período
+# [start_ms, end_ms), intervalo em horas, formato e uma variante (ex.: os limites
+# de alarme que colorem a planilha).
+ResultKey = namedtuple("ResultKey", "macs start_ms end_ms interval format variant", defaults=("",))
+
+
+def mac_set(macs):
+    """Normaliza `macs` (um MAC, uma lista ou None) para a chave do cache."""
+    if macs is None:
+        return None
+    if isinstance(macs, str):
+        return (macs,)
+    return tuple(sorted(set(macs)))
+
+
+class _Entry:
+    __slots__ = ("data", "path", "size", "expires_at", "generation")
+
+    def __init__(self, data, path, size, expires_at, generation):
+        self.data = data
+        self.path = path
+        self.size = size
+        self.expires_at = expires_at
+        self.generation = generation
+
+
+class ResultCache:
+    """
+    LRU of encoded export/report results, bounded by bytes, with an optional
+    on-disk tier (`disk_dir`) for generated files such as xlsx workbooks.
+
+    A result over a range that ends before the compaction watermark only changes
+    if a backfill rewrites that range, so it is kept (immutable) until evicted or
+    until the rewrite generation it was stored with changes; results touching
+    data that is still being compacted expire after `ttl` seconds. A single
+    result larger than a quarter of `max_bytes` is not kept in memory.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=60, disk_dir=None, disk_max_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 4
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._disk = OrderedDict()
+        self._disk_root = None
+        self.bytes = 0
+        self.disk_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _files_dir(self):
+        # Um diretório por processo: cada worker tem o seu índice e apaga o seu ao sair.
+        if self._disk_root is None:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_root = tempfile.mkdtemp(prefix="results-", dir=self.disk_dir)
+            atexit.register(shutil.rmtree, self._disk_root, True)
+        return self._disk_root
+
+    def _drop(self, tier, key):
+        entry = tier.pop(key)
+        if entry.path is None:
+            self.bytes -= entry.size
+            return
+        self.disk_bytes -= entry.size
+        try:
+            os.remove(entry.path)
+        except OSError as e:
+            logger.warning("Could not remove cached result %s: %s", entry.path, e)
+
+    def _evict(self, tier, limit):
+        while tier and (self.bytes if tier is self._memory else self.disk_bytes) > limit:
+            self._drop(tier, next(iter(tier)))
+            self.evictions += 1
+
+    def get(self, key, generation=None):
+        """
+        Returns the cached result for `key` (bytes, or an open binary file for
+        on-disk entries) and counts a hit, or None and counts a miss. Entries
+        stored with another rewrite `generation` or past their TTL are dropped.
+        """
+        with self._lock:
+            now = time.monotonic()
+            for tier in (self._memory, self._disk):
+                entry = tier.get(key)
+                if entry is None:
+                    continue
+                if entry.generation != generation or (entry.expires_at is not None and now >= entry.expires_at):
+                    self._drop(tier, key)
+                    continue
+                tier.move_to_end(key)
+                self.hits += 1
+                return entry.data if entry.path is None else open(entry.path, "rb")
+            self.misses += 1
+            return None
+
+    def put(self, key, data, immutable=False, generation=None, to_disk=False):
+        """
+        Stores `data` (bytes, or a binary file positioned at its start) and
+        returns what the caller should serve: the same kind get() returns, or
+        `data` itself, rewound, when it is too large to be kept. A file is closed
+        once it has been copied or read into the cache. `to_disk` sends it to the
+        on-disk tier when one is configured.
+        """
+        if isinstance(data, bytes):
+            size = len(data)
+        else:
+            size = data.seek(0, os.SEEK_END)
+            data.seek(0)
+        expires_at = None if immutable else time.monotonic() + self.ttl
+
+        if to_disk and self.disk_dir:
+            if size > self.disk_max_bytes:
+                return data
+            fd, path = tempfile.mkstemp(suffix=f".{key.format}", dir=self._files_dir())
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    if isinstance(data, bytes):
+                        out.write(data)
+                    else:
+                        shutil.copyfileobj(data, out)
+            finally:
+                # O SpooledTemporaryFile pode ter ido para o disco: não deixa o handle aberto.
+                if not isinstance(data, bytes):
+                    data.close()
+            with self._lock:
+                for tier in (self._memory, self._disk):
+                    if key in tier:
+                        self._drop(tier, key)
+                self._disk[key] = _Entry(None, path, size, expires_at, generation)
+                self.disk_bytes += size
+                self._evict(self._disk, self.disk_max_bytes)
+                return open(path, "rb")
+
+        if size > self.max_entry_bytes:
+            return data
+        if not isinstance(data, bytes):
+            with data:
+                data = data.read()
+        with self._lock:
+            for tier in (self._memory, self._disk):
+                if key in tier:
+                    self._drop(tier, key)
+            self._memory[key] = _Entry(data, None, size, expires_at, generation)
+            self.bytes += size
+            self._evict(self._memory, self.max_bytes)
+        return data
+
+    def clear(self):
+        """Drops every entry (memory and disk)."""
+        with self._lock:
+            for tier in (self._memory, self._disk):
+                while tier:
+                    self._drop(tier, next(iter(tier)))
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "entries": len(self._memory),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self.disk_bytes,
+                "evictions": self.evictions,
+            }
@@ -1,26 +1,74 @@
 # modules/service.py
 
+import hashlib
 import logging
-from db_ops.db_manager import DatabaseManager
+import json
+from config import load_settings
+from db_ops.db_manager import (get_db_manager, CLEAN_STREAM_COLUMNS, CLEAN_WATERMARK, LATE_WATERMARK,
+                               REWRITE_WATERMARK)
+from db_ops.partials import merge_partials
+from modules.excel_export import ExcelExporter, limits_from_policy
+from modules.query_planner import QueryPlanner
 from modules.reader import DataReader
 from modules.report import ReportGenerator
+from modules.result_cache import ResultCache, ResultKey, mac_set
 import io
+from itertools import groupby
+from operator import attrgetter
 from flask import send_file
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
+from utils.parser import READING_FIELDS, parse_timestamp_ms, ms_to_iso
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Colunas das exportações em fluxo (CSV/NDJSON) com source="aggregate".
+EXPORT_COLUMNS = ("timestamp", "mac", "avg_temp", "avg_hum", "min_temp", "max_temp", "min_hum", "max_hum",
+                  "first_temp", "first_hum", "first_timestamp", "last_temp", "last_hum", "last_timestamp")
+
+# Origem das linhas de iter_export_rows: intervalos de N horas, minutos de reads_clean ou leituras brutas.
+STREAM_SOURCES = ("aggregate", "clean", "raw")
+
 class SensorService:
     """
     Service layer to interact with sensor data.
     Abstracts underlying database operations and report generation.
     """
-    def __init__(self, db_url='sqlite:///ble_data.db'):
-        self.db_manager = DatabaseManager(db_url)
+    def __init__(self, db_url=None, settings=None):
+        self.db_manager = get_db_manager(db_url)
         self.data_reader = DataReader(self.db_manager)
         self.report_generator = ReportGenerator(self.data_reader)
+        self.planner = QueryPlanner(self.db_manager)
+        cache_settings = (settings or load_settings())["cache"]
+        # Exportações e relatórios já codificados, por (MACs, período, intervalo, formato).
+        self.result_cache = ResultCache(
+            max_bytes=cache_settings["result_max_bytes"],
+            ttl=cache_settings["result_ttl"],
+            disk_dir=cache_settings["result_disk_dir"],
+            disk_max_bytes=cache_settings["result_disk_max_bytes"],
+        )
+
+    def _cached(self, key, build, to_disk=False):
+        """
+        Result of `build()` (bytes or a binary file) through the result cache. It is
+        kept indefinitely if the period ends before the reads_clean watermark (and
+        before any late reading still waiting to be re-aggregated), and for
+        result_ttl seconds otherwise; a backfill or late reading (REWRITE_WATERMARK)
+        drops it.
+        """
+        watermarks = self.db_manager.get_watermarks()
+        generation = watermarks.get(REWRITE_WATERMARK)
+        cached = self.result_cache.get(key, generation)
+        if cached is not None:
+            return cached
+        compacted, late = watermarks.get(CLEAN_WATERMARK), watermarks.get(LATE_WATERMARK)
+        immutable = compacted is not None and key.end_ms <= compacted and (late is None or key.end_ms <= late)
+        return self.result_cache.put(key, build(), immutable, generation, to_disk)
+
+    def get_result_cache_stats(self):
+        """Contadores do cache de resultados (hit ratio, bytes em memória e em disco)."""
+        return self.result_cache.stats()
 
     def get_all_sensors(self):
         sensors = self.db_manager.get_all_sensors()
@@ -28,7 +76,13 @@ class SensorService:
         return sensors
 
     def get_sensor_report(self, mac, start_timestamp, end_timestamp):
-        report = self.report_generator.generate_sensor_report(mac, start_timestamp, end_timestamp)
+        # Só as estatísticas do período vão para o cache: as leituras recentes do relatório
+        # são sempre as últimas recebidas.
+        key = _result_key(mac, start_timestamp, end_timestamp, None, "statistics")
+        stats = self._cached(key, lambda: _json_bytes(
+            self.data_reader.get_statistics(mac, start_timestamp, end_timestamp)))
+        report = self.report_generator.generate_sensor_report(mac, start_timestamp, end_timestamp,
+                                                             statistics=json.loads(stats))
         logger.debug("Service: Generated report for sensor %s", mac)
         return report
 
@@ -73,56 +127,98 @@ class SensorService:
 #         for r in reads
 #     ]
     def export_sensor_data(self, mac, fr, to, interval=None):
-        from datetime import datetime, timedelta
-
-        fr_dt = datetime.fromisoformat(fr)
-        to_dt = datetime.fromisoformat(to)
-        interval_h = int(interval) if interval else 1
-
-        # Pega todos os CLEAN daquele sensor dentro do período
-        reads = self.db_manager.get_latest_clean_reads(mac, limit=10000)
-        reads = [
-            r for r in reads
-            if fr_dt <= datetime.fromisoformat(r.timestamp) <= to_dt
-        ]
-        if not reads:
-            return []
-
-        # Ordena por timestamp
-        reads.sort(key=lambda r: r.timestamp)
-
-        # Agrupa por intervalos de N horas
-        result = []
-        group = []
-        group_start = datetime.fromisoformat(reads[0].timestamp)
-        for r in reads:
-            ts = datetime.fromisoformat(r.timestamp)
-            # Se passou do intervalo, exporta o grupo e começa novo
-            if (ts - group_start).total_seconds() >= interval_h * 3600:
-                if group:
-                    # Agrega o grupo
-                    result.append(_aggregate_group(group, group_start))
-                group = []
-                group_start = ts
-            group.append(r)
-        # Último grupo
-        if group:
-            result.append(_aggregate_group(group, group_start))
-        return result
-    
-    def export_all_sensors_data(self, fr, to, interval=None):
+        fr_ms = parse_timestamp_ms(fr)
+        to_ms = parse_timestamp_ms(to)
+        interval_ms = (int(interval) if interval else 1) * 3600 * 1000
+
+        # Período (`to` inclusivo) lido da camada mais grossa que o planejador permitir,
+        # agrupado em intervalos de N horas contados a partir de `fr` direto no SQL
+        segments = self.planner.plan(fr_ms, to_ms + 1, interval_ms)
+        rows = self.db_manager.get_bucketed_reads(mac, segments, interval_ms, fr_ms)
+        return [_export_row(row._mapping, row.ts) for row in rows]
+
+    def export_all_sensors_data(self, fr, to, interval=None, macs=None):
         """
-        Exporta os dados agregados de todos os sensores no período e agrupamento informados.
-        Retorna um dicionário {mac: [leituras...], ...}
+        Exporta os dados agregados de todos os sensores (ou só de `macs`) no período
+        e agrupamento informados, com uma única consulta agrupada por (mac, intervalo).
+        Retorna um dicionário {mac: [leituras...], ...}; sensores sem dados ficam de fora.
         """
-        sensors = self.db_manager.get_all_sensors()
-        result = {}
-        for sensor in sensors:
-            mac = sensor.mac
-            data = self.export_sensor_data(mac, fr, to, interval)
-            if data:  # Só inclui se houver dados
-                result[mac] = data
-        return result
+        return {mac: list(rows) for mac, rows in self.iter_all_sensors_data(fr, to, interval, macs)}
+
+    def iter_all_sensors_data(self, fr, to, interval=None, macs=None):
+        """
+        Versão em fluxo de export_all_sensors_data: gera (mac, leituras) em ordem de MAC,
+        com as leituras de cada sensor lidas do cursor à medida que são consumidas.
+        """
+        fr_ms = parse_timestamp_ms(fr)
+        to_ms = parse_timestamp_ms(to)
+        interval_ms = (int(interval) if interval else 1) * 3600 * 1000
+
+        segments = self.planner.plan(fr_ms, to_ms + 1, interval_ms)
+        rows = self.db_manager.iter_bucketed_reads(segments, interval_ms, fr_ms, macs=macs)
+        for mac, group in groupby(rows, key=attrgetter("mac")):
+            yield mac, (_export_row(row._mapping, row.ts) for row in group)
+
+    def export_sensor_json(self, mac, fr, to, interval=None):
+        """export_sensor_data já codificado em JSON, pelo cache de resultados."""
+        key = _result_key(mac, fr, to, interval, "json")
+        return self._cached(key, lambda: _json_bytes(self.export_sensor_data(mac, fr, to, interval)))
+
+    def export_all_sensors_json(self, fr, to, interval=None, macs=None):
+        """export_all_sensors_data já codificado em JSON, pelo cache de resultados."""
+        key = _result_key(macs, fr, to, interval, "json_all")
+        return self._cached(key, lambda: _json_bytes(self.export_all_sensors_data(fr, to, interval, macs)))
+
+    def export_sensor_excel(self, mac, fr, to, interval=None):
+        """Planilha xlsx de um sensor (arquivo binário posicionado no início), pelo cache."""
+        limits = limits_from_policy(self.db_manager.get_alert_policy(mac))
+        key = _result_key(mac, fr, to, interval, "xlsx", _limits_variant({mac: limits}))
+
+        def build():
+            rows = self.export_sensor_data(mac, fr, to, interval)
+            return ExcelExporter().write([(f"Sensor {mac}", rows, limits)])
+        return _as_file(self._cached(key, build, to_disk=True))
+
+    def export_all_sensors_excel(self, fr, to, interval=None, macs=None):
+        """
+        Planilha xlsx com uma aba por sensor (ou por MAC de `macs`), escrita conforme
+        os grupos chegam do banco, pelo cache. Os limites de alarme entram na chave.
+        """
+        limits = {policy.mac: limits_from_policy(policy) for policy in self.db_manager.get_alert_policies()}
+        key = _result_key(macs, fr, to, interval, "xlsx_all", _limits_variant(limits))
+
+        def build():
+            sheets = ((mac, rows, limits.get(mac, {}))
+                      for mac, rows in self.iter_all_sensors_data(fr, to, interval, macs))
+            return ExcelExporter().write(sheets)
+        return _as_file(self._cached(key, build, to_disk=True))
+
+    def iter_export_rows(self, fr, to, interval=None, macs=None, source="aggregate"):
+        """
+        Linhas planas para exportação em fluxo (CSV/NDJSON). Retorna (colunas, gerador
+        de tuplas); nada é consultado antes de o gerador ser consumido, e as linhas
+        vêm do cursor em lotes (yield_per), sem materializar o período.
+          - source="aggregate": intervalos de N horas, as linhas de export_sensor_data;
+          - source="clean": os minutos de reads_clean;
+          - source="raw": as leituras brutas.
+        `macs`: um MAC, lista de MACs ou None para todos. `to` é inclusivo.
+        """
+        fr_ms = parse_timestamp_ms(fr)
+        to_ms = parse_timestamp_ms(to)
+        if source == "clean":
+            rows = self.db_manager.iter_clean_reads(fr_ms, to_ms + 1, macs)
+            return ("timestamp",) + CLEAN_STREAM_COLUMNS[1:], _with_iso_timestamps(rows)
+        if source == "raw":
+            rows = self.db_manager.iter_raw_reads(fr_ms, to_ms + 1, macs)
+            return READING_FIELDS, _with_iso_timestamps(rows)
+        if source != "aggregate":
+            raise ValueError(f"Unknown export source {source!r}")
+
+        def aggregated():
+            for mac, group in self.iter_all_sensors_data(fr_ms, to_ms, interval, macs):
+                for row in group:
+                    yield (row["timestamp"], mac) + tuple(row[column] for column in EXPORT_COLUMNS[2:])
+        return EXPORT_COLUMNS, aggregated()
 
     def export_all_to_excel(json_data):
         wb = Workbook()
@@ -178,34 +274,60 @@ class SensorService:
         buf.seek(0)
         return buf
 
+def _result_key(macs, fr, to, interval, fmt, variant=""):
+    """Chave do cache de resultados; `to` é inclusivo, como nas exportações."""
+    return ResultKey(mac_set(macs), parse_timestamp_ms(fr), parse_timestamp_ms(to) + 1,
+                     int(interval) if interval else None, fmt, variant)
+
+
+def _limits_variant(limits):
+    """Resumo dos limites {mac: limites} que colorem a planilha, para a chave do cache."""
+    return hashlib.sha1(repr(sorted(limits.items())).encode()).hexdigest()
+
+
+def _json_bytes(data):
+    # Mesma saída do jsonify do Flask fora do modo debug (chaves ordenadas, compacto).
+    return json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+
+
+def _as_file(result):
+    return io.BytesIO(result) if isinstance(result, bytes) else result
+
+
+def _with_iso_timestamps(rows):
+    """Troca o ts (epoch ms, primeira coluna) pelo timestamp ISO 8601."""
+    for row in rows:
+        yield (ms_to_iso(row[0]),) + tuple(row[1:])
+
+
+def _export_row(aggregate, group_start):
+    """Linha de exportação a partir de um agregado mesclado (dict ou mapping de get_bucketed_reads)."""
+    return {
+        "timestamp": ms_to_iso(group_start, timespec='minutes'),
+        "avg_temp": aggregate["avg_temp"],
+        "avg_hum": aggregate["avg_hum"],
+        "min_temp": aggregate["min_temp"],
+        "max_temp": aggregate["max_temp"],
+        "min_hum": aggregate["min_hum"],
+        "max_hum": aggregate["max_hum"],
+        "last_temp": aggregate["last_temp"],
+        "last_hum": aggregate["last_hum"],
+        "last_timestamp": ms_to_iso(aggregate["last_ts"]),
+        "first_temp": aggregate["first_temp"],
+        "first_hum": aggregate["first_hum"],
+        "first_timestamp": ms_to_iso(aggregate["first_ts"]),
+    }
+
+
 def _aggregate_group(group, group_start):
     """
-    Faz agregação dos dados do grupo:
-      - Média dos valores
+    Faz agregação em memória dos dados do grupo, mesclando os parciais de cada linha:
+      - Média ponderada pelo número de leituras (soma / contagem)
       - Min/max
-      - Última leitura válida
-      - Horário da última leitura
+      - Primeira e última leitura e seus horários
+    Mesma linha que export_sensor_data produz no SQL.
     """
-    # Ordene o grupo pelo timestamp (garante que o último é realmente o último)
-    group_sorted = sorted(group, key=lambda g: g.timestamp)
-    last = group_sorted[-1]
-    first = group_sorted[0]
-
-    return {
-        "timestamp": group_start.isoformat(timespec='minutes'),
-        "avg_temp": sum([g.avg_temp for g in group if g.avg_temp is not None]) / len(group),
-        "avg_hum": sum([g.avg_hum for g in group if g.avg_hum is not None]) / len(group),
-        "min_temp": min([g.min_temp for g in group if g.min_temp is not None]),
-        "max_temp": max([g.max_temp for g in group if g.max_temp is not None]),
-        "min_hum": min([g.min_hum for g in group if g.min_hum is not None]),
-        "max_hum": max([g.max_hum for g in group if g.max_hum is not None]),
-        "last_temp": last.avg_temp,
-        "last_hum": last.avg_hum,
-        "last_timestamp": last.timestamp,
-        "first_temp": first.avg_temp,
-        "first_hum": first.avg_hum,
-        "first_timestamp": first.timestamp,
-    }
+    return _export_row(merge_partials(group), group_start)
 
 # Singleton para import fácil
 sensor_service = SensorService()
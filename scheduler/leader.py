@@ -0,0 +1,66 @@
+# scheduler/leader.py
+
+import logging
+import os
+from db_ops.engine import is_file_sqlite
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, todo processo se considera líder
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class LeaderLock:
+    """
+    Exclusive, non-blocking flock on a file next to the database.
+
+    Whoever holds the lock is the only scheduler for that database; the kernel
+    drops the lock when the holder's process exits or dies, so a standby that
+    keeps calling try_acquire() takes over without any lease to expire.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._fh = None
+
+    @classmethod
+    def for_url(cls, db_url):
+        """Lock file `<database>.scheduler.lock`, or None for non-file databases (nothing to share)."""
+        if not is_file_sqlite(db_url):
+            return None
+        return cls(os.path.abspath(db_url[len("sqlite:///"):]) + ".scheduler.lock")
+
+    @property
+    def held(self):
+        return self._fh is not None
+
+    def try_acquire(self):
+        """Takes the lock if it is free. Returns True while this process holds it."""
+        if self._fh is not None:
+            return True
+        if fcntl is None:
+            logger.warning("fcntl unavailable; %s not enforced", self.path)
+            self._fh = open(os.devnull, "w")
+            return True
+        fh = open(self.path, "a+")
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        fh.seek(0)
+        fh.truncate()
+        fh.write(f"{os.getpid()}\n")
+        fh.flush()
+        self._fh = fh
+        return True
+
+    def release(self):
+        if self._fh is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        self._fh.close()
+        self._fh = None
@@ -1,5 +1,9 @@
 # scheduler/scheduler.py
 
+import heapq
+import itertools
+import os
+import random
 import threading
 import time
 import datetime
@@ -7,114 +11,275 @@ import logging
 from sqlalchemy import func, Float
 from db_ops.db_manager import DatabaseManager
 from db_ops.models import ReadRaw
+from db_ops.engine import count_queries
+from modules.alerts import AlertEngine
+from config import load_settings
+from scheduler.leader import LeaderLock
+from utils.parser import parse_timestamp_ms
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Jobs globais; os jobs por sensor usam a chave (SCHEDULED_READ, mac).
+COMPACTION = "compaction"
+REFRESH = "refresh"
+ALERTS = "alerts"
+SCHEDULED_READ = "scheduled_read"
+
+
+def _to_iso(ms):
+    # SchedulePolicy.last_update é ISO UTC sem fuso, como o utcnow().isoformat() de antes.
+    return datetime.datetime.utcfromtimestamp(ms / 1000).isoformat()
+
+
 class SchedulerManager:
     """
     Orchestrates scheduled operations such as data compression and alert checking.
+
+    Jobs live in a heap keyed by their next due time: one scheduled-read job per
+    sensor with a SchedulePolicy, run every `delta_time` seconds, plus the minute
+    compaction and a policy refresh every `check_interval` seconds, and the alert
+    evaluation every `alert_interval` seconds. The loop sleeps until the earliest
+    deadline, so an idle scheduler costs nothing.
+    Each scheduled read aggregates exactly [due - delta_time, due); a random delay
+    of up to `jitter` seconds (and at most 10% of the interval) spreads execution
+    without moving the window. set_schedule_policy re-plans the sensor immediately;
+    the periodic refresh picks up changes made by other processes.
+    The alert job feeds the readings committed since its last run to the alert
+    engine (modules.alerts), so breaches are tracked by the leader alone whichever
+    worker stored the readings; polling the latest reading on each refresh is
+    only done with poll_alerts=True.
+    With a `leader` (LeaderLock) the loop only runs while this process holds the
+    lock, so a single scheduler runs per database; standbys retry every
+    `leader_retry` seconds and take over if the leader dies.
     """
-    def __init__(self, db_manager: DatabaseManager, check_interval=60):
+    def __init__(self, db_manager: DatabaseManager, check_interval=60, latest_lookback=3600,
+                 poll_alerts=False, jitter=5.0, leader=None, leader_retry=1.0, alert_interval=None):
         self.db_manager = db_manager
         self.check_interval = check_interval  # Interval in seconds.
+        self.latest_lookback = latest_lookback  # Seconds; older readings are not alert candidates.
+        self.poll_alerts = poll_alerts
+        self.alert_interval = alert_interval  # Seconds; None disables the alert job.
+        self.jitter = jitter
+        self.leader = leader
+        self.leader_retry = leader_retry
+        self.alert_engine = None
         self.running = False
+        self._heap = []           # (fire_at_ms, seq, key, due_ms)
+        self._jobs = {}           # key -> (due_ms, delta_ms) of the live plan
+        self._seq = itertools.count()
+        self._replan = set()      # MACs whose policy changed in this process
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        # Instrumentation of the last wake-up (see run_due).
+        self.last_cycle = {"jobs": 0, "queries": 0, "duration_ms": 0.0}
+        self.jobs_run = 0
         logger.debug("SchedulerManager initialized with check interval %s seconds", check_interval)
 
     def start(self):
         """Starts the scheduler loop in a daemon thread."""
         self.running = True
-        threading.Thread(target=self._run_loop, daemon=True).start()
+        self.db_manager.add_schedule_policy_listener(self.policy_changed)
+        self._thread = threading.Thread(target=self._lead_and_run, name="scheduler", daemon=True)
+        self._thread.start()
         logger.info("Scheduler started.")
 
-    def stop(self):
-        """Stops the scheduler loop."""
+    def stop(self, timeout=10):
+        """Stops the scheduler loop and gives up leadership."""
         self.running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
         logger.info("Scheduler stopped.")
 
+    @property
+    def is_leader(self):
+        return self.leader is None or self.leader.held
+
+    def _lead_and_run(self):
+        if self.leader is not None:
+            logger.info("Scheduler waiting for leadership (%s)", self.leader.path)
+            while self.running and not self.leader.try_acquire():
+                self._wakeup.wait(self.leader_retry)
+            if not self.running:
+                return
+            logger.info("Scheduler is the leader (pid %d)", os.getpid())
+        try:
+            self._run_loop()
+        finally:
+            if self.leader is not None:
+                self.leader.release()
+
+    def policy_changed(self, mac):
+        """Re-plans `mac` on the next wake-up, which happens right away."""
+        with self._lock:
+            self._replan.add(mac)
+        self._wakeup.set()
+
+    @staticmethod
+    def now_ms():
+        return int(time.time() * 1000)
+
     def _run_loop(self):
+        self.plan(self.now_ms())
         while self.running:
-            logger.debug("--- Scheduler Cycle Started ---")
-            self.register_schedule_timestamps()
-            self.clean_and_compress_reads()
-            self.register_scheduled_reads()
-            self.check_alerts()
-            logger.debug("--- Scheduler Cycle Finished ---")
-            time.sleep(self.check_interval)
-
-    def register_schedule_timestamps(self):
-        logger.debug("Registering schedule timestamps...")
-        sensors = self.db_manager.get_all_sensors()
-        now = datetime.datetime.utcnow()
-        for sensor in sensors:
-            schedule_policy = self.db_manager.get_schedule_policy(sensor.mac)
-            if schedule_policy:
-                if schedule_policy.last_update:
-                    last_update = datetime.datetime.fromisoformat(schedule_policy.last_update)
+            now = self.now_ms()
+            delay = (self._heap[0][0] - now) / 1000 if self._heap else self.check_interval
+            if delay > 0:
+                self._wakeup.wait(delay)
+                self._wakeup.clear()
+                if self._replan:
+                    self._apply_replans(self.now_ms())
+                continue
+            try:
+                self.run_due(now)
+            except Exception:
+                logger.exception("Scheduler jobs failed")
+
+    # -------------------------------
+    # Planning
+    # -------------------------------
+    def _push(self, key, due_ms, delta_ms, now_ms):
+        """(Re)schedules `key`; older heap entries for it become stale."""
+        spread = min(self.jitter, delta_ms / 10000) if delta_ms else 0
+        fire_at = max(due_ms, now_ms) + int(random.uniform(0, spread) * 1000)
+        self._jobs[key] = (due_ms, delta_ms)
+        heapq.heappush(self._heap, (fire_at, next(self._seq), key, due_ms))
+
+    def _plan_schedule(self, mac, policy, now_ms):
+        key = (SCHEDULED_READ, mac)
+        if policy is None or not policy.delta_time:
+            self._jobs.pop(key, None)
+            return
+        delta_ms = int(policy.delta_time * 1000)
+        if policy.last_update:
+            due = parse_timestamp_ms(policy.last_update) + delta_ms
+        else:
+            due = now_ms
+        if self._jobs.get(key) != (due, delta_ms):
+            self._push(key, due, delta_ms, now_ms)
+
+    def plan(self, now_ms):
+        """Builds the heap from the current policies (one snapshot query)."""
+        since_ms = now_ms - self.latest_lookback * 1000
+        snapshot = self.db_manager.get_scheduler_snapshot(since_ms)
+        planned = {(SCHEDULED_READ, entry.sensor.mac) for entry in snapshot if entry.schedule_policy}
+        for key in [key for key in self._jobs if key[0] == SCHEDULED_READ and key not in planned]:
+            del self._jobs[key]
+        for entry in snapshot:
+            self._plan_schedule(entry.sensor.mac, entry.schedule_policy, now_ms)
+        interval_ms = int(self.check_interval * 1000)
+        for key in (COMPACTION, REFRESH):
+            if key not in self._jobs:
+                self._push(key, now_ms, interval_ms, now_ms)
+        if self.alert_interval and ALERTS not in self._jobs:
+            self._push(ALERTS, now_ms, int(self.alert_interval * 1000), now_ms)
+        return snapshot
+
+    def _apply_replans(self, now_ms):
+        with self._lock:
+            macs, self._replan = self._replan, set()
+        for mac in macs:
+            self._plan_schedule(mac, self.db_manager.get_schedule_policy(mac), now_ms)
+            logger.debug("Re-planned scheduled reads for sensor %s", mac)
+
+    def next_due(self, mac):
+        """Returns the due time (epoch ms) of the next scheduled read of `mac`, or None."""
+        job = self._jobs.get((SCHEDULED_READ, mac))
+        return job[0] if job else None
+
+    # -------------------------------
+    # Execution
+    # -------------------------------
+    def run_due(self, now_ms):
+        """Runs every job whose fire time has passed and records jobs, queries and duration."""
+        started = time.perf_counter()
+        jobs = 0
+        with count_queries() as counter:
+            if self._replan:
+                self._apply_replans(now_ms)
+            while self._heap and self._heap[0][0] <= now_ms:
+                _fire_at, _seq, key, due_ms = heapq.heappop(self._heap)
+                job = self._jobs.get(key)
+                if job is None or job[0] != due_ms:
+                    continue  # entrada antiga de um job re-planejado ou removido
+                delta_ms = job[1]
+                if key == COMPACTION:
+                    self.clean_and_compress_reads(now_ms)
+                    self.db_manager.flush_sensor_cache()
+                elif key == ALERTS:
+                    self.evaluate_alerts()
+                elif key == REFRESH:
+                    snapshot = self.plan(now_ms)
+                    if self.poll_alerts:
+                        self.check_alerts(snapshot)
                 else:
-                    last_update = now - datetime.timedelta(seconds=schedule_policy.delta_time + 1)
-                if (now - last_update).total_seconds() >= schedule_policy.delta_time:
-                    self.db_manager.update_schedule_policy_last_update(sensor.mac, now.isoformat())
-                    logger.debug("Updated schedule timestamp for sensor %s", sensor.mac)
+                    due_ms = self.register_scheduled_read(key[1], due_ms, delta_ms, now_ms)
+                jobs += 1
+                self.jobs_run += 1
+                if key in self._jobs:
+                    self._push(key, due_ms + delta_ms, delta_ms, now_ms)
+        if jobs:
+            self.last_cycle = {
+                "jobs": jobs,
+                "queries": counter.count,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            }
+            logger.debug("Scheduler ran %(jobs)d job(s): %(queries)d queries, %(duration_ms).1f ms",
+                        self.last_cycle)
+        return self.last_cycle
 
-    def clean_and_compress_reads(self):
+    def clean_and_compress_reads(self, now_ms=None):
+        """
+        Compacts every closed minute since the watermark, for all sensors at once,
+        re-aggregates the minutes that received late readings, then extends the
+        hourly and daily rollups over the newly closed (or rewound) periods.
+        """
         logger.debug("Compressing raw reads into clean data...")
-        sensors = self.db_manager.get_all_sensors()
-        now = datetime.datetime.utcnow()
-        minute_start = now.replace(second=0, microsecond=0).isoformat()
-        for sensor in sensors:
-            self.db_manager.compress_minute_reads(sensor.mac, minute_start)
-            logger.debug("Compressed minute reads for sensor %s at %s", sensor.mac, minute_start)
-
-    def register_scheduled_reads(self):
-        logger.debug("Registering scheduled reads...")
-        sensors = self.db_manager.get_all_sensors()
-        now = datetime.datetime.utcnow()
-        interval_start = now.replace(minute=0, second=0, microsecond=0).isoformat()
-        interval_end = now.isoformat()
-        for sensor in sensors:
-            schedule_policy = self.db_manager.get_schedule_policy(sensor.mac)
-            if schedule_policy:
-                now_ts = now.timestamp()
-                last_update = datetime.datetime.fromisoformat(schedule_policy.last_update) if schedule_policy.last_update else None
-                elapsed = now_ts - (last_update.timestamp() if last_update else 0)
-                if elapsed >= schedule_policy.delta_time:
-                    self.db_manager.compress_schedule_reads(sensor.mac, interval_start, interval_end)
-                    logger.debug("Registered scheduled read for sensor %s from %s to %s", sensor.mac, interval_start, interval_end)
-
-    def check_alerts(self):
+        result = self.db_manager.compact_closed_minutes(now_ms)
+        logger.debug("Compaction up to %s: %d clean rows", result["to"], result["rows"])
+        self.db_manager.recompact_late_minutes()
+        self.db_manager.roll_up()
+
+    def register_scheduled_read(self, mac, due_ms, delta_ms, now_ms):
+        """
+        Aggregates the interval that ended at `due_ms` and stores `due_ms` as the
+        policy's last_update. After downtime, intervals that fell entirely in the
+        past are skipped (the grid stays aligned) and only the latest one is written.
+        Returns the due time that was processed.
+        """
+        missed = (now_ms - due_ms) // delta_ms
+        if missed > 0:
+            due_ms += missed * delta_ms
+            logger.warning("Sensor %s: %d scheduled interval(s) skipped after a delay", mac, missed)
+        self.db_manager.compress_schedule_reads(mac, due_ms - delta_ms, due_ms)
+        self.db_manager.update_schedule_policy_last_update(mac, _to_iso(due_ms))
+        logger.debug("Registered scheduled read for sensor %s from %s to %s",
+                     mac, _to_iso(due_ms - delta_ms), _to_iso(due_ms))
+        return due_ms
+
+    def get_alert_engine(self):
+        """Returns the alert engine, built from settings.yaml on first use (in the leader)."""
+        if self.alert_engine is None:
+            self.alert_engine = AlertEngine.from_settings(self.db_manager, load_settings()["alerts"])
+        return self.alert_engine
+
+    def evaluate_alerts(self):
+        """Feeds the raw readings committed since the last run to the alert engine."""
+        rows = self.get_alert_engine().run()
+        if rows:
+            logger.debug("Evaluated alerts on %d new reading(s)", rows)
+
+    def check_alerts(self, snapshot):
+        """Feeds each sensor's latest reading to the alert state machine (poll_alerts mode)."""
         logger.debug("Checking alerts for sensors...")
-        sensors = self.db_manager.get_all_sensors()
-        for sensor in sensors:
-            alert_policy = self.db_manager.get_alert_policy(sensor.mac)
-            if alert_policy:
-                raw_reads = self.db_manager.get_latest_raw_reads(sensor.mac, limit=1)
-                if raw_reads:
-                    last_read = raw_reads[0]
-                    alerts_triggered = []
-                    if alert_policy.temp_max is not None and last_read.temperature is not None:
-                        if last_read.temperature > alert_policy.temp_max:
-                            alerts_triggered.append("temp_high")
-                    if alert_policy.temp_min is not None and last_read.temperature is not None:
-                        if last_read.temperature < alert_policy.temp_min:
-                            alerts_triggered.append("temp_low")
-                    if alert_policy.humidity_max is not None and last_read.humidity is not None:
-                        if last_read.humidity > alert_policy.humidity_max:
-                            alerts_triggered.append("humidity_high")
-                    if alert_policy.humidity_min is not None and last_read.humidity is not None:
-                        if last_read.humidity < alert_policy.humidity_min:
-                            alerts_triggered.append("humidity_low")
-                    for alert in alerts_triggered:
-                        warning_data = {
-                            "timestamp": last_read.timestamp,
-                            "mac": sensor.mac,
-                            "type": alert,
-                            "message": f"{alert} alert triggered for sensor {sensor.mac}",
-                            "read": False,
-                            "posted": False
-                        }
-                        self.db_manager.insert_warning(warning_data)
-                        logger.debug("Inserted warning for sensor %s: %s", sensor.mac, alert)
+        self.get_alert_engine().evaluate([
+            (entry.latest.ts, entry.sensor.mac, entry.latest.temperature, entry.latest.humidity,
+             entry.latest.rssi, None, "")
+            for entry in snapshot if entry.alert_policy is not None and entry.latest is not None
+        ])
 
     def compute_statistics(self, mac, start_timestamp, end_timestamp):
         with self.db_manager.Session() as session:
@@ -127,7 +292,7 @@ class SchedulerManager:
                 func.max(ReadRaw.humidity, ).label("max_hum")
             ).filter(
                 ReadRaw.mac == mac,
-                ReadRaw.timestamp.between(start_timestamp, end_timestamp)
+                ReadRaw.ts.between(parse_timestamp_ms(start_timestamp), parse_timestamp_ms(end_timestamp))
             ).first()
             stats = {
                 "avg_temp": q.avg_temp,
@@ -140,10 +305,32 @@ class SchedulerManager:
             logger.debug("Computed statistics for sensor %s from %s to %s: %s", mac, start_timestamp, end_timestamp, stats)
             return stats
 
-if __name__ == '__main__':
-    from db_ops.db_manager import DatabaseManager
-    db_manager = DatabaseManager()
-    scheduler = SchedulerManager(db_manager, check_interval=60)
+def create_scheduler(db_manager, scheduler_settings=None):
+    """
+    Builds the scheduler from the `scheduler` and `alerts` sections of
+    settings.yaml, with its leader lock.
+    """
+    settings = load_settings()
+    scheduler_settings = scheduler_settings or settings["scheduler"]
+    alert_settings = settings["alerts"]
+    return SchedulerManager(db_manager,
+                            check_interval=scheduler_settings["check_interval"],
+                            jitter=scheduler_settings["jitter"],
+                            leader=LeaderLock.for_url(db_manager.db_url),
+                            alert_interval=alert_settings["interval_seconds"] if alert_settings["enabled"] else None)
+
+
+def main():
+    """
+    Standalone deployment: `python -m scheduler.scheduler`, with web workers
+    configured with scheduler.mode: standalone so they do not start their own.
+    """
+    from db_ops.db_manager import get_db_manager
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+    db_manager = get_db_manager()
+    db_manager.init_schema()
+    scheduler = create_scheduler(db_manager)
     scheduler.start()
     try:
         while True:
@@ -151,3 +338,7 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         scheduler.stop()
         logger.info("Scheduler terminated by user.")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,10 +3,10 @@
 Diagnostic script to list all sensors and verify latest readings, policies, and data integrity.
 """
 
-from db_ops.db_manager import DatabaseManager
+from db_ops.db_manager import get_db_manager
 
 def run_diagnostics():
-    db = DatabaseManager()
+    db = get_db_manager()
 
     all_sensors = db.get_all_sensors()
 
@@ -0,0 +1,57 @@
+from db_ops.db_manager import DatabaseManager
+from modules.alerts import AlertEngine
+
+MAC = "AC233FAE3005"
+
+
+def _row(timestamp, temperature, humidity=50.0, mac=MAC):
+    return (timestamp, mac, temperature, humidity, -60, "MST01", "")
+
+
+def _engine(tmp_path, **kwargs):
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    # Leitura anterior à primeira avaliação: o histórico não é avaliado.
+    db.insert_raw_rows([_row("2025-04-14T09:00:00", 40.0)])
+    engine = AlertEngine(db, **kwargs)
+    assert engine.run() == 0
+    return db, engine
+
+
+def test_committed_rows_are_evaluated_and_rules_follow_policy_changes(tmp_path):
+    db, engine = _engine(tmp_path, batch_size=2)
+    db.set_alert_policy(MAC, temp_min=2, temp_max=8)
+
+    # Excursion between two in-range readings: caught at its first reading, closed on recovery.
+    db.insert_raw_rows([_row("2025-04-14T16:47:00", 5.0), _row("2025-04-14T16:47:10", 9.5),
+                        _row("2025-04-14T16:47:20", 11.0), _row("2025-04-14T16:47:30", 5.0),
+                        _row("2025-04-14T16:47:30", 30.0, mac="AC233FAE3041")])
+    assert engine.run() == 5            # em lotes de 2
+    db.set_alert_policy(MAC, temp_max=12)
+    db.insert_raw_rows([_row("2025-04-14T16:48:00", 11.0)])
+    assert engine.run() == 1 and engine.run() == 0
+
+    assert [(w.mac, w.type, w.timestamp, w.closed_at) for w in db.get_warnings()] == [
+        (MAC, "temp_high", "2025-04-14T16:47:10", "2025-04-14T16:47:30")]
+    assert engine.stats()["evaluated_rows"] == 6
+
+
+def test_long_breach_is_one_row_with_hysteresis_and_min_duration(tmp_path):
+    db, engine = _engine(tmp_path, temp_hysteresis=1.0, min_breach_seconds=60)
+    db.set_alert_policy(MAC, temp_max=8)
+    # A 30 s spike is too short to count.
+    db.insert_raw_rows([_row("2025-04-14T10:00:00", 9.0), _row("2025-04-14T10:00:30", 7.0)])
+    # A weekend out of range, hovering around the limit, is a single open warning...
+    db.insert_raw_rows([_row(f"2025-04-14T{11 + h:02d}:{m:02d}:00", 7.5 if m == 30 else 9.0)
+                        for h in range(10) for m in range(0, 60, 10)])
+    engine.run()
+    assert [(w.timestamp, w.closed_at) for w in db.get_warnings()] == [("2025-04-14T11:00:00", None)]
+
+    # ...that survives a new leader, which resumes after the last row evaluated
+    # and closes it once back 1 °C inside the limit.
+    restarted = AlertEngine(db, temp_hysteresis=1.0, min_breach_seconds=60)
+    assert restarted.run() == 0
+    db.insert_raw_rows([_row("2025-04-14T21:00:00", 6.5)])
+    assert restarted.run() == 1
+    assert [(w.timestamp, w.closed_at) for w in db.get_warnings()] == [
+        ("2025-04-14T11:00:00", "2025-04-14T21:00:00")]
@@ -0,0 +1,31 @@
+from db_ops.backfill import backfill_clean_reads_all
+from db_ops.db_manager import DatabaseManager
+from utils.parser import parse_timestamp_ms
+
+MACS = ("AC233FAE3005", "AC233FAE3041")
+
+
+def test_backfill_is_chunked_and_resumable(tmp_path):
+    url = f"sqlite:///{tmp_path}/ble.db"
+    db = DatabaseManager(url)
+    db.init_schema()
+    start = parse_timestamp_ms("2025-04-01T00:00:00")
+    # 3 days, one reading every 10 minutes per sensor.
+    db.insert_raw_rows([(start + i * 600000, mac, 20.0 + i % 5, 50.0, -60, "MST01", "")
+                        for i in range(3 * 144) for mac in MACS])
+
+    lines = []
+    result = backfill_clean_reads_all(chunk_days=1, db_url=url, out=lines.append)
+    assert result["rows"] == 2 * 3 * 144
+    assert any("ETA" in line for line in lines)
+    assert len(db.get_clean_reads(MACS[0], start, start + 3 * 86400000)) == 3 * 144
+
+    # Checkpoints make a second run a no-op.
+    assert backfill_clean_reads_all(db_url=url, out=lines.append)["sensors"] == 0
+
+    # A minute compacted while still open (as the old per-minute compaction did) is
+    # fixed by --restart, which rewrites the range without duplicating rows.
+    db.insert_raw_rows([(start + 30000, MACS[0], 30.0, 50.0, -60, "MST01", "")])
+    assert backfill_clean_reads_all(restart=True, db_url=url, out=lines.append)["rows"] == 2 * 3 * 144
+    clean = db.get_clean_reads(MACS[0], start, start + 3 * 86400000)
+    assert len(clean) == 3 * 144 and clean[0].avg_temp == 25.0
@@ -0,0 +1,140 @@
+from db_ops.db_manager import DatabaseManager, get_db_manager
+from utils.parser import parse_timestamp_ms
+
+
+def _reading(mac, timestamp, temperature=20.0):
+    return {"mac": mac, "timestamp": timestamp, "temperature": temperature,
+            "humidity": 50.0, "rssi": -50, "type": "MST01", "flags": ""}
+
+
+def test_bulk_insert_counts_and_last_read(tmp_path):
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    result = db.insert_raw_reads_bulk([
+        _reading("AC233FAE3005", "2025-04-14T16:47:01"),
+        _reading("AC233FAE3005", "2025-04-14T16:47:05"),
+        _reading("AC233FAE3041", "2025-04-14T16:47:02"),
+        {"mac": "AC233FAE3041"},
+    ])
+    assert result == {"accepted": 3, "rejected": 1, "duplicates": 0}
+    assert len(db.get_latest_raw_reads("AC233FAE3005")) == 2
+
+    db.flush_sensor_cache()
+    fresh = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    sensors = {s.mac: s.last_read for s in fresh.get_all_sensors()}
+    assert sensors == {"AC233FAE3005": "2025-04-14T16:47:05", "AC233FAE3041": "2025-04-14T16:47:02"}
+
+
+def test_sensor_cache_hits_and_rename_invalidation(tmp_path):
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    db.insert_raw_reads_bulk([_reading("AC233FAE3005", "2025-04-14T16:47:01")])
+    db.insert_raw_reads_bulk([_reading("AC233FAE3005", "2025-04-14T16:47:02")])
+    stats = db.get_sensor_cache_stats()
+    assert stats["misses"] == 1 and stats["hits"] == 1
+
+    db.get_all_sensors()
+    db.rename_sensor("AC233FAE3005", "Geladeira")
+    assert db.get_all_sensors()[0].name == "Geladeira"
+
+    # Ingest after the invalidation (or in a new process) caches the stored row, name included.
+    db.insert_raw_reads_bulk([_reading("AC233FAE3005", "2025-04-14T16:47:03")])
+    assert db.get_sensor("AC233FAE3005").name == "Geladeira"
+    fresh = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    fresh.insert_raw_reads_bulk([_reading("AC233FAE3005", "2025-04-14T16:47:04")])
+    assert fresh.get_sensor("AC233FAE3005").name == "Geladeira"
+
+
+def test_duplicate_readings_are_dropped(tmp_path):
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    batch = [_reading("AC233FAE3005", "2025-04-14T16:47:01"),
+             _reading("AC233FAE3005", "2025-04-14T16:47:01")]
+    assert db.insert_raw_reads_bulk(batch) == {"accepted": 1, "rejected": 0, "duplicates": 1}
+    # Retry caught by the recent-key filter...
+    assert db.insert_raw_reads_bulk(batch)["duplicates"] == 2
+    # ...and, in a fresh process, by the unique index.
+    fresh = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    hooked = []
+    fresh.add_ingest_hook(hooked.append)
+    assert fresh.insert_raw_reads_bulk(batch[:1]) == {"accepted": 0, "rejected": 0, "duplicates": 1}
+    assert len(fresh.get_latest_raw_reads("AC233FAE3005")) == 1
+    # Hooks only see what was written.
+    fresh.insert_raw_reads_bulk(batch[:1] + [_reading("AC233FAE3005", "2025-04-14T16:47:02")])
+    assert [[row[0] for row in rows] for rows in hooked] == [[parse_timestamp_ms("2025-04-14T16:47:02")]]
+
+
+def test_one_engine_per_url(tmp_path):
+    url = f"sqlite:///{tmp_path}/ble.db"
+    first, second = DatabaseManager(url), DatabaseManager(url)
+    assert first.engine is second.engine and first.read_engine is second.read_engine
+    assert DatabaseManager(f"sqlite:///{tmp_path}/other.db").engine is not first.engine
+    assert get_db_manager(url) is get_db_manager(url)
+    # Nothing is created until init_schema() is called explicitly.
+    with first.engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT count(*) FROM sqlite_master").scalar() == 0
+
+
+def test_compaction_covers_closed_minutes_and_advances_watermark(tmp_path):
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    db.insert_raw_reads_bulk([
+        _reading("AC233FAE3005", "2025-04-14T16:45:10", 20.0),
+        _reading("AC233FAE3005", "2025-04-14T16:45:50", 22.0),
+        _reading("AC233FAE3041", "2025-04-14T16:46:30", 25.0),
+        _reading("AC233FAE3005", "2025-04-14T16:47:05", 30.0),
+    ])
+    now = parse_timestamp_ms("2025-04-14T16:47:30")
+    assert db.compact_closed_minutes(now)["rows"] == 2
+    assert db.get_watermark() == parse_timestamp_ms("2025-04-14T16:47")
+    clean = db.get_clean_reads("AC233FAE3005", "2025-04-14T16:00", "2025-04-14T17:00")
+    assert [(r.timestamp, r.avg_temp, r.min_temp, r.max_temp) for r in clean] == [
+        ("2025-04-14T16:45:00", 21.0, 20.0, 22.0)]
+
+    # Nothing new is closed yet; once 16:47 closes only that minute is read.
+    assert db.compact_closed_minutes(now)["rows"] == 0
+    assert db.compact_closed_minutes(now + 60000)["rows"] == 1
+    assert len(db.get_clean_reads("AC233FAE3005", "2025-04-14T16:00", "2025-04-14T17:00")) == 2
+
+
+def test_first_compaction_replaces_minutes_compacted_while_open(tmp_path):
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    db.insert_raw_reads_bulk([_reading("AC233FAE3005", "2025-04-14T16:45:10", 20.0)])
+    # Row left by the old per-minute compaction, written before the minute closed.
+    db.compress_minute_reads("AC233FAE3005", "2025-04-14T16:45")
+    db.insert_raw_reads_bulk([_reading("AC233FAE3005", "2025-04-14T16:45:50", 22.0)])
+
+    assert db.compact_closed_minutes(parse_timestamp_ms("2025-04-14T16:47:30"))["rows"] == 1
+    clean = db.get_clean_reads("AC233FAE3005", "2025-04-14T16:00", "2025-04-14T17:00")
+    assert [(r.avg_temp, r.min_temp, r.max_temp) for r in clean] == [(21.0, 20.0, 22.0)]
+
+
+def test_scheduled_reads_merge_clean_partials_exactly(tmp_path):
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    mac = "AC233FAE3005"
+    # 16:00 tem três leituras, 16:01 uma e 16:02 (ainda não compactado) uma.
+    db.insert_raw_reads_bulk([
+        _reading(mac, "2025-04-14T16:00:10", 10.0),
+        _reading(mac, "2025-04-14T16:00:20", 10.0),
+        _reading(mac, "2025-04-14T16:00:30", 10.0),
+        _reading(mac, "2025-04-14T16:01:00", 30.0),
+        _reading(mac, "2025-04-14T16:02:05", 20.0),
+    ])
+    db.compact_closed_minutes(parse_timestamp_ms("2025-04-14T16:02:30"))
+    clean = db.get_clean_reads(mac, "2025-04-14T16:00", "2025-04-14T16:59")
+    assert [(r.count_temp, r.sum_temp, r.first_temp, r.last_temp) for r in clean] == [
+        (3, 30.0, 10.0, 10.0), (1, 30.0, 30.0, 30.0)]
+
+    # Média exata sob reagrupamento: (3*10 + 30) / 4, e não (10 + 30) / 2.
+    from modules.service import _aggregate_group
+    row = _aggregate_group(clean, clean[0].ts)
+    assert row["avg_temp"] == 15.0
+    assert (row["first_timestamp"], row["last_timestamp"]) == ("2025-04-14T16:00:10", "2025-04-14T16:01:00")
+
+    db.compress_schedule_reads(mac, "2025-04-14T16:00", "2025-04-14T16:03")
+    [scheduled] = db.get_scheduled_reads(mac, "2025-04-14T16:00", "2025-04-14T16:00")
+    assert (scheduled.count_temp, scheduled.avg_temp, scheduled.min_temp, scheduled.max_temp) == (5, 16.0, 10.0, 30.0)
+    assert (scheduled.first_temp, scheduled.last_temp) == (10.0, 20.0)
+    assert scheduled.last_ts == parse_timestamp_ms("2025-04-14T16:02:05")
@@ -0,0 +1,29 @@
+from openpyxl import load_workbook
+from modules.excel_export import ExcelExporter, NO_DATA_MESSAGE
+
+
+def _row(hour, avg_temp):
+    return {"timestamp": f"2025-04-14T{hour:02d}:00", "avg_temp": avg_temp, "avg_hum": 50.0,
+            "min_temp": avg_temp - 1, "max_temp": avg_temp + 1, "min_hum": 49.0, "max_hum": 51.0,
+            "last_temp": avg_temp, "last_hum": 50.0, "last_timestamp": f"2025-04-14T{hour:02d}:59:30"}
+
+
+def test_write_only_export_keeps_layout_and_highlights(tmp_path):
+    limits = {"temp_min": 2.0, "temp_max": 8.0, "hum_min": None, "hum_max": None}
+    rows = (_row(h, t) for h, t in ((0, 5.0), (1, 8.0), (2, 9.123)))
+    out = ExcelExporter().write([("AC233FAE3005", rows, limits), ("AC233FAE3041", [], {})])
+    wb = load_workbook(out)
+
+    ws = wb["AC233FAE3005"]
+    assert ws.freeze_panes == "A2"
+    assert [c.value for c in ws[1]][:3] == ["Data", "Hora", "Última Temp (°C)"]
+    assert ws[1][0].font.bold
+    assert [c.value for c in ws[4]][:6] == ["2025-04-14", "02:00", 9.123, 50.0, "02:59", 9.123]
+    assert ws["F2"].number_format == "0.00"
+    # Zebra, no limite (amarelo) e fora do limite (vermelho) na média de temperatura.
+    assert [ws[f"F{r}"].fill.start_color.rgb for r in (2, 3, 4)] == ["00F8FAFF", "00FFF475", "00FF8A80"]
+    assert ws["G4"].fill.start_color.rgb == "00F8FAFF"
+    assert (ws["A1"].style, ws["A2"].style, ws["F4"].style) == ("export_header", "export_even", "export_limit_num")
+    assert ws.column_dimensions["F"].width == len("Temperatura Média (°C)") + 2
+
+    assert wb["AC233FAE3041"]["A1"].value == NO_DATA_MESSAGE
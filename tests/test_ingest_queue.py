@@ -0,0 +1,82 @@
+import threading
+import time
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+from blueprints import listener
+from db_ops.db_manager import DatabaseManager
+from modules.ingest import IngestQueue
+
+MAC = "AC233FAE3005"
+
+
+def _reading(minute):
+    return {"mac": MAC, "timestamp": f"2025-04-14T10:{minute:02d}:00", "temperature": 20.0,
+            "humidity": 50.0, "rssi": -50, "type": "MST01", "flags": ""}
+
+
+def _client(tmp_path, monkeypatch, queue_size):
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    queue = IngestQueue(db, maxsize=queue_size, batch_size=500, flush_interval=0.05)
+    monkeypatch.setattr(listener, "db_manager", db)
+    monkeypatch.setattr(listener, "ingest_queue", queue)
+    monkeypatch.setitem(listener.ingest_settings, "retry_after", 3)
+    app = Flask(__name__)
+    app.register_blueprint(listener.listener_bp)
+    return db, queue, app.test_client()
+
+
+def test_async_ingest_answers_202_429_and_413(tmp_path, monkeypatch):
+    db, queue, client = _client(tmp_path, monkeypatch, queue_size=4)
+
+    # Lote maior que a fila inteira: 413 mesmo com a fila vazia, sem Retry-After.
+    response = client.post("/api/data/", json=[_reading(m) for m in range(5)])
+    assert response.status_code == 413
+    assert response.json["max_batch"] == 4 and "Retry-After" not in response.headers
+    assert queue.depth() == 0
+
+    response = client.post("/api/data/", json=[_reading(m) for m in range(3)])
+    assert response.status_code == 202 and response.json["queued"] == 3
+
+    # Cabe na fila, mas não agora: 429 com Retry-After, nada enfileirado.
+    response = client.post("/api/data/", json=[_reading(m) for m in range(3, 5)])
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3" and response.json["queue_depth"] == 3
+    assert queue.depth() == 3
+
+    # stop() grava o que ainda estava na fila.
+    queue.start()
+    queue.stop()
+    assert queue.depth() == 0
+    assert len(db.get_latest_raw_reads(MAC)) == 3
+    assert queue.stats()["committed_rows"] == 3
+
+
+def test_failed_commit_is_retried_and_new_work_refused_meanwhile(tmp_path, monkeypatch):
+    db, queue, client = _client(tmp_path, monkeypatch, queue_size=10)
+    queue.retry_delay = queue.max_retry_delay = 0.02
+    insert, unlocked = db.insert_raw_rows, threading.Event()
+
+    def locked(rows):
+        if not unlocked.is_set():
+            raise OperationalError("INSERT INTO reads_raw", None, Exception("database is locked"))
+        return insert(rows)
+
+    monkeypatch.setattr(db, "insert_raw_rows", locked)
+    queue.start()
+    assert client.post("/api/data/", json=[_reading(m) for m in range(3)]).status_code == 202
+    deadline = time.monotonic() + 5
+    while queue.stats()["failed_commits"] < 2:
+        assert time.monotonic() < deadline, "writer never retried"
+        time.sleep(0.01)
+
+    # Enquanto a gravação falha: 503 com Retry-After, e o lote aceito continua pendente.
+    response = client.post("/api/data/", json=[_reading(3)])
+    assert response.status_code == 503 and response.headers["Retry-After"] == "3"
+    stats = client.get("/api/data/stats").json["queue"]
+    assert stats["writer_failing"] and "database is locked" in stats["last_error"]
+
+    unlocked.set()
+    queue.stop()
+    assert len(db.get_latest_raw_reads(MAC)) == 3
+    assert not queue.failing and queue.stats()["committed_rows"] == 3
@@ -3,3 +3,97 @@ def test_parse_payload():
     sample_payload = {"sensor": "value", "timestamp": "2025-04-14T12:00:00"}
     result = parser.parse_payload(sample_payload)
     assert result == sample_payload, "O parser não retornou o dicionário conforme esperado"
+
+def test_iter_ndjson_reports_line_numbers():
+    import io
+    from utils import parser
+    stream = io.BytesIO(b'{"mac": "AC233FAE3005"}\n\nnot json\n{"mac": "AC233FAE3041"}\n')
+    result = list(parser.iter_ndjson(stream))
+    assert [(n, r) for n, r, _ in result] == [(1, {"mac": "AC233FAE3005"}), (3, None), (4, {"mac": "AC233FAE3041"})]
+    assert result[1][2].startswith("Invalid JSON")
+
+def test_columnar_and_packed_payloads_decode_to_rows():
+    from utils import parser
+    columnar = parser.parse_payload({"mac": ["AC233FAE3005", "AC233FAE3041"],
+                                     "timestamp": ["2025-04-14T12:00:00", "2025-04-14T12:00:01"],
+                                     "temperature": [21.5, 22.0], "type": "MST01"})
+    assert columnar.rows() == [
+        ("2025-04-14T12:00:00", "AC233FAE3005", 21.5, None, None, "MST01", ""),
+        ("2025-04-14T12:00:01", "AC233FAE3041", 22.0, None, None, "MST01", ""),
+    ]
+    packed = parser.pack_readings([("AC:23:3F:AE:30:05", 1744632000250, -3.5, 61.25, -70)])
+    assert parser.parse_packed(packed, "MST01").rows() == [
+        (1744632000250, "AC233FAE3005", -3.5, 61.25, -70, "MST01", ""),
+    ]
+
+
+def test_timestamps_normalize_to_epoch_ms():
+    from utils import parser
+    assert parser.parse_timestamp_ms("2025-04-14T12:00:00.250Z") == 1744632000250
+    assert parser.parse_timestamp_ms("2025-04-14T09:00:00.25-03:00") == 1744632000250
+    assert parser.parse_timestamp_ms("2025-04-14T12:00:00.250") == 1744632000250
+    assert parser.ms_to_iso(1744632000250) == "2025-04-14T12:00:00.250"
+    assert parser.ms_to_iso(1744632000000, timespec="minutes") == "2025-04-14T12:00"
+
+
+def _ndjson_client(tmp_path, monkeypatch):
+    from flask import Flask
+    from blueprints import listener
+    from db_ops.db_manager import DatabaseManager
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    monkeypatch.setattr(listener, "db_manager", db)
+    app = Flask(__name__)
+    app.register_blueprint(listener.listener_bp)
+    return db, app.test_client()
+
+
+def _ndjson_line(i, temperature=20.0):
+    import json
+    from utils.parser import ms_to_iso
+    return json.dumps({"mac": "AC233FAE3005", "timestamp": ms_to_iso(1744624800000 + i * 1000),
+                       "temperature": temperature, "humidity": 50.0, "rssi": -50, "type": "MST01", "flags": ""})
+
+
+def test_ndjson_endpoint_streams_gzip_in_chunks(tmp_path, monkeypatch):
+    import gzip
+    from blueprints import listener
+    db, client = _ndjson_client(tmp_path, monkeypatch)
+    inserts = []
+    original = db.insert_raw_reads_bulk
+    monkeypatch.setattr(db, "insert_raw_reads_bulk", lambda chunk: inserts.append(len(chunk)) or original(chunk))
+
+    # 1203 linhas: JSON quebrado na 3 e leitura inválida na 600, no meio do fluxo.
+    lines = [_ndjson_line(i) for i in range(1, 1204)]
+    lines[2] = '{"mac": "AC233FAE3005", '
+    lines[599] = _ndjson_line(600, temperature=999.0)
+    body = gzip.compress(("\n".join(lines) + "\n").encode())
+    response = client.post("/api/data/ndjson", data=body, headers={"Content-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    result = response.json
+    assert result["accepted"] == 1201 and result["duplicates"] == 0
+    assert result["accepted_lines"] == [[1, 2], [4, 599], [601, 1203]]
+    assert [r["line"] for r in result["rejected"]] == [3, 600] and result["rejected_count"] == 2
+    assert result["rejected"][0]["errors"][0].startswith("Invalid JSON")
+    assert inserts == [listener.NDJSON_CHUNK_SIZE, listener.NDJSON_CHUNK_SIZE, 201]
+    assert len(db.get_latest_raw_reads("AC233FAE3005", limit=2000)) == 1201
+
+    # Reenvio: as mesmas linhas contam como duplicadas, não como novas.
+    response = client.post("/api/data/ndjson", data=body, headers={"Content-Encoding": "gzip"})
+    assert response.json["accepted"] == 0 and response.json["duplicates"] == 1201
+
+
+def test_ndjson_endpoint_caps_rejected_details(tmp_path, monkeypatch):
+    from blueprints import listener
+    _, client = _ndjson_client(tmp_path, monkeypatch)
+    total = listener.MAX_REJECTED_DETAILS + 5
+    lines = [_ndjson_line(i, temperature=999.0) for i in range(1, total + 1)] + [_ndjson_line(total + 1)]
+    response = client.post("/api/data/ndjson", data="\n".join(lines))
+
+    result = response.json
+    assert response.status_code == 200
+    assert result["rejected_count"] == total
+    assert len(result["rejected"]) == listener.MAX_REJECTED_DETAILS
+    assert result["rejected"][-1]["line"] == listener.MAX_REJECTED_DETAILS
+    assert result["accepted_lines"] == [[total + 1, total + 1]]
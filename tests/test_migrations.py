@@ -0,0 +1,80 @@
+from sqlalchemy import create_engine, text
+from db_ops.models import Base
+from db_ops.migrations import migrate, check_schema
+
+HOT_QUERIES = {
+    "reads_raw": "SELECT * FROM reads_raw WHERE mac = 'AC233FAE3005' ORDER BY ts DESC LIMIT 1",
+    "reads_clean": "SELECT * FROM reads_clean WHERE mac = 'AC233FAE3005' ORDER BY ts DESC LIMIT 100",
+    "reads_scheduled": ("SELECT * FROM reads_scheduled WHERE mac = 'AC233FAE3005' "
+                        "AND ts BETWEEN 1735689600000 AND 1738368000000 ORDER BY ts"),
+    "warnings": "SELECT * FROM warnings WHERE mac = 'AC233FAE3005' AND read = 0",
+}
+
+
+def _plan(conn, sql):
+    return " | ".join(row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql)))
+
+
+def _uses_mac_index(plan):
+    return "USING INDEX ix_" in plan or "USING INDEX ux_" in plan
+
+
+def test_migrate_adds_indexes_used_by_hot_queries(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/old.db")
+    Base.metadata.create_all(engine)
+    # Simula um banco antigo: mesmas tabelas, sem índices secundários.
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(text(f"DROP INDEX {index.name}"))
+        before = {table: _plan(conn, sql) for table, sql in HOT_QUERIES.items()}
+
+    migrate(engine)
+
+    with engine.connect() as conn:
+        after = {table: _plan(conn, sql) for table, sql in HOT_QUERIES.items()}
+    for table in HOT_QUERIES:
+        assert not _uses_mac_index(before[table]), before[table]
+        assert _uses_mac_index(after[table]), after[table]
+
+
+def test_migrate_converts_iso_timestamps_to_epoch_ms(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE sensors (mac VARCHAR PRIMARY KEY, name VARCHAR, location VARCHAR, "
+                          "last_read VARCHAR, is_active BOOLEAN)"))
+        conn.execute(text("CREATE TABLE reads_raw (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp VARCHAR, "
+                          "mac VARCHAR, temperature FLOAT, humidity FLOAT, rssi INTEGER, type VARCHAR, flags TEXT)"))
+        conn.execute(text("CREATE TABLE reads_clean (timestamp VARCHAR, mac VARCHAR, avg_temp FLOAT, avg_hum FLOAT, "
+                          "min_temp FLOAT, max_temp FLOAT, min_hum FLOAT, max_hum FLOAT, flags TEXT, "
+                          "PRIMARY KEY (timestamp, mac))"))
+        conn.execute(text("INSERT INTO reads_raw (timestamp, mac, temperature) VALUES "
+                          "('2025-04-14T12:00:00.250Z', 'AC233FAE3005', 20.0), "
+                          "('2025-04-14T09:00:00.25-03:00', 'AC233FAE3005', 20.0), "
+                          "('2025-04-14T12:00:01', 'AC233FAE3005', 21.0), "
+                          "('lixo', 'AC233FAE3005', 22.0)"))
+        conn.execute(text("INSERT INTO reads_clean (timestamp, mac, avg_temp) VALUES "
+                          "('2025-04-14T12:00', 'AC233FAE3005', 20.5)"))
+
+    try:
+        check_schema(engine)
+        assert False, "legacy schema should be rejected"
+    except RuntimeError as e:
+        assert "manage_db.py migrate" in str(e)
+
+    summary = migrate(engine)
+    assert summary["converted"] == {"reads_raw": 2, "reads_clean": 1}
+    # Timestamp ilegível não some: vai para a tabela de quarentena, como estava.
+    assert summary["quarantined"] == {"reads_raw": 1}
+    check_schema(engine)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT ts FROM reads_raw ORDER BY ts")).scalars().all() == \
+            [1744632000250, 1744632001000]
+        assert conn.execute(text("SELECT ts, avg_temp FROM reads_clean")).all() == [(1744632000000, 20.5)]
+        # Linhas agregadas antigas viram parciais de uma leitura.
+        assert summary["partials_filled"] == 1
+        assert conn.execute(text("SELECT count_temp, sum_temp, first_ts, last_temp FROM reads_clean")).all() == \
+            [(1, 20.5, 1744632000000, 20.5)]
+        assert conn.execute(text("SELECT typeof(ts) FROM reads_raw LIMIT 1")).scalar() == "integer"
+        assert conn.execute(text("SELECT timestamp, mac, temperature FROM reads_raw_unparseable")).all() == \
+            [("lixo", "AC233FAE3005", 22.0)]
@@ -0,0 +1,111 @@
+from openpyxl import load_workbook
+from config import load_settings
+from db_ops.db_manager import DatabaseManager
+from modules.result_cache import ResultCache, ResultKey
+from modules.service import SensorService
+from utils.parser import parse_timestamp_ms
+
+
+def _key(n, fmt="json"):
+    return ResultKey(None, n, n + 1, 1, fmt)
+
+
+def test_lru_is_bounded_by_bytes_and_honours_ttl_and_generation():
+    cache = ResultCache(max_bytes=400, ttl=0)
+    for n in range(4):
+        cache.put(_key(n), bytes(100), immutable=True, generation=1)
+    assert cache.get(_key(0), 1) == bytes(100)        # 0 passa a ser o mais recente
+    cache.put(_key(4), bytes(100), immutable=True, generation=1)
+    assert cache.get(_key(1), 1) is None              # LRU descartado
+    assert cache.get(_key(0), 1) is not None
+    assert cache.put(_key(5), bytes(101), immutable=True) == bytes(101)   # > 1/4 do limite: não fica
+    assert cache.get(_key(5)) is None
+
+    cache.put(_key(6), b"x", immutable=False, generation=1)
+    assert cache.get(_key(6), 1) is None              # ttl=0: expirou
+    assert cache.get(_key(3), 2) is None              # outra geração (backfill)
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 4, 2)
+    assert stats["bytes"] == 200 and stats["entries"] == 2
+    assert stats["hit_ratio"] == 2 / 6
+
+
+def test_files_are_closed_once_cached_and_handed_back_when_too_large(tmp_path):
+    import tempfile
+    cache = ResultCache(max_bytes=400, disk_dir=str(tmp_path), disk_max_bytes=150)
+
+    def spooled(size):
+        out = tempfile.SpooledTemporaryFile(max_size=10)   # já no disco
+        out.write(bytes(size))
+        out.seek(0)
+        return out
+
+    copied, read = spooled(100), spooled(50)
+    with cache.put(_key(0, "xlsx"), copied, to_disk=True) as served:
+        assert served.read() == bytes(100)
+    assert cache.put(_key(1), read) == bytes(50)
+    assert copied.closed and read.closed
+
+    too_large = spooled(200)
+    too_large.read(10)
+    assert cache.put(_key(2, "xlsx"), too_large, to_disk=True) is too_large
+    assert not too_large.closed and too_large.tell() == 0
+    too_large.close()
+
+
+def _service(tmp_path, **cache):
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    db.insert_raw_reads_bulk([
+        {"mac": "AC233FAE3005", "timestamp": f"2025-04-14T{h:02d}:{m:02d}:30", "temperature": h + 10.0,
+         "humidity": 50.0, "rssi": -50, "type": "MST01", "flags": ""}
+        for h in range(10, 13) for m in range(0, 60, 10)])
+    db.compact_closed_minutes(parse_timestamp_ms("2025-04-14T12:00:30"))   # 12:xx ainda não compactado
+    settings = load_settings()
+    settings["cache"].update(result_ttl=0, **cache)
+    return db, SensorService(db.db_url, settings=settings)
+
+
+def test_compacted_ranges_are_kept_until_a_backfill(tmp_path):
+    db, service = _service(tmp_path)
+    mac = "AC233FAE3005"
+
+    first = service.export_sensor_json(mac, "2025-04-14T10:00", "2025-04-14T11:59", 1)
+    assert service.export_sensor_json(mac, "2025-04-14T10:00", "2025-04-14T11:59", 1) == first
+    assert service.get_result_cache_stats()["hits"] == 1
+
+    # Período que chega ao que ainda não foi compactado: só vale pelo TTL (0 aqui).
+    service.export_all_sensors_json("2025-04-14T10:00", "2025-04-14T12:59", 1)
+    service.export_all_sensors_json("2025-04-14T10:00", "2025-04-14T12:59", 1)
+    assert service.get_result_cache_stats()["hits"] == 1
+
+    report = service.get_sensor_report(mac, "2025-04-14T10:00", "2025-04-14T10:59")
+    assert report["statistics"]["avg_temp"] == 20.0
+    assert service.get_sensor_report(mac, "2025-04-14T10:00", "2025-04-14T10:59")["statistics"] == \
+        report["statistics"]
+    assert service.get_result_cache_stats()["hits"] == 2
+
+    db.rewind_rollups(parse_timestamp_ms("2025-04-14T10:00"))
+    service.export_sensor_json(mac, "2025-04-14T10:00", "2025-04-14T11:59", 1)
+    stats = service.get_result_cache_stats()
+    assert stats["hits"] == 2 and stats["misses"] == 5
+
+
+def test_xlsx_goes_to_the_disk_tier(tmp_path):
+    _, service = _service(tmp_path, result_disk_dir=str(tmp_path / "results"))
+    mac = "AC233FAE3005"
+
+    with service.export_sensor_excel(mac, "2025-04-14T10:00", "2025-04-14T11:59", 1) as out:
+        assert load_workbook(out)[f"Sensor {mac}"]["C2"].value == 20.0
+    with service.export_sensor_excel(mac, "2025-04-14T10:00", "2025-04-14T11:59", 1) as out:
+        assert load_workbook(out)[f"Sensor {mac}"]["C3"].value == 21.0
+
+    # Limites de alarme novos mudam as cores: outra planilha.
+    service.update_sensor_alert_policy(mac, temp_min=2.0, temp_max=8.0, humidity_min=0, humidity_max=100)
+    service.export_sensor_excel(mac, "2025-04-14T10:00", "2025-04-14T11:59", 1).close()
+
+    stats = service.get_result_cache_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["disk_entries"] == 2 and stats["disk_bytes"] > 0 and stats["bytes"] == 0
+    assert len(list((tmp_path / "results").glob("results-*/*.xlsx"))) == 2
@@ -0,0 +1,156 @@
+from db_ops.db_manager import DatabaseManager, DAY_MS, HOUR_MS, MINUTE_MS
+from db_ops.models import ReadRaw, ReadClean, ReadHourly, ReadDaily
+from modules.query_planner import QueryPlanner
+from modules.reader import DataReader
+from utils.parser import ms_to_iso, parse_timestamp_ms
+
+MAC = "AC233FAE3005"
+DAY0 = parse_timestamp_ms("2025-04-14T00:00")
+
+
+def _load_two_days(db):
+    # Uma leitura a cada 10 min durante dois dias, temperatura subindo com o tempo.
+    rows = [{"mac": MAC, "timestamp": ms_to_iso(DAY0 + i * 10 * MINUTE_MS), "temperature": 10.0 + i * 0.1,
+             "humidity": 50.0, "rssi": -50, "type": "MST01", "flags": ""} for i in range(2 * 144)]
+    db.insert_raw_reads_bulk(rows)
+    return [r["temperature"] for r in rows]
+
+
+def test_rollups_follow_the_clean_watermark(tmp_path):
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    temps = _load_two_days(db)
+    db.compact_closed_minutes(DAY0 + 2 * DAY_MS + MINUTE_MS)
+    assert db.roll_up() == {"reads_hourly": 48, "reads_daily": 2}
+    assert db.roll_up() == {}
+
+    hourly = db.get_partials(MAC, [(ReadHourly, DAY0, DAY0 + 2 * DAY_MS)])
+    assert [r.count_temp for r in hourly] == [6] * 48
+    daily = db.get_partials(MAC, [(ReadDaily, DAY0, DAY0 + 2 * DAY_MS)])
+    assert [(r.count_temp, r.first_temp, r.last_temp) for r in daily] == [
+        (144, temps[0], temps[143]), (144, temps[144], temps[-1])]
+
+
+def test_planner_picks_coarsest_aligned_tier(tmp_path):
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    _load_two_days(db)
+    # Só o primeiro dia e 6 h do segundo estão compactados.
+    db.compact_closed_minutes(DAY0 + DAY_MS + 6 * HOUR_MS + 30 * MINUTE_MS)
+    db.roll_up()
+    planner = QueryPlanner(db)
+    clean_until = db.get_watermark()  # 06:29: o minuto 06:29 ainda está no período de carência
+    assert planner.plan(DAY0, DAY0 + 2 * DAY_MS, 24 * HOUR_MS) == [
+        (ReadDaily, DAY0, DAY0 + DAY_MS),
+        (ReadHourly, DAY0 + DAY_MS, DAY0 + DAY_MS + 6 * HOUR_MS),
+        (ReadClean, DAY0 + DAY_MS + 6 * HOUR_MS, clean_until),
+        (ReadRaw, clean_until, DAY0 + 2 * DAY_MS),
+    ]
+    # Intervalos de 1 h a partir das 00:30 não se alinham com linhas horárias nem diárias.
+    assert [model for model, _, _ in planner.plan(DAY0 + 30 * MINUTE_MS, DAY0 + DAY_MS, HOUR_MS)] == [ReadClean]
+
+    # Estatísticas e exportação pelo plano batem com o cálculo direto sobre o bruto.
+    stats = DataReader(db).get_statistics(MAC, ms_to_iso(DAY0), ms_to_iso(DAY0 + 2 * DAY_MS - 1))
+    raw = db.get_partials(MAC, [(ReadRaw, DAY0, DAY0 + 2 * DAY_MS)])
+    assert abs(stats["avg_temp"] - sum(r.sum_temp for r in raw) / len(raw)) < 1e-9
+    assert (stats["min_temp"], stats["max_temp"]) == (raw[0].sum_temp, raw[-1].sum_temp)
+
+    from modules.service import SensorService
+    exported = SensorService(db.db_url).export_sensor_data(MAC, ms_to_iso(DAY0), ms_to_iso(DAY0 + 2 * DAY_MS - 1), 24)
+    assert [(row["timestamp"], row["first_temp"], row["last_timestamp"]) for row in exported] == [
+        ("2025-04-14T00:00", raw[0].sum_temp, "2025-04-14T23:50:00"),
+        ("2025-04-15T00:00", raw[144].sum_temp, "2025-04-15T23:50:00"),
+    ]
+
+
+def test_export_buckets_in_sql_match_in_memory_merge(tmp_path):
+    from itertools import groupby
+    from modules.service import SensorService, _aggregate_group
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    # Dez dias (mais que a antiga janela de 10.000 linhas cobria em minutos), uma leitura a cada 30 min.
+    db.insert_raw_reads_bulk([
+        {"mac": MAC, "timestamp": ms_to_iso(DAY0 + i * 30 * MINUTE_MS), "temperature": 15.0 + (i % 7),
+         "humidity": 40.0 + (i % 5), "rssi": -50, "type": "MST01", "flags": ""} for i in range(10 * 48)])
+    for _ in range(2):  # no máximo 7 dias por ciclo
+        db.compact_closed_minutes(DAY0 + 10 * DAY_MS + MINUTE_MS)
+    db.roll_up()
+    service = SensorService(db.db_url)
+    clean = db.get_clean_reads(MAC, DAY0, DAY0 + 10 * DAY_MS)
+
+    for fr, interval in ((DAY0 + 30 * MINUTE_MS, 5), (DAY0, 24)):
+        bucket = interval * HOUR_MS
+        expected = [_aggregate_group(list(group), start) for start, group in
+                    groupby(clean, key=lambda r: r.ts - (r.ts - fr) % bucket) if start >= fr]
+        exported = service.export_sensor_data(MAC, ms_to_iso(fr), ms_to_iso(DAY0 + 10 * DAY_MS - 1), interval)
+        assert len(exported) == len(expected)
+        for got, want in zip(exported, expected):
+            assert got.keys() == want.keys()
+            for key, value in want.items():
+                assert got[key] == value or abs(got[key] - value) < 1e-9, (key, got, want)
+
+
+def test_export_all_is_one_query_and_honours_mac_filter(tmp_path):
+    from db_ops.engine import count_queries
+    from modules.service import SensorService
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    macs = ["AC233FAE3005", "AC233FAE3041", "AC233FAE3099"]
+    db.insert_raw_reads_bulk([
+        {"mac": mac, "timestamp": ms_to_iso(DAY0 + i * 20 * MINUTE_MS), "temperature": 20.0 + i % 3 + n,
+         "humidity": 50.0, "rssi": -50, "type": "MST01", "flags": ""}
+        for n, mac in enumerate(macs) for i in range(3 * 72)])
+    db.compact_closed_minutes(DAY0 + 2 * DAY_MS)  # o terceiro dia fica só no bruto
+    db.roll_up()
+    service = SensorService(db.db_url)
+    fr, to = ms_to_iso(DAY0), ms_to_iso(DAY0 + 3 * DAY_MS - 1)
+
+    with count_queries() as counter:
+        exported = service.export_all_sensors_data(fr, to, 6)
+    assert counter.count == 2  # watermarks + a consulta agrupada
+    assert list(exported) == macs
+    assert exported == {mac: service.export_sensor_data(mac, fr, to, 6) for mac in macs}
+    assert list(service.export_all_sensors_data(fr, to, 6, macs=macs[1:])) == macs[1:]
+
+
+def test_late_readings_are_reaggregated_after_compaction(tmp_path):
+    from db_ops.db_manager import LATE_WATERMARK, REWRITE_WATERMARK, HOURLY_WATERMARK, DAILY_WATERMARK
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    ten = DAY0 + 10 * HOUR_MS
+
+    def reading(ts, temperature):
+        return {"mac": MAC, "timestamp": ms_to_iso(ts), "temperature": temperature,
+                "humidity": 50.0, "rssi": -50, "type": "MST01", "flags": ""}
+
+    db.insert_raw_reads_bulk([reading(ten + 30 * 1000, 20.0)])
+    db.compact_closed_minutes(DAY0 + DAY_MS + MINUTE_MS)
+    db.roll_up()
+    assert db.get_watermarks().get(LATE_WATERMARK) is None
+
+    # 29 leituras do mesmo dia chegam depois da compactação (replay de backlog).
+    late = [reading(ten + i * MINUTE_MS + 45 * 1000, 25.0 + i * 0.01) for i in range(29)]
+    assert db.insert_raw_reads_bulk(late)["accepted"] == 29
+    watermarks = db.get_watermarks()
+    assert watermarks[LATE_WATERMARK] == ten + 45 * 1000
+    assert watermarks[REWRITE_WATERMARK] is not None
+
+    result = db.recompact_late_minutes()
+    assert (result["from"], result["to"], result["rows"]) == (ten, db.get_watermark(), 29)
+    watermarks = db.get_watermarks()
+    assert LATE_WATERMARK not in watermarks
+    assert (watermarks[HOURLY_WATERMARK], watermarks[DAILY_WATERMARK]) == (ten, DAY0)
+    db.roll_up()
+
+    temps = [20.0] + [r["temperature"] for r in late]
+    fr, to = ms_to_iso(DAY0), ms_to_iso(DAY0 + DAY_MS - 1)
+    stats = DataReader(db).get_statistics(MAC, fr, to)
+    assert abs(stats["avg_temp"] - sum(temps) / len(temps)) < 1e-9
+    assert (stats["min_temp"], stats["max_temp"]) == (min(temps), max(temps))
+    daily = db.get_partials(MAC, [(ReadDaily, DAY0, DAY0 + DAY_MS)])
+    assert [(r.count_temp, r.first_temp, r.last_temp) for r in daily] == [(30, 20.0, late[-1]["temperature"])]
+
+    # Reenvio das mesmas leituras (outro processo, sem o filtro de chaves recentes): nada a refazer.
+    other = DatabaseManager(db.db_url)
+    assert other.insert_raw_reads_bulk(late)["duplicates"] == 29
+    assert LATE_WATERMARK not in other.get_watermarks()
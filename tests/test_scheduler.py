@@ -0,0 +1,112 @@
+from db_ops.db_manager import DatabaseManager
+from db_ops.engine import count_queries
+from modules.alerts import AlertEngine
+from scheduler.scheduler import SchedulerManager
+from utils.parser import parse_timestamp_ms
+
+T0 = parse_timestamp_ms("2025-04-14T16:47:00")
+
+
+def _site(tmp_path, name, sensors, delta_time=3600):
+    db = DatabaseManager(f"sqlite:///{tmp_path}/{name}.db")
+    db.init_schema()
+    macs = [f"AC233FAE{i:04X}" for i in range(sensors)]
+    db.insert_raw_rows([(T0 + s * 1000, mac, 21.0 + s, 50.0, -60, "MST01", "")
+                        for mac in macs for s in range(30)])
+    for mac in macs:
+        db.set_alert_policy(mac, temp_min=15, temp_max=30)
+        db.set_schedule_policy(mac, delta_time)
+        db.update_schedule_policy_last_update(mac, "2025-04-14T16:47:00")
+    return db, macs
+
+
+def _scheduler(db, **kwargs):
+    scheduler = SchedulerManager(db, jitter=0, **kwargs)
+    db.add_schedule_policy_listener(scheduler.policy_changed)
+    scheduler.plan(T0)
+    return scheduler
+
+
+def test_idle_wakeups_cost_nothing_and_do_not_grow_with_sensors(tmp_path):
+    small = _scheduler(_site(tmp_path, "small", 3)[0])
+    large = _scheduler(_site(tmp_path, "large", 40)[0])
+    # Compaction + policy refresh: same statements for 3 or 40 sensors.
+    assert small.run_due(T0)["queries"] == large.run_due(T0)["queries"]
+    with count_queries() as counter:
+        large.run_due(T0 + 30000)
+    assert counter.count == 0
+
+
+def test_each_sensor_runs_on_its_own_interval_and_replans_on_change(tmp_path):
+    db, (fast, slow) = _site(tmp_path, "site", 2)
+    db.set_schedule_policy(fast, 10)
+    scheduler = _scheduler(db)
+    assert scheduler.next_due(fast) == T0 + 10000 and scheduler.next_due(slow) == T0 + 3600000
+
+    scheduler.run_due(T0 + 10000)
+    scheduler.run_due(T0 + 20000)
+    db.set_schedule_policy(slow, 20)
+    assert scheduler.next_due(slow) == T0 + 3600000  # applied on the next wake-up
+    scheduler.run_due(T0 + 20000)
+
+    fast_reads = db.get_scheduled_reads(fast, T0, T0 + 60000)
+    assert [(r.ts - T0, r.avg_temp) for r in fast_reads] == [(0, 25.5), (10000, 35.5)]
+    assert [(r.ts - T0, r.avg_temp) for r in db.get_scheduled_reads(slow, T0, T0 + 60000)] == [(0, 30.5)]
+    assert scheduler.next_due(slow) == T0 + 40000
+    assert db.get_schedule_policy(fast).last_update == "2025-04-14T16:47:20"
+
+
+def test_poll_mode_feeds_latest_readings_to_the_alert_engine(tmp_path):
+    db, macs = _site(tmp_path, "site", 2)
+    scheduler = _scheduler(db, poll_alerts=True)
+    scheduler.alert_engine = AlertEngine(db)
+    scheduler.run_due(T0 + 30000)
+    assert sorted((w.mac, w.type) for w in db.get_warnings()) == [(mac, "temp_high") for mac in macs]
+
+
+def test_alert_job_evaluates_readings_committed_since_its_last_run(tmp_path):
+    db, macs = _site(tmp_path, "site", 2)
+    scheduler = _scheduler(db, alert_interval=1)
+    scheduler.alert_engine = AlertEngine(db)
+    scheduler.run_due(T0)    # first run starts after the stored readings
+    db.insert_raw_rows([(T0 + 60000, macs[0], 35.0, 50.0, -60, "MST01", "")])
+    scheduler.run_due(T0 + 1000)
+    assert [(w.mac, w.type) for w in db.get_warnings()] == [(macs[0], "temp_high")]
+    assert scheduler.alert_engine.stats()["evaluated_rows"] == 1
+
+
+def _run_scheduler(url, seconds, results):
+    import time
+    from scheduler.leader import LeaderLock
+    scheduler = SchedulerManager(DatabaseManager(url), check_interval=0.05, jitter=0,
+                                 leader=LeaderLock.for_url(url), leader_retry=0.05)
+    scheduler.start()
+    time.sleep(seconds)
+    scheduler.stop()
+    results.put(scheduler.jobs_run)
+
+
+def test_one_scheduler_per_database_with_failover(tmp_path):
+    import multiprocessing
+    import time
+    url = f"sqlite:///{tmp_path}/ble.db"
+    DatabaseManager(url).init_schema()
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    leader = ctx.Process(target=_run_scheduler, args=(url, 60, results))
+    leader.start()
+    lock_file = tmp_path / "ble.db.scheduler.lock"
+    deadline = time.monotonic() + 20
+    while not (lock_file.exists() and lock_file.read_text().strip() == str(leader.pid)):
+        assert time.monotonic() < deadline, "leader never took the lock"
+        time.sleep(0.05)
+    standbys = [ctx.Process(target=_run_scheduler, args=(url, 5, results)) for _ in range(3)]
+    for process in standbys:
+        process.start()
+    time.sleep(2)
+    leader.kill()  # sem limpeza: o lock é liberado pelo kernel
+    for process in standbys:
+        process.join(30)
+    jobs = sorted(results.get(timeout=5) for _ in standbys)
+    # Only one standby took over after the leader died; the others never ran a job.
+    assert jobs[:2] == [0, 0] and jobs[2] > 0
@@ -14,7 +14,7 @@ SENSORS = [
     "AC233FAE303F",
     "AC233FAE3004",
     "AC233FAE3003",
-    "TESTMAC001",
+    "AC233FAE30FF",
 ]
 
 # Config
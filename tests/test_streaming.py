@@ -0,0 +1,43 @@
+import csv
+import gzip
+import io
+import json
+from db_ops.db_manager import DatabaseManager
+from modules.service import SensorService, EXPORT_COLUMNS
+from utils.parser import parse_timestamp_ms
+from utils.streaming import csv_chunks, ndjson_chunks, gzip_chunks
+
+
+def _service(tmp_path):
+    db = DatabaseManager(f"sqlite:///{tmp_path}/ble.db")
+    db.init_schema()
+    db.insert_raw_reads_bulk([
+        {"mac": mac, "timestamp": f"2025-04-14T10:{m:02d}:30", "temperature": 20.0 + m, "humidity": 50.0,
+         "rssi": -50, "type": "MST01", "flags": ""}
+        for mac in ("AC233FAE3005", "AC233FAE3041") for m in range(3)])
+    db.compact_closed_minutes(parse_timestamp_ms("2025-04-14T11:00"))
+    return SensorService(db.db_url)
+
+
+def test_streamed_exports_from_each_source(tmp_path):
+    service = _service(tmp_path)
+    fr, to = "2025-04-14T10:00", "2025-04-14T10:59"
+
+    columns, rows = service.iter_export_rows(fr, to, macs=["AC233FAE3041"], source="raw")
+    body = gzip.decompress(b"".join(gzip_chunks(csv_chunks(columns, rows, chunk_bytes=64))))
+    lines = list(csv.reader(io.StringIO(body.decode())))
+    assert lines[0] == ["timestamp", "mac", "temperature", "humidity", "rssi", "type", "flags"]
+    assert lines[1:] == [[f"2025-04-14T10:0{m}:30", "AC233FAE3041", f"{20.0 + m}", "50.0", "-50", "MST01", ""]
+                         for m in range(3)]
+
+    columns, rows = service.iter_export_rows(fr, to, source="clean")
+    records = [json.loads(line) for line in b"".join(ndjson_chunks(columns, rows, chunk_bytes=64)).splitlines()]
+    assert [(r["mac"], r["timestamp"], r["avg_temp"], r["count_temp"]) for r in records][:2] == [
+        ("AC233FAE3005", "2025-04-14T10:00:00", 20.0, 1), ("AC233FAE3005", "2025-04-14T10:01:00", 21.0, 1)]
+    assert len(records) == 6
+
+    columns, rows = service.iter_export_rows(fr, to, interval=1, source="aggregate")
+    assert columns == EXPORT_COLUMNS
+    expected = service.export_all_sensors_data(fr, to, 1)
+    assert [dict(zip(columns, row)) for row in rows] == [
+        dict(row, mac=mac) for mac, mac_rows in expected.items() for row in mac_rows]
@@ -0,0 +1,30 @@
+from utils.validators import validate_sensor_batch, validate_sensor_payload
+
+
+def _reading(**overrides):
+    reading = {"mac": "AC233FAE3005", "timestamp": "2025-04-14T16:47:26.532Z", "temperature": 26.42,
+               "humidity": 60.52, "rssi": -39, "type": "MST01", "flags": ""}
+    reading.update(overrides)
+    return reading
+
+
+def test_validate_sensor_payload_missing_keys():
+    valid, errors = validate_sensor_payload({"mac": "AC233FAE3005"})
+    assert not valid
+    assert "Missing key: timestamp" in errors
+
+
+def test_validate_sensor_batch_mask_and_errors():
+    mask, errors = validate_sensor_batch([
+        _reading(),
+        _reading(mac="AC:23:3F:AE:30:05", temperature=None),
+        _reading(temperature=300),
+        _reading(timestamp="ontem"),
+        _reading(mac="TESTMAC001", rssi=-200),
+        "not a record",
+    ])
+    assert mask == [True, True, False, False, False, False]
+    assert errors[2] == ["Temperature out of range: 300"]
+    assert errors[3] == ["Invalid timestamp: 'ontem'"]
+    assert errors[4] == ["Invalid mac: 'TESTMAC001'", "RSSI out of range: -200"]
+    assert errors[5] == ["Record is not an object"]
@@ -1,5 +1,51 @@
 # utils/parser.py
 import json
+import struct
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from itertools import repeat
+
+# Column order of a reading everywhere rows travel as tuples (parser -> reads_raw).
+READING_FIELDS = ("timestamp", "mac", "temperature", "humidity", "rssi", "type", "flags")
+
+# Packed binary batch: one fixed-width little-endian record per reading.
+#   6s  MAC (raw bytes)        q  epoch milliseconds (UTC)
+#   h   temperature * 100      H  humidity * 100
+#   b   RSSI (dBm)
+PACKED_CONTENT_TYPE = "application/x-ble-readings"
+PACKED_RECORD = struct.Struct("<6sqhHb")
+PACKED_TEMP_NONE = -32768
+PACKED_HUM_NONE = 0xFFFF
+
+
+class ColumnarBatch:
+    """
+    Readings laid out column by column: {"mac": [...], "timestamp": [...], ...}.
+    A column may also be a single scalar, which applies to every reading
+    (e.g. "type": "MST01"); missing columns are None ("" for flags).
+    """
+    def __init__(self, columns):
+        lengths = {len(v) for v in columns.values() if isinstance(v, (list, tuple))}
+        if len(lengths) > 1:
+            raise ValueError(f"Columnar payload has columns of different lengths: {sorted(lengths)}")
+        self.columns = columns
+        self.length = lengths.pop() if lengths else 0
+
+    def __len__(self):
+        return self.length
+
+    def column(self, field):
+        value = self.columns.get(field, "" if field == "flags" else None)
+        return value if isinstance(value, (list, tuple)) else repeat(value, self.length)
+
+    def rows(self):
+        """Returns the readings as tuples in READING_FIELDS order."""
+        return list(zip(*(self.column(f) for f in READING_FIELDS)))
+
+
+def is_columnar(payload):
+    return isinstance(payload, dict) and isinstance(payload.get("mac"), list)
+
 
 def parse_payload(raw_payload):
     """
@@ -9,9 +55,126 @@ def parse_payload(raw_payload):
         - raw_payload: A dict, list, or JSON string representing sensor data.
     @output
         - The structured sensor data (Python object), unchanged if already parsed.
+          Columnar payloads ({"mac": [...], ...}) come back as a ColumnarBatch.
+    """
+    # Dicts and lists are already parsed; anything else is a JSON string.
+    if not isinstance(raw_payload, (dict, list)):
+        raw_payload = json.loads(raw_payload)
+    if is_columnar(raw_payload):
+        return ColumnarBatch(raw_payload)
+    return raw_payload
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_MS = timedelta(milliseconds=1)
+
+
+def parse_timestamp_ms(value):
+    """
+    @description
+        Normalizes a reading timestamp to integer epoch milliseconds (UTC).
+    @parameters
+        - value: ISO 8601 string (any precision, 'Z' or offset; naive means UTC)
+          or an int already in epoch milliseconds.
+    @output
+        - int, or None if value is None. Raises ValueError for unparseable strings.
+    """
+    if value is None:
+        return None
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // _ONE_MS
+
+
+@lru_cache(maxsize=4096)
+def _second_to_iso(seconds):
+    return (_EPOCH + timedelta(seconds=seconds)).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def ms_to_iso(ms, timespec="auto"):
+    """
+    @description
+        Formats epoch milliseconds as a naive UTC ISO 8601 string (output only).
+    @parameters
+        - ms: Epoch milliseconds (None passes through).
+        - timespec: "auto" (seconds, plus milliseconds when non-zero) or "minutes".
+    @output
+        - str, e.g. "2025-05-29T16:42:07" or "2025-05-29T16:42:07.250".
+    """
+    if ms is None:
+        return None
+    # Readings of a batch share few distinct seconds, so the date formatting is cached.
+    seconds, millis = divmod(ms, 1000)
+    text = _second_to_iso(seconds)
+    if timespec == "minutes":
+        return text[:16]
+    return f"{text}.{millis:03d}" if millis else text
+
+
+def parse_packed(raw_bytes, sensor_type=None):
+    """
+    @description
+        Decodes a packed binary batch (PACKED_CONTENT_TYPE) into a ColumnarBatch.
+    @parameters
+        - raw_bytes: Concatenated PACKED_RECORD records.
+        - sensor_type: Value for the 'type' column of every reading.
+    @output
+        - ColumnarBatch with epoch-millisecond timestamps; raises ValueError if the
+          body is not a whole number of records.
+    """
+    if len(raw_bytes) % PACKED_RECORD.size:
+        raise ValueError(f"Packed payload size {len(raw_bytes)} is not a multiple of {PACKED_RECORD.size}")
+    if not raw_bytes:
+        return ColumnarBatch({"mac": []})
+    macs, stamps, temps, hums, rssis = zip(*PACKED_RECORD.iter_unpack(raw_bytes))
+    return ColumnarBatch({
+        "mac": [m.hex().upper() for m in macs],
+        "timestamp": list(stamps),
+        "temperature": [None if t == PACKED_TEMP_NONE else t / 100 for t in temps],
+        "humidity": [None if h == PACKED_HUM_NONE else h / 100 for h in hums],
+        "rssi": list(rssis),
+        "type": sensor_type,
+        "flags": "",
+    })
+
+
+def pack_readings(readings):
+    """
+    @description
+        Encodes readings into the packed binary format (used by gateways and tests).
+    @parameters
+        - readings: Iterable of (mac_hex, epoch_ms, temperature, humidity, rssi) tuples.
+    @output
+        - bytes
+    """
+    return b"".join(
+        PACKED_RECORD.pack(
+            bytes.fromhex(mac.replace(":", "")),
+            ms,
+            PACKED_TEMP_NONE if temp is None else round(temp * 100),
+            PACKED_HUM_NONE if hum is None else round(hum * 100),
+            rssi,
+        )
+        for mac, ms, temp, hum, rssi in readings
+    )
+
+def iter_ndjson(stream):
+    """
+    @description
+        Incrementally decodes newline-delimited JSON from a binary or text stream.
+    @parameters
+        - stream: Any iterable of lines (file object, request stream, GzipFile...).
+    @output
+        - Yields (line_number, record, error) tuples; `record` is None when the line
+          is not valid JSON and `error` holds the reason. Blank lines are skipped.
     """
-    # If the payload is already a dict or list, simply return it.
-    if isinstance(raw_payload, (dict, list)):
-        return raw_payload
-    # Otherwise, assume it's a JSON string and parse it.
-    return json.loads(raw_payload)
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line), None
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
@@ -0,0 +1,61 @@
+# utils/streaming.py
+
+import csv
+import io
+import json
+import zlib
+
+# Tamanho aproximado de cada pedaço entregue ao servidor WSGI.
+CHUNK_BYTES = 64 * 1024
+
+STREAM_MIMETYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def csv_chunks(columns, rows, chunk_bytes=CHUNK_BYTES):
+    """Encodes rows (sequences in `columns` order) as CSV with a header, in ~chunk_bytes pieces."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= chunk_bytes:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+def ndjson_chunks(columns, rows, chunk_bytes=CHUNK_BYTES):
+    """Encodes rows as one JSON object per line (newline-delimited JSON), in ~chunk_bytes pieces."""
+    lines, size = [], 0
+    for row in rows:
+        line = json.dumps(dict(zip(columns, row)), separators=(",", ":"))
+        lines.append(line)
+        size += len(line) + 1
+        if size >= chunk_bytes:
+            lines.append("")
+            yield "\n".join(lines).encode()
+            lines, size = [], 0
+    if lines:
+        lines.append("")
+        yield "\n".join(lines).encode()
+
+
+ENCODERS = {
+    "csv": csv_chunks,
+    "ndjson": ndjson_chunks,
+}
+
+
+def gzip_chunks(chunks, level=6):
+    """Compresses a stream of byte chunks into a gzip stream on the fly."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -1,17 +1,107 @@
 # utils/validators.py
 
+import re
+from datetime import datetime
+from utils.parser import READING_FIELDS
+
+REQUIRED_KEYS = frozenset(READING_FIELDS)
+
+# 12 hex digits, optionally separated by ':' or '-' (AC233FAE3005, AC:23:3F:AE:30:05).
+MAC_PATTERN = re.compile(r"[0-9A-Fa-f]{2}(?:[:-]?[0-9A-Fa-f]{2}){5}")
+
+TEMPERATURE_RANGE = (-40.0, 125.0)
+HUMIDITY_RANGE = (0.0, 100.0)
+RSSI_RANGE = (-127, 20)
+
+_NUMBER_TYPES = (int, float)
+
+
 def validate_sensor_payload(payload):
     """
-    Validates that the sensor payload contains the required keys.
-    
+    Validates that the sensor payload contains the required keys
+    and that its values pass the same checks as validate_sensor_batch.
+
     Parameters:
         payload (dict): Parsed sensor data.
-    
+
     Returns:
         tuple: (is_valid (bool), errors (list))
     """
-    required_keys = {'timestamp', 'mac', 'temperature', 'humidity', 'rssi', 'type', 'flags'}
-    missing_keys = required_keys - payload.keys()
-    if missing_keys:
-        return False, [f"Missing key: {key}" for key in missing_keys]
-    return True, []
+    mask, errors = validate_sensor_batch([payload])
+    return mask[0], errors.get(0, [])
+
+
+def validate_sensor_batch(records):
+    """
+    Validates a list of reading dicts in one pass.
+
+    Parameters:
+        records (list): Parsed sensor readings.
+
+    Returns:
+        tuple: (mask (list of bool), errors (dict index -> list of messages))
+    """
+    rows = []
+    key_errors = {}
+    for i, record in enumerate(records):
+        if type(record) is not dict:
+            key_errors[i] = ["Record is not an object"]
+            rows.append((None,) * 5)
+            continue
+        if not REQUIRED_KEYS.issubset(record):
+            key_errors[i] = [f"Missing key: {key}" for key in READING_FIELDS if key not in record]
+        get = record.get
+        rows.append((get("timestamp"), get("mac"), get("temperature"), get("humidity"), get("rssi")))
+    mask, errors = validate_sensor_rows(rows)
+    for i, messages in key_errors.items():
+        mask[i] = False
+        # Missing keys already explain missing mac/timestamp values.
+        errors[i] = messages + [e for e in errors.get(i, []) if type(records[i]) is dict
+                                and not e.startswith(("Invalid mac: None", "Invalid timestamp: None"))]
+    return mask, errors
+
+
+def validate_sensor_rows(rows):
+    """
+    Validates reading tuples (READING_FIELDS order) in one pass: MAC format,
+    ISO 8601 (or epoch-millisecond int) timestamp and numeric ranges for temperature, humidity and RSSI.
+    None is accepted for the measurements (channel not reported by the sensor).
+
+    Parameters:
+        rows (list): Tuples starting with (timestamp, mac, temperature, humidity, rssi).
+
+    Returns:
+        tuple: (mask (list of bool), errors (dict index -> list of messages))
+    """
+    match_mac = MAC_PATTERN.fullmatch
+    fromisoformat = datetime.fromisoformat
+    number_types = _NUMBER_TYPES
+    t_lo, t_hi = TEMPERATURE_RANGE
+    h_lo, h_hi = HUMIDITY_RANGE
+    r_lo, r_hi = RSSI_RANGE
+    mask = []
+    errors = {}
+    for i, row in enumerate(rows):
+        ts, mac, temp, hum, rssi = row[0], row[1], row[2], row[3], row[4]
+        errs = None
+        if type(mac) is not str or match_mac(mac) is None:
+            errs = [f"Invalid mac: {mac!r}"]
+        if type(ts) is str:
+            try:
+                fromisoformat(ts)
+            except ValueError:
+                errs = (errs or []) + [f"Invalid timestamp: {ts!r}"]
+        elif type(ts) is not int:
+            errs = (errs or []) + [f"Invalid timestamp: {ts!r}"]
+        if temp is not None and (type(temp) not in number_types or not t_lo <= temp <= t_hi):
+            errs = (errs or []) + [f"Temperature out of range: {temp!r}"]
+        if hum is not None and (type(hum) not in number_types or not h_lo <= hum <= h_hi):
+            errs = (errs or []) + [f"Humidity out of range: {hum!r}"]
+        if rssi is not None and (type(rssi) not in number_types or not r_lo <= rssi <= r_hi):
+            errs = (errs or []) + [f"RSSI out of range: {rssi!r}"]
+        if errs is None:
+            mask.append(True)
+        else:
+            mask.append(False)
+            errors[i] = errs
+    return mask, errors